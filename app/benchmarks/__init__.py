@@ -0,0 +1,26 @@
+"""
+Micro-benchmarks for querysets, serializers and endpoints.
+
+Benchmarks are registered with the `benchmark` decorator and run with
+`python manage.py benchmark`. A benchmark function receives the seeded fixture
+(see benchmarks/fixtures.py) and returns the callable that is timed.
+
+Results can be saved as a baseline and later runs compared against it, see
+benchmarks/runner.py. Larger data sets for manual profiling are generated with
+`python manage.py seed_data`.
+"""
+
+BENCHMARKS = {}
+
+
+def benchmark(name, number=10, settings=None):
+    """
+    Register a benchmark, `number` is the count of calls per timed repeat and
+    `settings` are overridden while it runs
+    """
+
+    def decorator(func):
+        BENCHMARKS[name] = (func, number, settings or {})
+        return func
+
+    return decorator
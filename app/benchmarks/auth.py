@@ -0,0 +1,23 @@
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from benchmarks import benchmark
+from core.authentication import CachedTokenAuthentication
+
+
+def _request(fixture):
+    token, _ = Token.objects.get_or_create(user=fixture.user)
+    return APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {token.key}')
+
+
+@benchmark('auth.token', number=200)
+def token(fixture):
+    request = _request(fixture)
+    return lambda: TokenAuthentication().authenticate(request)
+
+
+@benchmark('auth.token.cached', number=200)
+def token_cached(fixture):
+    request = _request(fixture)
+    return lambda: CachedTokenAuthentication().authenticate(request)
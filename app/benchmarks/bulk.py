@@ -0,0 +1,45 @@
+from benchmarks import benchmark
+from recipe.fields import RelatedObjectCache, prime_related_objects
+from recipe.models import Recipe
+from recipe.serializers import RecipeSerializer
+
+
+ITEMS = 100
+
+
+def _payloads(fixture):
+    return [{
+        'title': f'Bulk recipe {i}',
+        'time_minutes': 10,
+        'price': '5.00',
+        'tags': [tag.id for tag in fixture.tags[:5]],
+        'ingredients': [ingredient.id for ingredient in fixture.ingredients[:5]],
+    } for i in range(ITEMS)]
+
+
+@benchmark('bulk.recipes.serializer_save', number=1)
+def recipes_serializer_save(fixture):
+    payloads = _payloads(fixture)
+
+    def run():
+        for payload in payloads:
+            serializer = RecipeSerializer(data=payload, context={'user': fixture.user})
+            serializer.is_valid(raise_exception=True)
+            serializer.save(user=fixture.user)
+
+    return run
+
+
+@benchmark('bulk.recipes.bulk_create_with_related', number=1)
+def recipes_bulk_create(fixture):
+    payloads = _payloads(fixture)
+
+    def run():
+        serializer = RecipeSerializer(
+            context={'user': fixture.user, 'related_objects': RelatedObjectCache()})
+        prime_related_objects(serializer, payloads)
+
+        items = [serializer.run_validation(payload) for payload in payloads]
+        Recipe.objects.bulk_create_with_related(fixture.user, items)
+
+    return run
@@ -0,0 +1,98 @@
+"""
+Throughput of concurrent requests, in process, through the WSGI handler on a
+thread pool (a threaded WSGI worker), Django's stock ASGI handler and the read
+pool ASGI handler (utils/asgi.py). Requests read committed data, so these don't
+run in the rolled back benchmark transaction (see the load_test command).
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory, override_settings
+from django.urls import resolve
+
+from utils.asgi import ReadPoolASGIHandler
+from utils.help_test_utils import asgi_request
+
+
+def run_wsgi(path, query_string, headers, requests, threads, host):
+    handler = WSGIHandler()
+    environ_headers = {f'HTTP_{name.upper().replace("-", "_")}': value
+                       for name, value in headers.items()}
+
+    def request(_):
+        environ = RequestFactory().get(
+            f'{path}?{query_string}', HTTP_HOST=host, **environ_headers).environ
+        statuses = []
+        response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        b''.join(response)
+        response.close()
+        return int(statuses[0].split()[0])
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(request, range(requests)))
+
+
+def run_asgi(application, path, query_string, headers, requests, connections, host):
+    async def run():
+        slots = asyncio.Semaphore(connections)
+
+        async def request():
+            async with slots:
+                status, _, _ = await asgi_request(
+                    application, path, query_string, headers, host=host)
+                return status
+
+        return await asyncio.gather(*[request() for _ in range(requests)])
+
+    return asyncio.run(run())
+
+
+class DatabaseLatency:
+    """ Add a fixed delay to every query, like the round trip to a remote database """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def add_wrapper(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        if self.seconds:
+            connection_created.connect(self.add_wrapper)
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.add_wrapper)
+
+
+def compare(path, query_string, headers, requests=1000, connections=256, wsgi_threads=8,
+            host='localhost', db_latency=0):
+    """ Return {mode: (requests per second, error count)} """
+    # the read pool is disabled by default, enable it for the benchmarked view
+    with override_settings(ASGI_READ_VIEWS=[resolve(path).view_name]):
+        read_pool = ReadPoolASGIHandler()
+    modes = {
+        f'wsgi ({wsgi_threads} threads)': lambda: run_wsgi(
+            path, query_string, headers, requests, wsgi_threads, host),
+        f'asgi, django handler ({connections} connections)': lambda: run_asgi(
+            ASGIHandler(), path, query_string, headers, requests, connections, host),
+        f'asgi, read pool ({connections} connections)': lambda: run_asgi(
+            read_pool, path, query_string, headers, requests, connections, host),
+    }
+
+    results = {}
+    for mode, run in modes.items():
+        started = time.perf_counter()
+        with DatabaseLatency(db_latency):
+            statuses = run()
+        elapsed = time.perf_counter() - started
+        results[mode] = (len(statuses) / elapsed, sum(status != 200 for status in statuses))
+    return results
@@ -0,0 +1,76 @@
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from django.urls import reverse
+
+from benchmarks import benchmark
+from core.views import ManageUserView
+from recipe.views import RecipeViewSet, TagViewsSet
+
+
+# requests are made for the host of the test client
+SETTINGS = {'ALLOWED_HOSTS': ['testserver']}
+# time the views, not the list cache
+NO_LIST_CACHE = dict(SETTINGS, RECIPE_LIST_CACHE={'BACKEND': 'recipe.cache.DummyBackend'})
+
+
+def _call(fixture, view, url_name, params=None, **kwargs):
+    """ Return a callable dispatching a GET to the view and rendering the response """
+    factory = APIRequestFactory()
+    path = reverse(url_name, kwargs=kwargs)
+
+    def call():
+        request = factory.get(path, params)
+        force_authenticate(request, fixture.user)
+        response = view(request, **kwargs)
+        response.render()
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} returned {response.status_code}')
+        return response
+
+    return call
+
+
+@benchmark('endpoints.recipe_list', settings=NO_LIST_CACHE)
+def recipe_list(fixture):
+    return _call(fixture, RecipeViewSet.as_view({'get': 'list'}), 'recipe:recipe-list')
+
+
+@benchmark('endpoints.recipe_list.cached', number=100, settings=SETTINGS)
+def recipe_list_cached(fixture):
+    return _call(fixture, RecipeViewSet.as_view({'get': 'list'}), 'recipe:recipe-list')
+
+
+@benchmark('endpoints.recipe_list.page', number=50, settings=NO_LIST_CACHE)
+def recipe_list_page(fixture):
+    return _call(fixture, RecipeViewSet.as_view({'get': 'list'}), 'recipe:recipe-list',
+                 {'page_size': 20})
+
+
+@benchmark('endpoints.recipe_list.tags', settings=NO_LIST_CACHE)
+def recipe_list_tags(fixture):
+    tags = ','.join(str(tag.id) for tag in fixture.tags[:3])
+    return _call(fixture, RecipeViewSet.as_view({'get': 'list'}), 'recipe:recipe-list',
+                 {'tags': tags})
+
+
+@benchmark('endpoints.recipe_list.search', settings=NO_LIST_CACHE)
+def recipe_list_search(fixture):
+    return _call(fixture, RecipeViewSet.as_view({'get': 'list'}), 'recipe:recipe-list',
+                 {'search': 'recipe 1'})
+
+
+@benchmark('endpoints.recipe_detail', number=50, settings=SETTINGS)
+def recipe_detail(fixture):
+    return _call(fixture, RecipeViewSet.as_view({'get': 'retrieve'}), 'recipe:recipe-detail',
+                 pk=fixture.recipes[0].pk)
+
+
+@benchmark('endpoints.tag_list.with_counts', settings=NO_LIST_CACHE)
+def tag_list_with_counts(fixture):
+    return _call(fixture, TagViewsSet.as_view({'get': 'list'}), 'recipe:tag-list',
+                 {'with_counts': 1})
+
+
+@benchmark('endpoints.user_detail', number=100, settings=SETTINGS)
+def user_detail(fixture):
+    return _call(fixture, ManageUserView.as_view(), 'core:detail')
@@ -0,0 +1,33 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from recipe.models import Ingredient, Recipe, Tag
+
+
+class Fixture:
+    """ Data of a single seeded user, created with bulk inserts """
+
+    def __init__(self, recipes=500, tags=50, ingredients=100, fan_out=5, seed=0):
+        rng = random.Random(seed)
+        self.password = 'benchmark123'
+        self.user = get_user_model().objects.create(
+            email='benchmark@example.com', name='Benchmark',
+            password=make_password(self.password))
+
+        self.tags = Tag.objects.bulk_create(
+            Tag(user=self.user, name=f'Tag {i}') for i in range(tags))
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=self.user, name=f'Ingredient {i}') for i in range(ingredients))
+        self.recipes = Recipe.objects.bulk_create(
+            Recipe(user=self.user, title=f'Recipe {i}', time_minutes=rng.randint(5, 120),
+                   price=f'{rng.uniform(1, 100):.2f}') for i in range(recipes))
+
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe in self.recipes for tag in rng.sample(self.tags, min(fan_out, tags)))
+        Recipe.ingredients.through.objects.bulk_create(
+            Recipe.ingredients.through(recipe_id=recipe.id, ingredient_id=ingredient.id)
+            for recipe in self.recipes
+            for ingredient in rng.sample(self.ingredients, min(fan_out, ingredients)))
@@ -0,0 +1,42 @@
+from benchmarks import benchmark
+from recipe.models import Ingredient, Recipe, Tag
+
+
+def _ids(queryset):
+    return lambda: list(queryset.all().values_list('id', flat=True))
+
+
+def _tag_ids(fixture, count=3):
+    return [tag.id for tag in fixture.tags[:count]]
+
+
+@benchmark('querysets.recipes.with_tags.any')
+def with_tags_any(fixture):
+    return _ids(Recipe.objects.filter(user=fixture.user).with_tags(_tag_ids(fixture)))
+
+
+@benchmark('querysets.recipes.with_tags.all')
+def with_tags_all(fixture):
+    return _ids(Recipe.objects.filter(user=fixture.user).with_tags(
+        _tag_ids(fixture, 2), match_all=True))
+
+
+@benchmark('querysets.recipes.search')
+def search(fixture):
+    return _ids(Recipe.objects.filter(user=fixture.user).search('recipe 1'))
+
+
+@benchmark('querysets.recipes.search.related')
+def search_related(fixture):
+    return _ids(Recipe.objects.filter(user=fixture.user).search('tag 1', include_related=True))
+
+
+@benchmark('querysets.tags.with_recipe_counts')
+def tags_with_recipe_counts(fixture):
+    queryset = Tag.objects.filter(user=fixture.user).with_recipe_counts()
+    return lambda: list(queryset.all().values('id', 'recipe_count'))
+
+
+@benchmark('querysets.ingredients.assigned')
+def ingredients_assigned(fixture):
+    return _ids(Ingredient.objects.filter(user=fixture.user).assigned())
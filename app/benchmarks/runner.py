@@ -0,0 +1,134 @@
+"""
+Run benchmarks, store their results as a baseline and compare against one.
+
+A baseline is a JSON file with the results and the options of the run. Timings
+only compare between runs on the same machine with the same fixture, so save a
+baseline before a change and compare the run after it:
+
+    python manage.py benchmark --save-baseline /tmp/before.json
+    python manage.py benchmark --compare /tmp/before.json --fail-on-regression
+
+A benchmark regressed when both its median and its best time are slower than
+the baseline by more than the threshold, requiring both keeps a single noisy
+repeat from being reported.
+"""
+import json
+import platform
+import statistics
+import timeit
+from importlib import import_module
+
+from django.db import transaction
+from django.test.utils import override_settings
+
+from benchmarks import BENCHMARKS
+from benchmarks.fixtures import Fixture
+
+
+MODULES = [
+    'benchmarks.auth',
+    'benchmarks.bulk',
+    'benchmarks.endpoints',
+    'benchmarks.querysets',
+    'benchmarks.serialization',
+]
+
+BASELINE_VERSION = 1
+
+STATUS_REGRESSED = 'regressed'
+STATUS_IMPROVED = 'improved'
+STATUS_UNCHANGED = 'unchanged'
+STATUS_NEW = 'new'
+
+
+class Rollback(Exception):
+    pass
+
+
+def load():
+    for module in MODULES:
+        import_module(module)
+    return BENCHMARKS
+
+
+def run(names=None, repeat=5, fixture_options=None, progress=None):
+    """
+    Seed a fixture, time the selected benchmarks and roll all data back.
+
+    Returns {name: {'number', 'best', 'median'}}, times are seconds per call.
+    """
+    benchmarks = load()
+    selected = [name for name in sorted(benchmarks)
+                if not names or any(part in name for part in names)]
+    results = {}
+
+    try:
+        with transaction.atomic():
+            fixture = Fixture(**(fixture_options or {}))
+            for name in selected:
+                func, number, settings = benchmarks[name]
+                with override_settings(**settings):
+                    timer = timeit.Timer(func(fixture))
+                    times = [total / number
+                             for total in timer.repeat(repeat=repeat, number=number)]
+                results[name] = {
+                    'number': number,
+                    'best': min(times),
+                    'median': statistics.median(times),
+                }
+                if progress:
+                    progress(name, results[name])
+            raise Rollback
+    except Rollback:
+        pass
+
+    return results
+
+
+def save_baseline(path, results, options):
+    """ Write results with the options they were run with """
+    baseline = {
+        'version': BASELINE_VERSION,
+        'python': platform.python_version(),
+        'machine': platform.node(),
+        'options': options,
+        'results': results,
+    }
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as file:
+        baseline = json.load(file)
+    if baseline.get('version') != BASELINE_VERSION:
+        raise ValueError(f'{path} is not a version {BASELINE_VERSION} baseline')
+    return baseline
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compare results with the results of a baseline.
+
+    Returns {name: {'status', 'change', 'median', 'baseline'}}, `change` is the
+    relative change of the median (0.25 is 25% slower), None for new benchmarks.
+    """
+    report = {}
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            report[name] = {'status': STATUS_NEW, 'change': None, 'median': result['median'],
+                            'baseline': None}
+            continue
+
+        change = result['median'] / before['median'] - 1
+        best_change = result['best'] / before['best'] - 1
+        if change > threshold and best_change > threshold:
+            status = STATUS_REGRESSED
+        elif change < -threshold and best_change < -threshold:
+            status = STATUS_IMPROVED
+        else:
+            status = STATUS_UNCHANGED
+        report[name] = {'status': status, 'change': change, 'median': result['median'],
+                        'baseline': before['median']}
+    return report
@@ -0,0 +1,40 @@
+from rest_framework.renderers import JSONRenderer
+
+from django.db.models import Prefetch
+
+from benchmarks import benchmark
+from recipe.models import Ingredient, Recipe, Tag
+from recipe.renderers import FastJSONRenderer
+from recipe.rows import build_rows, get_columns
+from recipe.serializers import RecipeSerializer, TagSerializer
+
+
+def _recipes(fixture):
+    return Recipe.objects.filter(user=fixture.user).order_by('-id')
+
+
+@benchmark('serialization.recipe_list.serializer')
+def recipe_list_serializer(fixture):
+    queryset = _recipes(fixture).prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.order_by('id')),
+        Prefetch('ingredients', queryset=Ingredient.objects.order_by('id')))
+    return lambda: JSONRenderer().render(RecipeSerializer(queryset.all(), many=True).data)
+
+
+@benchmark('serialization.recipe_list.fast')
+def recipe_list_fast(fixture):
+    queryset = _recipes(fixture).values(*get_columns(RecipeSerializer))
+    return lambda: FastJSONRenderer().render(build_rows(RecipeSerializer, queryset.all()))
+
+
+@benchmark('serialization.tag_list.serializer')
+def tag_list_serializer(fixture):
+    queryset = Tag.objects.filter(user=fixture.user).order_by('-name')
+    return lambda: JSONRenderer().render(TagSerializer(queryset.all(), many=True).data)
+
+
+@benchmark('serialization.tag_list.fast')
+def tag_list_fast(fixture):
+    queryset = Tag.objects.filter(user=fixture.user).order_by('-name').values(
+        *get_columns(TagSerializer))
+    return lambda: FastJSONRenderer().render(build_rows(TagSerializer, queryset.all()))
@@ -0,0 +1,101 @@
+import logging
+import threading
+
+from rest_framework.authentication import TokenAuthentication
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+from utils.lru import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {'max_entries': 4096, 'ttl': 30}
+
+# log cache stats every this many lookups
+REPORT_EVERY = 10000
+
+
+_token_cache = None
+_lock = threading.Lock()
+
+
+def get_token_cache():
+    """ Return the process wide token cache configured by TOKEN_AUTH_CACHE """
+    global _token_cache
+    if _token_cache is None:
+        with _lock:
+            if _token_cache is None:
+                _token_cache = LRUCache(**getattr(settings, 'TOKEN_AUTH_CACHE', DEFAULT_SETTINGS))
+    return _token_cache
+
+
+@receiver(setting_changed)
+def reset_token_cache(setting, **kwargs):
+    global _token_cache
+    if setting == 'TOKEN_AUTH_CACHE':
+        _token_cache = None
+
+
+def invalidate_token(key):
+    """ Drop a token right away and again on commit, like invalidate_user_lists """
+    cache = get_token_cache()
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+# never cached: hashes are upgraded with an UPDATE sending no signal (core/hashing.py),
+# and a save() of a cached user would write the outdated hash back
+UNCACHED_FIELDS = {'password'}
+
+
+def _cached_fields(model):
+    return [field.attname for field in model._meta.concrete_fields
+            if field.attname not in UNCACHED_FIELDS]
+
+
+def _freeze(instance):
+    return instance._state.db, tuple(
+        getattr(instance, name) for name in _cached_fields(type(instance)))
+
+
+def _thaw(model, frozen):
+    # a fresh instance per request, cached rows are never shared between requests.
+    # Uncached fields are deferred, loaded when read and only saved when set
+    db, values = frozen
+    return model.from_db(db, _cached_fields(model), values)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication keeping token to user resolutions in a bounded TTL/LRU
+    cache. Entries are dropped when the token is deleted or the user is saved
+    (see core/signals.py). The cache is per process, other worker processes see
+    such changes once their entry expires (TOKEN_AUTH_CACHE['ttl'] seconds).
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        cached = cache.get(key)
+        self._report(cache)
+
+        if cached is not None:
+            user_values, token_values = cached
+            user = _thaw(get_user_model(), user_values)
+            token = _thaw(self.get_model(), token_values)
+            token.user = user
+            return user, token
+
+        # inactive users and unknown tokens fail here and are never cached
+        user, token = super().authenticate_credentials(key)
+        cache.set(key, (_freeze(user), _freeze(token)))
+        return user, token
+
+    def _report(self, cache):
+        lookups = cache.hits + cache.misses
+        if lookups % REPORT_EVERY == 0:
+            logger.info('Token auth cache: %s', cache.stats())
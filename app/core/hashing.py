@@ -0,0 +1,173 @@
+"""
+Password hashing in a bounded executor.
+
+PBKDF2 (hashlib releases the GIL) runs on a small thread pool with its own
+concurrency limit instead of in request workers. The API's signup, login and
+profile views hash through it: when the pool and its queue are full they fail
+fast with 429, and with 503 when a hash waited longer than
+PASSWORD_HASHING['timeout'] (see core/views.py). The user model keeps Django's
+synchronous hashing, so the admin and management commands never get these
+errors.
+
+Outdated hashes found at login are upgraded on the pool: the new hash and its
+conditional UPDATE run there, after the response, on a connection closed when
+the task ends.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {'max_workers': 2, 'max_queue': 8, 'timeout': 5}
+
+
+class HashingUnavailable(Exception):
+    """ The executor can't hash the password now """
+
+
+class HashingBusy(HashingUnavailable):
+    """ The pool and its queue are full """
+
+
+class HashingTimeout(HashingUnavailable):
+    """ The hash waited longer than the timeout """
+
+
+class HashingExecutor:
+    """
+    Thread pool running at most `max_workers` hashes, with up to `max_queue` more
+    waiting. Queue and hash times are recorded separately.
+    """
+
+    def __init__(self, max_workers=2, max_queue=8, timeout=5):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hashing')
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'completed': 0, 'rejected': 0, 'timed_out': 0, 'queue_time': 0.0, 'hash_time': 0.0,
+        }
+
+    def _record(self, **values):
+        with self._stats_lock:
+            for name, value in values.items():
+                self._stats[name] += value
+
+    def submit(self, func, *args):
+        """ Schedule func, raise HashingBusy when pool and queue are full """
+        if not self._slots.acquire(blocking=False):
+            self._record(rejected=1)
+            raise HashingBusy()
+
+        submitted = time.monotonic()
+
+        def task():
+            started = time.monotonic()
+            try:
+                return func(*args)
+            finally:
+                self._slots.release()
+                self._record(completed=1, queue_time=started - submitted,
+                             hash_time=time.monotonic() - started)
+
+        return self._pool.submit(task)
+
+    def run(self, func, *args):
+        """ Run func in the pool and wait for its result """
+        future = self.submit(func, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            self._record(timed_out=1)
+            raise HashingTimeout()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        completed = stats['completed']
+        stats['avg_queue_time'] = stats['queue_time'] / completed if completed else 0.0
+        stats['avg_hash_time'] = stats['hash_time'] / completed if completed else 0.0
+        return stats
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    """ Return the process wide executor configured by PASSWORD_HASHING """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = HashingExecutor(
+                    **getattr(settings, 'PASSWORD_HASHING', DEFAULT_SETTINGS))
+    return _executor
+
+
+@receiver(setting_changed)
+def reset_executor(setting, **kwargs):
+    global _executor
+    if setting == 'PASSWORD_HASHING' and _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+def make_password(password):
+    if password is None:
+        # unusable passwords aren't hashed
+        return hashers.make_password(password)
+    return get_executor().run(hashers.make_password, password)
+
+
+def check_password(password, encoded):
+    """ Return (is_correct, must_update), must_update if made with older parameters """
+    outdated = []
+    is_correct = get_executor().run(
+        hashers.check_password, password, encoded, outdated.append)
+    return is_correct, bool(outdated)
+
+
+def check_user_password(user, password):
+    """ user.check_password in the executor, an outdated hash is upgraded in the background """
+    is_correct, must_update = check_password(password, user.password)
+    if is_correct and must_update and user.pk is not None:
+        upgrade_password_in_background(type(user), user.pk, user.password, password)
+    return is_correct
+
+
+def upgrade_password(user_model, pk, encoded, password):
+    """ Replace an outdated hash, unless the password was changed in the meantime """
+    user_model.objects.filter(pk=pk, password=encoded).update(
+        password=hashers.make_password(password))
+
+
+def upgrade_password_in_background(user_model, pk, encoded, password):
+    """ Rehash in the pool when it has room, otherwise on a later login """
+
+    def task():
+        try:
+            upgrade_password(user_model, pk, encoded, password)
+        except Exception:
+            logger.exception('Upgrading the password hash of user %s failed', pk)
+        finally:
+            # pool threads outlive requests, don't keep their connections open
+            connections.close_all()
+
+    try:
+        get_executor().submit(task)
+    except HashingBusy:
+        pass
@@ -0,0 +1,78 @@
+"""
+Database readiness checks, used by wait_for_db and the health endpoints.
+
+/health/live/ answers without touching the database, it only tells the process
+serves requests. /health/ready/ probes the database connection and checks that
+migrations are applied, it answers 503 until both pass.
+"""
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.utils import DatabaseError
+from django.http import JsonResponse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_safe
+
+
+# aliases whose migrations were found applied, the code doesn't change while running
+_migrated = set()
+
+
+def check_database(alias=DEFAULT_DB_ALIAS):
+    """ Open (or reuse) a connection and run a trivial query, raise DatabaseError on failure """
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        # don't reuse a broken connection for the next probe
+        connection.close()
+        raise
+
+
+def get_unapplied_migrations(alias=DEFAULT_DB_ALIAS):
+    """ Return the names of migrations not applied to the database """
+    if alias in _migrated:
+        return []
+
+    executor = MigrationExecutor(connections[alias])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    unapplied = [f'{migration.app_label}.{migration.name}' for migration, _ in plan]
+    if not unapplied:
+        _migrated.add(alias)
+    return unapplied
+
+
+def timed(check, *args):
+    """ Run a check, return (result, error, seconds) """
+    started = time.monotonic()
+    try:
+        result, error = check(*args), None
+    except DatabaseError as exc:
+        result, error = None, exc
+    return result, error, time.monotonic() - started
+
+
+@require_safe
+@never_cache
+def live(request):
+    return JsonResponse({'status': 'ok'})
+
+
+@require_safe
+@never_cache
+def ready(request):
+    _, error, seconds = timed(check_database)
+    checks = {'database': {'ok': error is None, 'time_ms': round(seconds * 1000, 2)}}
+    if error is not None:
+        checks['database']['error'] = str(error).strip()
+    else:
+        unapplied, error, seconds = timed(get_unapplied_migrations)
+        checks['migrations'] = {
+            'ok': error is None and not unapplied, 'time_ms': round(seconds * 1000, 2),
+            'unapplied': len(unapplied or [])}
+
+    ok = all(check['ok'] for check in checks.values())
+    return JsonResponse({'status': 'ok' if ok else 'unavailable', 'checks': checks},
+                        status=200 if ok else 503)
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import runner
+
+
+class Command(BaseCommand):
+    """Django command to run the micro-benchmark suite against seeded, rolled back data"""
+
+    help = 'Run micro-benchmarks (see benchmarks/)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Only run benchmarks containing these')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--save-baseline', metavar='PATH',
+                            help='Write the results to a baseline file')
+        parser.add_argument('--compare', metavar='PATH',
+                            help='Compare the results with a baseline file')
+        parser.add_argument('--threshold', type=float, default=0.1,
+                            help='Relative slowdown reported as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error if a benchmark regressed')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = runner.load_baseline(options['compare'])
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Cannot read baseline: {exc}')
+            if baseline['options'] != self._run_options(options):
+                self.stdout.write(self.style.WARNING(
+                    f'Baseline was run with {baseline["options"]}, timings may not compare'))
+
+        self.stdout.write(f'Running benchmarks with {options["recipes"]} recipes..')
+
+        def progress(name, result):
+            self.stdout.write(
+                f'{name:<50} {result["median"] * 1000:10.3f} ms  '
+                f'(best {result["best"] * 1000:.3f} ms)')
+
+        results = runner.run(names=options['names'], repeat=options['repeat'],
+                             fixture_options={'recipes': options['recipes']}, progress=progress)
+
+        if options['save_baseline']:
+            runner.save_baseline(options['save_baseline'], results, self._run_options(options))
+            self.stdout.write(f'Saved baseline to {options["save_baseline"]}')
+
+        if baseline is not None:
+            report = runner.compare(results, baseline, options['threshold'])
+            regressed = self._write_report(report)
+            if regressed and options['fail_on_regression']:
+                raise CommandError(f'{len(regressed)} benchmark(s) regressed by more than '
+                                   f'{options["threshold"]:.0%}')
+
+    def _run_options(self, options):
+        return {'recipes': options['recipes'], 'repeat': options['repeat']}
+
+    def _write_report(self, report):
+        """ Write the comparison, return the names of regressed benchmarks """
+        self.stdout.write('\nCompared with the baseline:')
+        styles = {runner.STATUS_REGRESSED: self.style.ERROR,
+                  runner.STATUS_IMPROVED: self.style.SUCCESS}
+        for name, entry in sorted(report.items()):
+            if entry['change'] is None:
+                line = f'{name:<50} {"":>21}  {entry["status"]}'
+            else:
+                line = (f'{name:<50} {entry["baseline"] * 1000:9.3f} -> '
+                        f'{entry["median"] * 1000:9.3f} ms {entry["change"]:+7.1%}  '
+                        f'{entry["status"]}')
+            self.stdout.write(styles.get(entry['status'], str)(line))
+        return [name for name, entry in report.items()
+                if entry['status'] == runner.STATUS_REGRESSED]
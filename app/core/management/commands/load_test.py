@@ -0,0 +1,43 @@
+from rest_framework.authtoken.models import Token
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from benchmarks import concurrency
+
+
+class Command(BaseCommand):
+    """Django command comparing concurrent request throughput of WSGI and ASGI handlers"""
+
+    help = 'Compare requests per second of an endpoint under WSGI and ASGI, in process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='User the requests are made as (e.g. a seeded user)')
+        parser.add_argument('--url-name', default='recipe:recipe-list')
+        parser.add_argument('--query', default='', help='Query string, e.g. page_size=100')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--connections', type=int, default=256)
+        parser.add_argument('--wsgi-threads', type=int, default=8)
+        parser.add_argument('--host', default='localhost', help='Must be in ALLOWED_HOSTS')
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='Milliseconds added to every query (simulated network round trip)')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["email"]} does not exist')
+
+        token, _ = Token.objects.get_or_create(user=user)
+        path = reverse(options['url_name'])
+        self.stdout.write(f'{options["requests"]} requests to {path}?{options["query"]}')
+
+        results = concurrency.compare(
+            path, options['query'], {'Authorization': f'Token {token.key}'},
+            requests=options['requests'], connections=options['connections'],
+            wsgi_threads=options['wsgi_threads'], host=options['host'],
+            db_latency=options['db_latency'] / 1000)
+
+        for mode, (rate, errors) in results.items():
+            self.stdout.write(f'{mode:<45} {rate:10.1f} req/s  {errors} errors')
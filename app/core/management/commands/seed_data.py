@@ -0,0 +1,252 @@
+import time
+
+from rest_framework.authtoken.models import Token
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipe.models import Ingredient, Recipe, Tag
+from utils import bulk_load
+
+
+WORDS = [
+    'apple', 'basil', 'bean', 'beef', 'bread', 'butter', 'cake', 'carrot', 'cheese', 'chicken',
+    'chili', 'chocolate', 'cinnamon', 'coconut', 'corn', 'cream', 'curry', 'egg', 'garlic',
+    'ginger', 'honey', 'lamb', 'lemon', 'lentil', 'lime', 'mango', 'mushroom', 'noodle', 'oat',
+    'onion', 'orange', 'pasta', 'pea', 'pepper', 'pie', 'pork', 'potato', 'rice', 'salad',
+    'salmon', 'soup', 'spinach', 'stew', 'sugar', 'tofu', 'tomato', 'tuna', 'vanilla', 'yogurt',
+]
+STYLES = [
+    'baked', 'braised', 'crispy', 'easy', 'fried', 'grilled', 'homemade', 'quick', 'roasted',
+    'slow cooked', 'smoked', 'spicy', 'steamed', 'stuffed', 'sweet', 'vegan',
+]
+
+USER_TABLE = 'seed_user'
+ATTR_TABLE = 'seed_{}'
+ATTR_NAMES = ('tag', 'ingredient')
+
+
+def _sql_array(values):
+    return '(ARRAY[' + ', '.join("'" + value.replace("'", "''") + "'" for value in values) + '])'
+
+
+def _pick(array, count):
+    """ SQL picking a random element of an SQL array of `count` elements """
+    return f'{array}[1 + floor(random() * {count})::int]'
+
+
+class Command(BaseCommand):
+    """Django command to bulk generate users, tags, ingredients and recipes"""
+
+    help = ('Seed the database with generated users owning tags, ingredients and recipes, '
+            'rows are generated by PostgreSQL in batches (e.g. --users 10000 --recipes 5000000)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=10000, help='Recipes in total')
+        parser.add_argument('--tags', type=int, default=20, help='Tags per user')
+        parser.add_argument('--ingredients', type=int, default=40, help='Ingredients per user')
+        parser.add_argument('--max-tags', type=int, default=5,
+                            help='Recipes get 0 to this many of their user\'s tags')
+        parser.add_argument('--max-ingredients', type=int, default=10)
+        parser.add_argument('--skew', type=float, default=1.5,
+                            help='Above 1 a few users own most recipes, 1 spreads them evenly')
+        parser.add_argument('--batch-size', type=int, default=100000)
+        parser.add_argument('--prefix', default='seed',
+                            help='Users are <prefix>-<n>@example.com')
+        parser.add_argument('--password', default='password123')
+        parser.add_argument('--random-seed', type=float, default=0.5,
+                            help='Same options and seed generate the same data, between -1 and 1')
+        parser.add_argument('--reset', action='store_true',
+                            help='Delete users seeded with the prefix (and their data) first')
+        parser.add_argument('--bulk-load', action='store_true',
+                            help='Drop the secondary indexes and foreign keys of the recipe '
+                                 'tables while loading and recreate them at the end, much '
+                                 'faster for large seeds on an otherwise idle database')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Seeding is only supported on PostgreSQL')
+        self.options = options
+        self.email_pattern = f'{options["prefix"]}-%@example.com'
+        started = time.monotonic()
+
+        if options['reset']:
+            self._reset()
+        elif self._seeded_users().exists():
+            raise CommandError(f'Users {self.email_pattern} exist, use --reset to replace them')
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT setseed(%s)', [options['random_seed']])
+
+        self._create_users()
+        try:
+            for model, per_user in ((Tag, options['tags']), (Ingredient, options['ingredients'])):
+                self._create_attrs(model, per_user)
+
+            dropped = self._drop_indexes() if options['bulk_load'] else []
+            try:
+                self._create_recipes()
+            finally:
+                self._recreate(dropped)
+        finally:
+            with connection.cursor() as cursor:
+                for table in [USER_TABLE] + [ATTR_TABLE.format(name) for name in ATTR_NAMES]:
+                    cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+        with connection.cursor() as cursor:
+            for model in (Recipe, Recipe.tags.through, Recipe.ingredients.through, Tag, Ingredient):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {options["users"]} users and {options["recipes"]} recipes '
+            f'in {time.monotonic() - started:.1f} s'))
+
+    def _seeded_users(self):
+        return get_user_model().objects.filter(
+            email__startswith=f'{self.options["prefix"]}-', email__endswith='@example.com')
+
+    def _reset(self):
+        """ Delete seeded users and their rows, with set based deletes instead of the ORM """
+        users = f"SELECT id FROM {get_user_model()._meta.db_table} WHERE email LIKE %s"
+        recipes = f'SELECT id FROM {Recipe._meta.db_table} WHERE user_id IN ({users})'
+        with transaction.atomic(), connection.cursor() as cursor:
+            for field in Recipe._meta.many_to_many:
+                through = field.remote_field.through._meta.db_table
+                cursor.execute(f'DELETE FROM {through} WHERE {field.m2m_field_name()}_id IN '
+                               f'({recipes})', [self.email_pattern])
+            for model in (Recipe, Tag, Ingredient):
+                cursor.execute(f'DELETE FROM {model._meta.db_table} WHERE user_id IN ({users})',
+                               [self.email_pattern])
+            cursor.execute(f'DELETE FROM {Token._meta.db_table} WHERE user_id IN ({users})',
+                           [self.email_pattern])
+            deleted = self._seeded_users().delete()[0]
+        self.stdout.write(f'Deleted {deleted} seeded user(s)')
+
+    def _create_users(self):
+        table = get_user_model()._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            # one hash for all, hashing each password would take longer than the seeding
+            cursor.execute(f"""
+                INSERT INTO {table} (password, is_superuser, email, name, is_active, is_staff)
+                SELECT %s, false, %s || '-' || n || '@example.com', 'Seeded user ' || n,
+                       true, false
+                FROM generate_series(1, %s) n
+            """, [make_password(self.options['password']), self.options['prefix'],
+                  self.options['users']])
+            # numbered 0.. in creation order, recipes pick their user by number
+            cursor.execute(f"""
+                CREATE TEMPORARY TABLE {USER_TABLE} AS
+                SELECT row_number() OVER (ORDER BY id) - 1 AS number, id
+                FROM {table} WHERE email LIKE %s
+            """, [self.email_pattern])
+            cursor.execute(f'CREATE UNIQUE INDEX ON {USER_TABLE} (number)')
+            # temporary tables are not analyzed by autovacuum
+            cursor.execute(f'ANALYZE {USER_TABLE}')
+        self.stdout.write(f'Created {self.options["users"]} users')
+
+    def _create_attrs(self, model, per_user):
+        """ Insert `per_user` uniquely named rows per user, numbered 0.. per user """
+        table = ATTR_TABLE.format(model._meta.model_name)
+        names = _sql_array(WORDS if model is Ingredient else STYLES + WORDS)
+        count = len(WORDS) if model is Ingredient else len(STYLES) + len(WORDS)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {model._meta.db_table} (name, user_id)
+                SELECT {names}[1 + n %% {count}]
+                       || CASE WHEN n >= {count} THEN ' ' || (n / {count} + 1) ELSE '' END,
+                       u.id
+                FROM {USER_TABLE} u CROSS JOIN generate_series(0, %s - 1) n
+            """, [per_user])
+            cursor.execute(f"""
+                CREATE TEMPORARY TABLE {table} AS
+                SELECT user_id, row_number() OVER (PARTITION BY user_id ORDER BY id) - 1 AS number,
+                       id
+                FROM {model._meta.db_table} WHERE user_id IN (SELECT id FROM {USER_TABLE})
+            """)
+            cursor.execute(f'CREATE UNIQUE INDEX ON {table} (user_id, number)')
+            cursor.execute(f'ANALYZE {table}')
+        self.stdout.write(f'Created {per_user} {model._meta.verbose_name_plural} per user')
+
+    def _related_insert(self, field, per_user, max_per_recipe):
+        """
+        SQL of a data modifying CTE assigning 0 to max_per_recipe distinct rows of
+        the recipe's user to each inserted recipe (CTE `recipe`), a random window
+        of consecutive numbers wrapping around.
+        """
+        through = field.remote_field.through._meta.db_table
+        related_table = ATTR_TABLE.format(field.related_model._meta.model_name)
+        max_per_recipe = min(max_per_recipe, per_user)
+        return f"""
+            INSERT INTO {through} ({field.m2m_field_name()}_id, {field.m2m_reverse_field_name()}_id)
+            SELECT r.id, a.id
+            FROM (
+                SELECT id, user_id, floor(random() * {per_user})::int AS first,
+                       floor(random() * ({max_per_recipe} + 1))::int AS count
+                FROM recipe
+            ) r
+            CROSS JOIN LATERAL generate_series(0, r.count - 1) n
+            JOIN {related_table} a ON a.user_id = r.user_id
+                AND a.number = (r.first + n) %% {per_user}
+        """
+
+    def _create_recipes(self):
+        options = self.options
+        total, batch_size = options['recipes'], options['batch_size']
+        title = (f"initcap({_pick(_sql_array(STYLES), len(STYLES))} || ' ' || "
+                 f"{_pick(_sql_array(WORDS), len(WORDS))} || ' with ' || "
+                 f"{_pick(_sql_array(WORDS), len(WORDS))})")
+
+        related = []
+        for field, per_user, max_per_recipe in (
+                (Recipe._meta.get_field('tags'), options['tags'], options['max_tags']),
+                (Recipe._meta.get_field('ingredients'), options['ingredients'],
+                 options['max_ingredients'])):
+            if per_user and max_per_recipe:
+                related.append(self._related_insert(field, per_user, max_per_recipe))
+        related_ctes = ''.join(f', {field}_rows AS ({sql})'
+                               for field, sql in zip(('tags', 'ingredients'), related))
+
+        created = 0
+        started = time.monotonic()
+        while created < total:
+            count = min(batch_size, total - created)
+            with transaction.atomic(), connection.cursor() as cursor:
+                # foreign keys are checked at commit, the through rows may reference
+                # recipes inserted by the same statement
+                cursor.execute(f"""
+                    WITH recipe AS (
+                        INSERT INTO {Recipe._meta.db_table} (
+                            user_id, title, time_minutes, price, link, image, image_status,
+                            image_variants, updated_at)
+                        SELECT u.id, {title}, 5 + floor(random() * 116)::int,
+                               round((1 + random() * 99)::numeric, 2), '', '', '', '{{}}', now()
+                        FROM (
+                            SELECT floor(%s * power(random(), %s))::int AS number
+                            FROM generate_series(1, %s)
+                        ) n
+                        JOIN {USER_TABLE} u USING (number)
+                        RETURNING id, user_id
+                    ){related_ctes}
+                    SELECT count(*) FROM recipe
+                """, [options['users'], options['skew'], count])
+            created += count
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'Created {created}/{total} recipes '
+                              f'({created / elapsed:.0f} recipes/s)')
+
+    def _drop_indexes(self):
+        statements, indexes, foreign_keys = bulk_load.drop_indexes(bulk_load.model_tables(Recipe))
+        self.stdout.write(f'Dropped {indexes} index(es) and {foreign_keys} foreign key(s) '
+                          f'until the recipes are loaded')
+        return statements
+
+    def _recreate(self, statements):
+        started = time.monotonic()
+        bulk_load.recreate(statements)
+        if statements:
+            self.stdout.write(f'Recreated indexes and foreign keys in '
+                              f'{time.monotonic() - started:.1f} s')
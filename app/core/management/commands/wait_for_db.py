@@ -1,22 +1,76 @@
+import random
 import time
 
-from django.core.management.base import BaseCommand
-from django.db import connections
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
 from django.db.utils import OperationalError
 
+from core import health
+
 
 class Command(BaseCommand):
     """Django command to pause execution until database is available"""
 
+    help = ('Wait until the database accepts connections, retrying with exponential '
+            'backoff and jitter, and report unapplied migrations')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Give up after this many seconds')
+        parser.add_argument('--initial-delay', type=float, default=0.1)
+        parser.add_argument('--max-delay', type=float, default=5)
+        parser.add_argument('--migrations', action='store_true',
+                            help='Also wait until all migrations are applied')
+
     def handle(self, *args, **options):
         self.stdout.write('Waiting for database..')
+        self.deadline = time.monotonic() + options['timeout']
+        self.options = options
+        alias = options['database']
 
-        db_conn = None
-        while not db_conn:
-            try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
+        started = time.monotonic()
+        attempts = self._retry(lambda: health.check_database(alias), 'Database unavailable')
+        self._report_phase('connect', started, attempts)
+
+        started = time.monotonic()
+        if options['migrations']:
+            attempts = self._retry(lambda: self._check_migrations(alias), 'Migrations pending')
+            self._report_phase('migrations', started, attempts)
+        else:
+            unapplied = health.get_unapplied_migrations(alias)
+            self._report_phase('migrations', started, 1)
+            if unapplied:
+                self.stdout.write(self.style.WARNING(
+                    f'{len(unapplied)} unapplied migration(s), e.g. {unapplied[0]}'))
 
         self.stdout.write(self.style.SUCCESS('Database available!'))
+
+    def _check_migrations(self, alias):
+        unapplied = health.get_unapplied_migrations(alias)
+        if unapplied:
+            raise OperationalError(f'{len(unapplied)} unapplied migration(s)')
+
+    def _retry(self, check, message):
+        """ Call check until it stops raising OperationalError, return the number of attempts """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                check()
+                return attempt
+            except OperationalError as exc:
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(f'{message} after {attempt} attempt(s): {exc}')
+
+                # full jitter, spreads out replicas started together
+                delay = min(self.options['max_delay'],
+                            self.options['initial_delay'] * 2 ** (attempt - 1))
+                delay = min(random.uniform(0, delay), remaining)
+                self.stdout.write(f'{message}, retrying in {delay:.2f} s..')
+                time.sleep(delay)
+
+    def _report_phase(self, phase, started, attempts):
+        self.stdout.write(
+            f'  {phase}: {time.monotonic() - started:.3f} s ({attempts} attempt(s))')
@@ -37,3 +37,24 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_staff = models.NullBooleanField(default=False)
 
     objects = UserManager()
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of the bulk import of a file, committed with every batch so an
+    interrupted import resumes after the last imported batch (see
+    core/management/commands/import_recipes.py)
+    """
+
+    path = models.CharField(max_length=1024, unique=True)
+    # hash of the start of the file, a different file at the path isn't resumed
+    fingerprint = models.CharField(max_length=64)
+    # byte offset after the last imported record
+    offset = models.BigIntegerField(default=0)
+    records = models.BigIntegerField(default=0)
+    imported = models.BigIntegerField(default=0)
+    rejected = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.path
@@ -1,13 +1,16 @@
 from rest_framework import serializers
 
-from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import get_user_model
 from django.utils.translation import ugettext_lazy as _
 
+from core import hashing
+from utils.timing import TimedSerializerMixin
+
 
 UserModel = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = UserModel
@@ -17,17 +20,24 @@ class UserSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """ Create a new user with encrypted password and return it """
 
-        return UserModel.objects.create_user(**validated_data)
+        password = validated_data.pop('password')
+        user = UserModel(**validated_data)
+        user.email = UserModel.objects.normalize_email(user.email)
+        # hashed in the executor, create_user would hash in the request thread
+        user.password = hashing.make_password(password)
+        user._password = password
+        user.save()
+
+        return user
 
     def update(self, instance, validated_data):
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
 
         if password:
-            user.set_password(password)
-            user.save()
+            instance.password = hashing.make_password(password)
+            instance._password = password
 
-        return user
+        return super().update(instance, validated_data)
 
 
 class AuthTokenSerializer(serializers.Serializer):
@@ -44,7 +54,7 @@ class AuthTokenSerializer(serializers.Serializer):
         email = attrs.get('email')
         password = attrs.get('password')
 
-        user = authenticate(request=self.context.get('request'), username=email, password=password)
+        user = self.authenticate(email, password)
 
         if not user:
             msg = _('Unable to authenticate with provided credentials')
@@ -52,3 +62,18 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs['user'] = user
         return attrs
+
+    @staticmethod
+    def authenticate(email, password):
+        """ As ModelBackend does, with the password checked in the hashing executor """
+
+        try:
+            user = UserModel._default_manager.get_by_natural_key(email)
+        except UserModel.DoesNotExist:
+            # unknown emails take as long as known ones
+            hashing.make_password(password)
+            return None
+
+        if hashing.check_user_password(user, password) and user.is_active:
+            return user
+        return None
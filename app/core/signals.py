@@ -0,0 +1,21 @@
+from rest_framework.authtoken.models import Token
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.authentication import invalidate_token
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user_tokens(sender, instance, created, **kwargs):
+    """ Edited or deactivated users must not be served from the token cache """
+    if not created:
+        for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+            invalidate_token(key)
@@ -0,0 +1,80 @@
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.authentication import get_token_cache
+from utils.help_test_utils import create_user
+
+USER_DETAIL_URL = reverse('core:detail')
+RECIPE_LIST_URL = reverse('recipe:recipe-list')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """ Test token lookups are cached and dropped when tokens or users change """
+
+    def setUp(self):
+        # a fresh cache for every test
+        cache_settings = override_settings(TOKEN_AUTH_CACHE={'max_entries': 16, 'ttl': 60})
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        self.client.get(USER_DETAIL_URL)
+        with self.assertNumQueries(0):
+            r = self.client.get(USER_DETAIL_URL)
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data['email'], self.user.email)
+        self.assertEqual(get_token_cache().stats()['hits'], 1)
+
+    def test_cached_user_not_shared(self):
+        """ Test each request gets its own user instance """
+        self.client.get(USER_DETAIL_URL)
+        self.client.patch(USER_DETAIL_URL, {'name': 'Edited'})
+        self.client.get(USER_DETAIL_URL)
+
+        r = self.client.get(USER_DETAIL_URL)
+        self.assertEqual(r.data['name'], 'Edited')
+
+    def test_cached_user_keeps_password(self):
+        """ Test saving a cached user doesn't write back a hash changed without signals """
+        self.client.get(USER_DETAIL_URL)
+        upgraded = make_password('password123', hasher='pbkdf2_sha1')
+        get_user_model().objects.filter(pk=self.user.pk).update(password=upgraded)
+
+        r = self.client.patch(USER_DETAIL_URL, {'name': 'Edited'})
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.name, self.user.password), ('Edited', upgraded))
+
+    def test_deleted_token_rejected(self):
+        self.client.get(RECIPE_LIST_URL)
+        self.token.delete()
+
+        r = self.client.get(RECIPE_LIST_URL)
+        self.assertEqual(r.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        self.client.get(RECIPE_LIST_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        r = self.client.get(RECIPE_LIST_URL)
+        self.assertEqual(r.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_token_not_cached(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        self.client.get(RECIPE_LIST_URL)
+
+        self.assertEqual(len(get_token_cache()), 0)
@@ -1,26 +1,318 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
 from unittest.mock import patch  # helper for mocking data
 
-from django.core.management import call_command  # helper for calling mc in test
+from rest_framework.test import APIClient
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command  # helper for calling mc in test
+from django.db.models import Count, F
 from django.db.utils import OperationalError  # error that is raised if db is not operational
 from django.test import TestCase
+from django.urls import reverse
+
+from benchmarks import runner
+from core.management.commands import import_recipes
+from core.management.commands.import_recipes import Command as ImportCommand
+from core.models import ImportCheckpoint
+from recipe.models import Ingredient, Recipe, Tag
+from utils.help_test_utils import create_recipe, create_tag, create_user
 
 
 class CommandTests(TestCase):
 
-    @patch('django.db.utils.ConnectionHandler.__getitem__', return_value=True)
-    def test_wait_for_db_ready(self, gi):
+    @patch('core.health.check_database')
+    def test_wait_for_db_ready(self, check):
         """ Test waiting for db when db is operational """
 
-        call_command('wait_for_db')
-        self.assertEqual(gi.call_count, 1)
+        out = StringIO()
+        call_command('wait_for_db', stdout=out)
+        self.assertEqual(check.call_count, 1)
+        self.assertIn('connect: ', out.getvalue())
+        self.assertIn('migrations: ', out.getvalue())
 
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
         """ Test waiting for db 5 times, success on 6th time """
 
         # mocking time sleep with return value of True will avoid waiting in our test
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+        with patch('core.health.check_database') as check:
             #  setup side effect: first 5 calls will raise Operationalerror; 6th returns
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+            check.side_effect = [OperationalError] * 5 + [None]
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(check.call_count, 6)
+
+        # exponential backoff with full jitter
+        delays = [call.args[0] for call in ts.call_args_list]
+        for attempt, delay in enumerate(delays):
+            self.assertLessEqual(delay, 0.1 * 2 ** attempt)
+
+    @patch('time.sleep', return_value=True)
+    @patch('core.health.check_database', side_effect=OperationalError('refused'))
+    def test_wait_for_db_deadline(self, check, ts):
+        with self.assertRaisesMessage(CommandError, 'Database unavailable after 1 attempt(s)'):
+            call_command('wait_for_db', timeout=0, stdout=StringIO())
+
+    @patch('time.sleep', return_value=True)
+    @patch('core.health.check_database')
+    def test_wait_for_db_migrations(self, check, ts):
+        with patch('core.health.get_unapplied_migrations') as unapplied:
+            unapplied.side_effect = [['recipe.0011_image_files'], []]
+            call_command('wait_for_db', migrations=True, stdout=StringIO())
+            self.assertEqual(unapplied.call_count, 2)
+
+    def test_benchmark_rolls_back(self):
+        """ Test benchmark command times the selected benchmarks and leaves no data """
+        out = StringIO()
+        call_command('benchmark', 'recipe_list', recipes=5, repeat=1, stdout=out)
+
+        self.assertIn('serialization.recipe_list.fast', out.getvalue())
+        self.assertNotIn('tag_list', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_compare(self):
+        """ Test comparing results with a baseline flags regressions """
+        baseline = {'results': {
+            'slower': {'median': 1.0, 'best': 1.0},
+            'noisy': {'median': 1.0, 'best': 1.0},
+            'faster': {'median': 1.0, 'best': 1.0},
+        }}
+        results = {
+            'slower': {'median': 1.5, 'best': 1.2},
+            'noisy': {'median': 1.5, 'best': 1.05},
+            'faster': {'median': 0.5, 'best': 0.5},
+            'added': {'median': 1.0, 'best': 1.0},
+        }
+
+        report = runner.compare(results, baseline, threshold=0.1)
+
+        self.assertEqual({name: entry['status'] for name, entry in report.items()}, {
+            'slower': runner.STATUS_REGRESSED,
+            'noisy': runner.STATUS_UNCHANGED,
+            'faster': runner.STATUS_IMPROVED,
+            'added': runner.STATUS_NEW,
+        })
+        self.assertAlmostEqual(report['slower']['change'], 0.5)
+
+    def test_benchmark_baseline(self):
+        """ Test saving a baseline and failing on a regression against it """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'baseline.json')
+
+        call_command('benchmark', 'tag_list.fast', recipes=5, repeat=1, save_baseline=path,
+                     stdout=StringIO())
+        with open(path) as file:
+            baseline = json.load(file)
+        self.assertEqual(list(baseline['results']), ['serialization.tag_list.fast'])
+
+        # a baseline 1000 times faster than this machine
+        baseline['results']['serialization.tag_list.fast'].update(median=1e-9, best=1e-9)
+        with open(path, 'w') as file:
+            json.dump(baseline, file)
+
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, '1 benchmark(s) regressed'):
+            call_command('benchmark', 'tag_list.fast', recipes=5, repeat=1, compare=path,
+                         fail_on_regression=True, stdout=out)
+        self.assertIn('regressed', out.getvalue())
+
+    def test_seed_data(self):
+        """ Test seeding users owning tags, ingredients and recipes """
+        out = StringIO()
+        call_command('seed_data', users=3, recipes=50, tags=4, ingredients=6, max_tags=2,
+                     batch_size=20, stdout=out)
+
+        users = get_user_model().objects.filter(email__startswith='seed-')
+        self.assertEqual(users.count(), 3)
+        self.assertEqual(Recipe.objects.filter(user__in=users).count(), 50)
+        self.assertEqual(Tag.objects.filter(user=users[0]).count(), 4)
+        self.assertIn('Created 50/50 recipes', out.getvalue())
+
+        tag_rows = Recipe.tags.through.objects.all()
+        self.assertTrue(tag_rows.exists())
+        # recipes only get tags of their own user, at most max_tags of them
+        self.assertFalse(tag_rows.exclude(tag__user=F('recipe__user')).exists())
+        self.assertFalse(tag_rows.values('recipe').annotate(count=Count('id'))
+                         .filter(count__gt=2).exists())
+        self.assertFalse(Recipe.ingredients.through.objects.exclude(
+            ingredient__user=F('recipe__user')).exists())
+
+        with self.assertRaisesMessage(CommandError, 'use --reset'):
+            call_command('seed_data', users=1, recipes=1, stdout=StringIO())
+
+    def test_seed_data_reset_bulk_load(self):
+        """ Test reseeding with indexes and foreign keys dropped while loading """
+        call_command('seed_data', users=2, recipes=10, stdout=StringIO())
+
+        call_command('seed_data', users=1, recipes=5, reset=True, bulk_load=True,
+                     stdout=StringIO())
+
+        self.assertEqual(get_user_model().objects.filter(email__startswith='seed-').count(), 1)
+        self.assertEqual(Recipe.objects.count(), 5)
+
+
+class ImportRecipesTests(TestCase):
+    """ Test importing recipes from JSONL and CSV files """
+
+    def setUp(self):
+        self.user = create_user()
+        self.other = create_user(email='other@example.com')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as file:
+            file.write(''.join(f'{line}\n' for line in lines))
+        return path
+
+    def write_jsonl(self, records, name='recipes.jsonl'):
+        return self.write(name, [record if isinstance(record, str) else json.dumps(record)
+                                 for record in records])
+
+    def import_recipes(self, *paths, **options):
+        out = StringIO()
+        call_command('import_recipes', *paths, user=self.user.email, stdout=out, **options)
+        return out.getvalue()
+
+    def recipe(self, i, **fields):
+        return dict({'title': f'Recipe {i}', 'time_minutes': 10, 'price': '5.50',
+                     'tags': ['Vegan'], 'ingredients': [{'id': 1, 'name': 'Salt'}]}, **fields)
+
+    def test_import_jsonl(self):
+        existing = create_tag(user=self.user, name='Vegan')
+        path = self.write_jsonl([
+            self.recipe(1, tags=['Vegan', ' Dessert ', 'Dessert']),
+            self.recipe(2, user=self.other.email, link='https://example.com'),
+            {'title': 'Minimal', 'time_minutes': '7', 'price': 3},
+        ])
+
+        out = self.import_recipes(path)
+
+        self.assertIn('3 recipes, 0 records rejected', out)
+        recipe = Recipe.objects.get(title='Recipe 1')
+        self.assertEqual((recipe.user, recipe.time_minutes, str(recipe.price)),
+                         (self.user, 10, '5.50'))
+        self.assertEqual(sorted(recipe.tags.values_list('name', flat=True)),
+                         ['Dessert', 'Vegan'])
+        self.assertIn(existing, recipe.tags.all())
+        self.assertEqual(list(recipe.ingredients.values_list('name', flat=True)), ['Salt'])
+
+        # tags and ingredients are created per user
+        other_recipe = Recipe.objects.get(title='Recipe 2')
+        self.assertEqual(other_recipe.user, self.other)
+        self.assertEqual(other_recipe.tags.get().user, self.other)
+        self.assertEqual(Ingredient.objects.filter(name='Salt').count(), 2)
+        self.assertFalse(Recipe.objects.get(title='Minimal').tags.exists())
+
+    def test_invalid_records_rejected(self):
+        path = self.write_jsonl([
+            self.recipe(1),
+            '{"title": ',
+            '[1, 2]',
+            self.recipe(2, price='1000'),
+            self.recipe(3, time_minutes='ten'),
+            self.recipe(4, user='missing@example.com'),
+            self.recipe(5, tags='Vegan'),
+            self.recipe(6, ingredients=[1]),
+            self.recipe(7, title=' '),
+        ])
+
+        out = self.import_recipes(path)
+
+        self.assertEqual(list(Recipe.objects.values_list('title', flat=True)), ['Recipe 1'])
+        self.assertIn('1 recipes, 8 records rejected', out)
+        for record, problem in [(2, 'invalid JSON'), (3, 'not a JSON object'),
+                                (4, 'price must be'), (5, 'time_minutes must be an integer'),
+                                (6, 'unknown user'), (7, 'tags must be a list'),
+                                (8, 'ingredients must be names'), (9, 'title is required')]:
+            self.assertIn(f'Record {record} rejected: {problem}', out)
+
+    def test_records_jsonb_rejects(self):
+        """ Test NUL characters and lone surrogates reject the record, not the batch """
+        jsonl = self.write_jsonl([
+            self.recipe(1),
+            self.recipe(2, title='nul \x00'),
+            r'{"title": "lone \ud800", "time_minutes": 1, "price": 1}',
+            r'{"title": "pair \ud83c\udf70", "time_minutes": 1, "price": 1}',
+        ])
+        csv_path = self.write('recipes.csv', [
+            'title,time_minutes,price,tags',
+            'Recipe 3,10,5.50,[]',
+            'nul \x00,10,5.50,[]',
+            r'Recipe 4,10,5.50,"[""\udc00""]"',
+        ])
+
+        for parse_with_json in (False, True):
+            with self.subTest(parse_with_json=parse_with_json), \
+                    patch('core.management.commands.import_recipes.orjson',
+                          None if parse_with_json else import_recipes.orjson):
+                Recipe.objects.all().delete()
+                out = self.import_recipes(jsonl, csv_path, restart=True)
+
+                self.assertEqual(sorted(Recipe.objects.values_list('title', flat=True)),
+                                 ['Recipe 1', 'Recipe 3', 'pair \U0001f370'])
+                jsonl_out, csv_out = out.split('Importing')[1:]
+                self.assertIn('Record 2 rejected: contains NUL characters', jsonl_out)
+                self.assertIn('Record 3 rejected: contains unpaired surrogates' if parse_with_json
+                              else 'Record 3 rejected: invalid JSON', jsonl_out)
+                # NUL characters are a csv.Error before Python 3.11
+                self.assertRegex(csv_out, 'Record 2 rejected: (contains NUL|invalid CSV)')
+                self.assertIn('Record 3 rejected: contains unpaired surrogates', csv_out)
+
+    def test_import_csv_export(self):
+        """ Test recipes exported as CSV import into another account """
+        recipe = create_recipe(user=self.other, title='Exported, "quoted"')
+        recipe.tags.add(create_tag(user=self.other, name='Dessert, sweet'))
+        client = APIClient()
+        client.force_authenticate(self.other)
+        r = client.get(reverse('recipe:recipe-export'), {'export_format': 'csv'})
+        path = os.path.join(self.directory, 'export.csv')
+        with open(path, 'wb') as file:
+            file.write(b''.join(r.streaming_content))
+
+        self.import_recipes(path)
+
+        imported = Recipe.objects.get(user=self.user)
+        self.assertEqual(imported.title, 'Exported, "quoted"')
+        self.assertEqual(imported.price, recipe.price)
+        self.assertEqual(imported.tags.get().name, 'Dessert, sweet')
+
+    def test_resume(self):
+        path = self.write_jsonl([self.recipe(i) for i in range(5)])
+        merge = ImportCommand._merge
+
+        def fail_second_batch(command, cursor):
+            if Recipe.objects.exists():
+                raise OperationalError('connection lost')
+            merge(command, cursor)
+
+        with patch.object(ImportCommand, '_merge', fail_second_batch):
+            with self.assertRaises(OperationalError):
+                self.import_recipes(path, batch_size=2)
+        self.assertEqual(Recipe.objects.count(), 2)
+        self.assertEqual(ImportCheckpoint.objects.get().records, 2)
+
+        out = self.import_recipes(path, batch_size=2)
+
+        self.assertIn('Resuming', out)
+        self.assertEqual(sorted(Recipe.objects.values_list('title', flat=True)),
+                         [f'Recipe {i}' for i in range(5)])
+
+        # nothing left, unless restarted
+        self.import_recipes(path)
+        self.assertEqual(Recipe.objects.count(), 5)
+        self.import_recipes(path, restart=True)
+        self.assertEqual(Recipe.objects.count(), 10)
+
+    def test_changed_file_not_resumed(self):
+        path = self.write_jsonl([self.recipe(1)])
+        self.import_recipes(path)
+        self.write_jsonl([self.recipe(2)])
+
+        with self.assertRaisesMessage(CommandError, 'use --restart'):
+            self.import_recipes(path)
@@ -0,0 +1,171 @@
+import threading
+from unittest.mock import patch
+
+import psycopg2
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+
+from utils.db_pool import pool as db_pool
+from utils.db_pool.pool import ConnectionPool, PoolTimeout
+
+
+def connect():
+    return psycopg2.connect(**connection.get_connection_params())
+
+
+def backend_pid(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT pg_backend_pid()')
+        return cursor.fetchone()[0]
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        self.pool = ConnectionPool(max_size=2, timeout=0.1)
+        self.addCleanup(self.pool.close)
+
+    def test_connection_reused(self):
+        conn = self.pool.acquire(connect)
+        pid = backend_pid(conn)
+        conn.rollback()
+        self.pool.release(conn)
+
+        conn = self.pool.acquire(connect)
+        self.assertEqual(backend_pid(conn), pid)
+        self.pool.release(conn)
+
+        stats = self.pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['acquired'], 2)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['in_use'], 0)
+
+    def test_acquire_timeout(self):
+        conns = [self.pool.acquire(connect), self.pool.acquire(connect)]
+
+        with self.assertRaises(PoolTimeout):
+            self.pool.acquire(connect)
+        self.assertEqual(self.pool.stats()['timeouts'], 1)
+        self.assertEqual(self.pool.stats()['in_use'], 2)
+
+        self.pool.release(conns[0])
+        self.assertIs(self.pool.acquire(connect), conns[0])
+        for conn in conns:
+            self.pool.release(conn)
+
+    def test_failed_connect_frees_slot(self):
+        with self.assertRaises(psycopg2.OperationalError):
+            self.pool.acquire(lambda: psycopg2.connect(dbname='no_such_db'))
+
+        self.assertEqual(self.pool.stats()['size'], 0)
+        conn = self.pool.acquire(connect)
+        self.pool.release(conn)
+
+    def test_open_transaction_rolled_back(self):
+        conn = self.pool.acquire(connect)
+        with conn.cursor() as cursor:
+            cursor.execute('CREATE TEMPORARY TABLE pool_test (id int)')
+        self.pool.release(conn)
+
+        conn = self.pool.acquire(connect)
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('pool_test')")
+            self.assertIsNone(cursor.fetchone()[0])
+        self.pool.release(conn)
+
+    def test_closed_connection_discarded(self):
+        conn = self.pool.acquire(connect)
+        conn.close()
+        self.pool.release(conn)
+
+        self.assertEqual(self.pool.stats()['size'], 0)
+        self.assertEqual(self.pool.stats()['closed'], 1)
+
+    def test_broken_connection_replaced(self):
+        self.pool.check_interval = 0
+        conn = self.pool.acquire(connect)
+        pid = backend_pid(conn)
+        conn.rollback()
+        self.pool.release(conn)
+
+        # the server ends the idle session
+        other = connect()
+        with other.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+        other.close()
+
+        conn = self.pool.acquire(connect)
+        self.assertNotEqual(backend_pid(conn), pid)
+        self.pool.release(conn)
+        self.assertEqual(self.pool.stats()['failed_checks'], 1)
+
+    def test_check_runs_without_lock(self):
+        """ A hung health check doesn't hold up the other threads """
+        self.pool.check_interval = 0
+        conn = self.pool.acquire(connect)
+        self.pool.release(conn)
+        checking, done = threading.Event(), threading.Event()
+
+        def hung_check(connection, released):
+            checking.set()
+            done.wait(5)
+            return True
+
+        with patch.object(self.pool, '_is_usable', side_effect=hung_check):
+            thread = threading.Thread(target=self.pool.acquire, args=[connect])
+            thread.start()
+            self.assertTrue(checking.wait(5))
+            try:
+                # the other slot can be taken and returned meanwhile
+                other = self.pool.acquire(connect)
+                self.pool.release(other)
+                self.assertEqual(self.pool.stats()['in_use'], 1)
+            finally:
+                done.set()
+                thread.join()
+        self.pool.release(conn)
+
+    def test_max_lifetime(self):
+        self.pool.max_lifetime = 60
+        conn = self.pool.acquire(connect)
+        self.pool.release(conn)
+
+        with patch('utils.db_pool.pool.time.monotonic', side_effect=lambda: 10 ** 9):
+            renewed = self.pool.acquire(connect)
+        self.assertIsNot(renewed, conn)
+        self.assertTrue(conn.closed)
+        self.pool.release(renewed)
+
+    def test_connections_of_parent_process_dropped(self):
+        conn = self.pool.acquire(connect)
+        self.pool.release(conn)
+
+        with patch('utils.db_pool.pool.os.getpid', return_value=-1):
+            renewed = self.pool.acquire(connect)
+            self.assertIsNot(renewed, conn)
+            self.pool.release(renewed)
+        # the parent's connection is left open for the parent
+        self.assertFalse(conn.closed)
+        conn.close()
+
+
+class PooledBackendTests(TransactionTestCase):
+
+    def test_close_returns_connection_to_pool(self):
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            pid = cursor.fetchone()[0]
+        raw = connection.connection
+        connection.close()
+
+        self.assertFalse(raw.closed)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            self.assertEqual(cursor.fetchone()[0], pid)
+
+        stats = db_pool.get_pool_stats()['default']
+        self.assertGreaterEqual(stats['created'], 1)
+        self.assertEqual(stats['in_use'], 1)
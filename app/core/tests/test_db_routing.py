@@ -0,0 +1,168 @@
+from rest_framework.test import APIClient
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, router
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from recipe.models import Recipe, Tag
+from utils import db_routing
+from utils.db_routing import ReplicaRouter, is_pinned
+from utils.help_test_utils import create_user
+
+
+REPLICA = 'replica'
+
+RECIPE_LIST_URL = reverse('recipe:recipe-list')
+TAG_LIST_URL = reverse('recipe:tag-list')
+USER_DETAIL_URL = reverse('core:detail')
+
+
+@override_settings(
+    DATABASE_REPLICAS={'aliases': [REPLICA], 'pin_seconds': 60, 'cache': 'default'},
+    RECIPE_LIST_CACHE={'BACKEND': 'recipe.cache.DummyBackend'})
+class ReplicaRoutingTests(TestCase):
+    """
+    Test routing against a second database standing in for a replica, it isn't
+    replicated so every row tells which database it was read from.
+    """
+
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        primary = connections.databases['default']
+        connections.databases[REPLICA] = dict(
+            primary, TEST={'NAME': f"{primary['NAME']}_{REPLICA}"})
+        cls.replica_name = connections[REPLICA].settings_dict['NAME']
+        connections[REPLICA].creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].creation.destroy_test_db(cls.replica_name, verbosity=0)
+        del connections.databases[REPLICA]
+        delattr(connections._connections, REPLICA)
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        user = create_user()
+        user.save(using=REPLICA)
+        self.user = get_user_model().objects.get(pk=user.pk)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_read_from_replica(self):
+        Recipe(user=self.user, title='Replica', time_minutes=5, price=1).save(using=REPLICA)
+        Tag(user=self.user, name='Replica').save(using=REPLICA)
+
+        with self.assertNumQueries(0, using='default'):
+            recipes = self.client.get(RECIPE_LIST_URL).data
+            tags = self.client.get(TAG_LIST_URL).data
+
+        self.assertEqual([recipe['title'] for recipe in recipes], ['Replica'])
+        self.assertEqual([tag['name'] for tag in tags], ['Replica'])
+
+    def test_retrieve_read_from_replica(self):
+        recipe = Recipe(user=self.user, title='Replica', time_minutes=5, price=1)
+        recipe.save(using=REPLICA)
+
+        r = self.client.get(reverse('recipe:recipe-detail', args=[recipe.pk]))
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data['title'], 'Replica')
+
+    def test_write_goes_to_primary_and_pins_user(self):
+        payload = {'title': 'Primary', 'time_minutes': 5, 'price': 1}
+        r = self.client.post(RECIPE_LIST_URL, payload)
+
+        self.assertEqual(r.status_code, 201)
+        self.assertTrue(Recipe.objects.using('default').filter(title='Primary').exists())
+        self.assertFalse(Recipe.objects.using(REPLICA).exists())
+        self.assertTrue(is_pinned(self.user.pk))
+
+        # the user reads their own write
+        with self.assertNumQueries(0, using=REPLICA):
+            recipes = self.client.get(RECIPE_LIST_URL).data
+        self.assertEqual([recipe['title'] for recipe in recipes], ['Primary'])
+
+    def test_pin_expires(self):
+        self.client.post(TAG_LIST_URL, {'name': 'Primary'})
+        cache.clear()
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get(TAG_LIST_URL).data, [])
+
+        self.client.post(TAG_LIST_URL, {'name': 'Other'})
+        cache.clear()
+        with override_settings(DATABASE_REPLICAS={'aliases': [REPLICA], 'pin_seconds': -1}):
+            self.assertEqual(self.client.get(TAG_LIST_URL).data, [])
+
+    def test_pin_cookie_reaches_other_workers(self):
+        """ Test the pin holds on a worker whose cache never saw the write """
+        self.client.post(TAG_LIST_URL, {'name': 'Primary'})
+        cache.clear()
+
+        r = self.client.get(TAG_LIST_URL)
+        self.assertEqual([tag['name'] for tag in r.data], ['Primary'])
+
+    def test_pin_cookie_of_other_user_ignored(self):
+        self.client.post(TAG_LIST_URL, {'name': 'Primary'})
+        cache.clear()
+
+        other = create_user(email='other@example.com')
+        other.save(using=REPLICA)
+        self.client.force_authenticate(other)
+        with self.assertNumQueries(0, using='default'):
+            self.client.get(TAG_LIST_URL)
+
+    def test_pin_limited_to_user(self):
+        self.client.post(TAG_LIST_URL, {'name': 'Primary'})
+
+        other = create_user(email='other@example.com')
+        other.save(using=REPLICA)
+        self.assertFalse(is_pinned(other.pk))
+
+    def test_rejected_write_does_not_pin(self):
+        r = self.client.post(RECIPE_LIST_URL, {'title': 'No price'})
+
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(is_pinned(self.user.pk))
+
+    def test_manage_user(self):
+        # the user is the authenticated one, read from the primary (or token cache)
+        with self.assertNumQueries(0, using='default'):
+            self.client.get(USER_DETAIL_URL)
+
+        self.client.patch(USER_DETAIL_URL, {'name': 'Primary'})
+
+        self.assertEqual(get_user_model().objects.get(pk=self.user.pk).name, 'Primary')
+        self.assertEqual(get_user_model().objects.using(REPLICA).get(pk=self.user.pk).name,
+                         'Test name')
+        self.assertTrue(is_pinned(self.user.pk))
+
+    def test_no_replicas(self):
+        Tag(user=self.user, name='Replica').save(using=REPLICA)
+
+        with override_settings(DATABASE_REPLICAS={'aliases': []}):
+            self.assertEqual(self.client.get(TAG_LIST_URL).data, [])
+
+    def test_reads_outside_views_use_primary(self):
+        self.assertIsNone(ReplicaRouter().db_for_read(Recipe))
+
+    def test_instances_read_from_replica_written_to_primary(self):
+        Recipe(user=self.user, title='Replica', time_minutes=5, price=1).save(using=REPLICA)
+        recipe = Recipe.objects.using(REPLICA).get()
+
+        # as in a request served from the replica
+        token = db_routing._state.set(db_routing.RoutingState())
+        try:
+            self.assertEqual(router.db_for_write(Recipe, instance=recipe), 'default')
+            recipe.title = 'Primary'
+            recipe.save()
+        finally:
+            db_routing._state.reset(token)
+        self.assertEqual(Recipe.objects.using('default').get().title, 'Primary')
+        self.assertEqual(Recipe.objects.using(REPLICA).get().title, 'Replica')
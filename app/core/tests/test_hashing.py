@@ -0,0 +1,141 @@
+import threading
+from unittest.mock import patch
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import hashing
+from utils.help_test_utils import create_user
+
+CREATE_USER_URL = reverse('core:create')
+TOKEN_URL = reverse('core:token')
+ME_URL = reverse('core:detail')
+
+
+UserModel = get_user_model()
+
+
+class HashingExecutorTests(TestCase):
+    """ Test password hashing runs in a bounded executor """
+
+    def setUp(self):
+        self.payload = dict(email='test@example.com', password='password123', name='Test name')
+        self.client = APIClient()
+
+    def use_executor(self, **options):
+        executor_settings = override_settings(PASSWORD_HASHING=options)
+        executor_settings.enable()
+        self.addCleanup(executor_settings.disable)
+
+    def block_executor(self):
+        """ Occupy the only worker until the test ends """
+        release = threading.Event()
+        hashing.get_executor().submit(release.wait)
+        self.addCleanup(release.set)
+
+    def test_login_saturated(self):
+        """ Test logins are rejected with 429 when pool and queue are full """
+        create_user(**self.payload)
+        self.use_executor(max_workers=1, max_queue=0, timeout=5)
+        self.block_executor()
+
+        r = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(r.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(hashing.get_executor().stats()['rejected'], 1)
+
+    def test_signup_saturated(self):
+        self.use_executor(max_workers=1, max_queue=0, timeout=5)
+        self.block_executor()
+
+        r = self.client.post(CREATE_USER_URL, self.payload)
+
+        self.assertEqual(r.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(UserModel.objects.exists())
+
+    def test_login_timeout(self):
+        """ Test a hash waiting longer than the timeout returns 503 """
+        create_user(**self.payload)
+        self.use_executor(max_workers=1, max_queue=1, timeout=0.05)
+        self.block_executor()
+
+        r = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(r.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(hashing.get_executor().stats()['timed_out'], 1)
+
+    def test_password_change_saturated(self):
+        user = create_user(**self.payload)
+        self.client.force_authenticate(user)
+        self.use_executor(max_workers=1, max_queue=0, timeout=5)
+        self.block_executor()
+
+        r = self.client.patch(ME_URL, {'password': 'newpassword123'})
+
+        self.assertEqual(r.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        user.refresh_from_db()
+        self.assertTrue(user.check_password(self.payload['password']))
+
+    def test_model_hashes_synchronously(self):
+        """ Test the model (admin, management commands) doesn't use the executor """
+        self.use_executor(max_workers=1, max_queue=0, timeout=5)
+        self.block_executor()
+
+        user = create_user(**self.payload)
+
+        self.assertTrue(user.check_password(self.payload['password']))
+        self.assertEqual(hashing.get_executor().stats()['rejected'], 0)
+
+    def test_times_recorded(self):
+        self.use_executor(max_workers=1, max_queue=1, timeout=5)
+        self.client.post(CREATE_USER_URL, self.payload)
+
+        stats = hashing.get_executor().stats()
+        self.assertEqual(stats['completed'], 1)
+        self.assertGreater(stats['hash_time'], 0)
+
+    @patch('core.hashing.upgrade_password_in_background')
+    def test_outdated_hash_upgraded(self, upgrade):
+        """ Test logging in with an outdated hash schedules an upgrade """
+        user = create_user(**self.payload)
+        user.password = make_password(self.payload['password'], hasher='pbkdf2_sha1')
+        user.save()
+
+        r = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        upgrade.assert_called_once_with(
+            UserModel, user.pk, user.password, self.payload['password'])
+
+    @patch('core.hashing.upgrade_password_in_background')
+    def test_current_hash_not_upgraded(self, upgrade):
+        create_user(**self.payload)
+        self.client.post(TOKEN_URL, self.payload)
+
+        upgrade.assert_not_called()
+
+    def test_upgrade_password(self):
+        user = create_user(**self.payload)
+        outdated = make_password(self.payload['password'], hasher='pbkdf2_sha1')
+        UserModel.objects.filter(pk=user.pk).update(password=outdated)
+
+        hashing.upgrade_password(UserModel, user.pk, outdated, self.payload['password'])
+
+        user.refresh_from_db()
+        self.assertEqual(identify_hasher(user.password).algorithm, 'pbkdf2_sha256')
+        self.assertTrue(user.check_password(self.payload['password']))
+
+    def test_upgrade_password_changed_meanwhile(self):
+        """ Test a password changed since the login is not overwritten """
+        user = create_user(**self.payload)
+        current = user.password
+
+        hashing.upgrade_password(UserModel, user.pk, 'outdated', self.payload['password'])
+
+        user.refresh_from_db()
+        self.assertEqual(user.password, current)
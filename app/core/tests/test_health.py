@@ -0,0 +1,56 @@
+from unittest.mock import patch
+
+from django.db.utils import OperationalError
+from django.test import TestCase
+from django.urls import reverse
+
+from core import health
+
+
+LIVE_URL = reverse('health-live')
+READY_URL = reverse('health-ready')
+
+
+class HealthEndpointTests(TestCase):
+
+    def setUp(self):
+        self.addCleanup(health._migrated.clear)
+
+    def test_live(self):
+        with self.assertNumQueries(0):
+            r = self.client.get(LIVE_URL)
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json(), {'status': 'ok'})
+        self.assertIn('no-cache', r['Cache-Control'])
+
+    def test_ready(self):
+        r = self.client.get(READY_URL)
+
+        self.assertEqual(r.status_code, 200)
+        checks = r.json()['checks']
+        self.assertTrue(checks['database']['ok'])
+        self.assertEqual(checks['migrations']['unapplied'], 0)
+
+    def test_ready_checks_migrations_once(self):
+        self.client.get(READY_URL)
+
+        with patch('core.health.MigrationExecutor') as executor, self.assertNumQueries(1):
+            r = self.client.get(READY_URL)
+        self.assertEqual(r.status_code, 200)
+        executor.assert_not_called()
+
+    @patch('core.health.check_database', side_effect=OperationalError('connection refused'))
+    def test_not_ready_without_database(self, check):
+        r = self.client.get(READY_URL)
+
+        self.assertEqual(r.status_code, 503)
+        self.assertEqual(r.json()['status'], 'unavailable')
+        self.assertEqual(r.json()['checks']['database']['error'], 'connection refused')
+
+    @patch('core.health.get_unapplied_migrations', return_value=['recipe.0011_image_files'])
+    def test_not_ready_with_unapplied_migrations(self, unapplied):
+        r = self.client.get(READY_URL)
+
+        self.assertEqual(r.status_code, 503)
+        self.assertEqual(r.json()['checks']['migrations']['unapplied'], 1)
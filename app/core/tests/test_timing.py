@@ -0,0 +1,196 @@
+import json
+import os
+import shutil
+import tempfile
+
+from rest_framework.test import APIClient
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.authentication import get_token_cache
+from utils import metrics
+from utils.help_test_utils import create_recipe, create_user
+
+
+RECIPE_LIST_URL = reverse('recipe:recipe-list')
+METRICS_URL = reverse('metrics')
+
+
+class ServerTimingTests(TestCase):
+    """ Test the Server-Timing header and the recorded histograms """
+
+    def setUp(self):
+        override = override_settings(PERFORMANCE_METRICS={'header': True})
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_header(self):
+        create_recipe(user=self.user)
+
+        with self.assertNumQueries(4) as queries:
+            r = self.client.get(RECIPE_LIST_URL)
+
+        timings = dict(part.split(';', 1) for part in r['Server-Timing'].split(', '))
+        self.assertEqual(set(timings), {'db', 'serialize', 'render', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', timings['db'])
+
+    def test_header_disabled(self):
+        with override_settings(PERFORMANCE_METRICS={'header': False}):
+            r = self.client.get(RECIPE_LIST_URL)
+
+        self.assertNotIn('Server-Timing', r)
+
+    def test_header_staff_only(self):
+        with override_settings(PERFORMANCE_METRICS={'header': 'staff'}):
+            r = self.client.get(RECIPE_LIST_URL)
+            self.assertNotIn('Server-Timing', r)
+
+            self.client.force_authenticate(create_user(email='staff@example.com', is_staff=True))
+            r = self.client.get(RECIPE_LIST_URL)
+            self.assertIn('Server-Timing', r)
+
+    def test_histograms_labelled_by_view_and_method(self):
+        self.client.get(RECIPE_LIST_URL)
+        self.client.get(RECIPE_LIST_URL)
+        self.client.post(RECIPE_LIST_URL, {'title': 'Cake', 'time_minutes': 5, 'price': 1})
+
+        text = self.client.get(METRICS_URL).content.decode()
+
+        self.assertIn('http_request_duration_seconds_count'
+                      '{view="recipe:recipe-list",method="GET"} 2', text)
+        self.assertIn('http_request_serialize_seconds_count'
+                      '{view="recipe:recipe-list",method="POST"} 1', text)
+        self.assertIn('http_requests_total'
+                      '{view="recipe:recipe-list",method="POST",status="201"} 1', text)
+        self.assertIn('http_request_queries_bucket'
+                      '{view="recipe:recipe-list",method="GET",le="+Inf"} 2', text)
+
+    def test_stats_exposed(self):
+        text = self.client.get(METRICS_URL).content.decode()
+
+        self.assertIn('# TYPE token_auth_cache_hits_total counter', text)
+        self.assertIn('# TYPE password_hashing_completed_total counter', text)
+        self.assertIn('# TYPE recipe_list_cache_misses_total counter', text)
+        self.assertIn(f'token_auth_cache_entries{{pid="{os.getpid()}"}}', text)
+
+
+@override_settings(PERFORMANCE_METRICS={'token': 'secret', 'allowed_networks': ['10.1.0.0/16']})
+class MetricsAccessTests(TestCase):
+    """ Test /metrics/ is only served to allowed addresses, the token and staff """
+
+    def test_allowed_network(self):
+        r = self.client.get(METRICS_URL, REMOTE_ADDR='10.1.2.3')
+
+        self.assertEqual(r.status_code, 200)
+
+    def test_other_address_forbidden(self):
+        r = self.client.get(METRICS_URL, REMOTE_ADDR='10.2.0.1')
+
+        self.assertEqual(r.status_code, 403)
+
+    def test_token(self):
+        r = self.client.get(METRICS_URL, REMOTE_ADDR='10.2.0.1',
+                            HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(r.status_code, 200)
+
+        r = self.client.get(METRICS_URL, REMOTE_ADDR='10.2.0.1',
+                            HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(r.status_code, 403)
+
+    def test_staff(self):
+        self.client.force_login(create_user(is_staff=True))
+
+        r = self.client.get(METRICS_URL, REMOTE_ADDR='10.2.0.1')
+
+        self.assertEqual(r.status_code, 200)
+
+
+class MultiProcessMetricsTests(TestCase):
+    """ Test merging the snapshots of several worker processes """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = override_settings(
+            PERFORMANCE_METRICS={'header': True, 'directory': self.directory, 'flush_interval': 0})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def write_snapshot(self, pid, name):
+        snapshot = {
+            'pid': pid,
+            'histograms': [['http_request_duration_seconds', [['view', 'health-live']],
+                            [0.1, 1], [2, 1, 0], 0.7]],
+            'counters': [['token_auth_cache_hits_total', [], 5]],
+            'gauges': [['token_auth_cache_entries', [], 3]],
+        }
+        with open(os.path.join(self.directory, f'metrics-{name}.json'), 'w') as file:
+            json.dump(snapshot, file)
+
+    def test_flush_on_request(self):
+        self.client.get(reverse('health-live'))
+
+        files = os.listdir(self.directory)
+        self.assertEqual(len(files), 1)
+        with open(os.path.join(self.directory, files[0])) as file:
+            self.assertEqual(json.load(file)['pid'], os.getpid())
+
+    def test_snapshots_merged(self):
+        # a live worker (the parent of this process) and an exited one
+        self.write_snapshot(os.getppid(), 'live')
+        self.write_snapshot(2 ** 22 + 1, 'exited')
+        self.client.get(reverse('health-live'))
+
+        text = self.client.get(METRICS_URL).content.decode()
+
+        # 3 + 3 observed by the other workers, 1 by this one
+        self.assertIn('http_request_duration_seconds_bucket'
+                      '{view="health-live",le="0.1"} 4', text)
+        self.assertIn('http_request_duration_seconds_count{view="health-live"} 6', text)
+        self.assertIn('http_request_duration_seconds_count'
+                      '{view="health-live",method="GET"} 1', text)
+        hits = get_token_cache().hits
+        self.assertIn(f'\ntoken_auth_cache_hits_total {5 + 5 + hits}\n', text)
+        # gauges of live processes only
+        self.assertIn(f'token_auth_cache_entries{{pid="{os.getppid()}"}} 3', text)
+        self.assertNotIn(f'pid="{2 ** 22 + 1}"', text)
+
+    def test_exited_snapshots_pruned(self):
+        """ Test snapshots of exited workers are folded into one file, keeping their totals """
+        for i in range(3):
+            self.write_snapshot(2 ** 22 + i, f'exited-{i}')
+
+        for _ in range(2):
+            text = self.client.get(METRICS_URL).content.decode()
+            self.assertIn('http_request_duration_seconds_count{view="health-live"} 9', text)
+            self.assertIn(f'\ntoken_auth_cache_hits_total {15 + get_token_cache().hits}\n', text)
+
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory) if name.endswith('.json')),
+            [metrics.EXITED_FILE, f'metrics-{metrics.get_registry().key}.json'])
+
+        self.write_snapshot(2 ** 22 + 3, 'exited-3')
+        text = self.client.get(METRICS_URL).content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="health-live"} 12', text)
+
+    def test_concurrent_flush_skipped(self):
+        """ Test a thread doesn't write the snapshot while another one is writing it """
+        registry = metrics.get_registry()
+        with registry.flush_lock:
+            metrics.flush(registry)
+
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_unreadable_snapshot_skipped(self):
+        with open(os.path.join(self.directory, 'metrics-broken.json'), 'w') as file:
+            file.write('{"pid"')
+
+        r = self.client.get(METRICS_URL)
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r['Content-Type'], metrics.CONTENT_TYPE)
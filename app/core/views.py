@@ -1,25 +1,48 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.exceptions import APIException, Throttled
 from rest_framework.settings import api_settings
 
+from django.utils.translation import gettext_lazy as _
+
+from core import hashing
+from core.authentication import CachedTokenAuthentication
 from core.serializers import AuthTokenSerializer, UserSerializer
+from utils.db_routing import ReplicaReadMixin
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Password hashing is temporarily unavailable, try again later.')
+    default_code = 'hashing_unavailable'
+
+
+class HashingErrorsMixin:
+    """ Answer 429 when the hashing executor is full and 503 when a hash timed out """
+
+    def handle_exception(self, exc):
+        if isinstance(exc, hashing.HashingBusy):
+            exc = Throttled(wait=1)
+        elif isinstance(exc, hashing.HashingTimeout):
+            exc = HashingUnavailable()
+        return super().handle_exception(exc)
 
 
-class CreateuserView(generics.CreateAPIView):
+class CreateuserView(HashingErrorsMixin, generics.CreateAPIView):
     serializer_class = UserSerializer
 
 
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(HashingErrorsMixin, ObtainAuthToken):
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(HashingErrorsMixin, ReplicaReadMixin, generics.RetrieveUpdateAPIView):
     """ Manage the authenticated user """
 
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
 
     def get_object(self):
         return self.request.user
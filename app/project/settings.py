@@ -25,13 +25,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
-    'core',
-    'recipe'
+    'core.apps.CoreConfig',
+    'recipe.apps.RecipeConfig'
 ]
 
 MIDDLEWARE = [
+    'utils.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,16 +66,44 @@ WSGI_APPLICATION = 'project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
+# connections are leased from an in-process pool (utils/db_pool) for each request,
+# CONN_MAX_AGE stays 0 so they're returned as soon as the request ends
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'utils.db_pool',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
-        'PASSWORD': os.environ.get('DB_PASS')
+        'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'max_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+            'max_lifetime': 30 * 60,
+            'check_interval': 30,
+        },
     }
 }
 
+# Read replicas, DB_REPLICA_HOSTS is a comma separated list of hosts serving copies of
+# the primary. Safe requests of the API views read from them (see utils/db_routing.py).
+DATABASE_REPLICAS = {
+    'aliases': [],
+    # a user who wrote reads from the primary for this many seconds
+    'pin_seconds': int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5)),
+    # pins travel in a signed cookie, the cache also pins clients without cookies on
+    # the worker that handled their write (every worker when it's shared)
+    'cache': 'default',
+    'cookie': 'db_pin',
+}
+for number, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    alias = f'replica_{number}'
+    # tests read and write the primary's test database through the replica aliases
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS['aliases'].append(alias)
+
+DATABASE_ROUTERS = ['utils.db_routing.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -117,5 +147,58 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Hash uploads while they are received, recipe images are stored by content (see recipe/storage.py)
+FILE_UPLOAD_HANDLERS = [
+    'recipe.storage.MemoryFileUploadHandler',
+    'recipe.storage.TemporaryFileUploadHandler',
+]
+
+# How MEDIA_URL files are sent: 'sendfile' by this process, 'x-accel-redirect' by nginx
+# or 'x-sendfile' by Apache/lighttpd (see utils/media.py)
+MEDIA_SERVING = {
+    'backend': os.environ.get('MEDIA_SERVING_BACKEND', 'sendfile'),
+    'internal_prefix': '/protected-media/',
+    'max_age': 3600,
+}
+
 
 AUTH_USER_MODEL = 'core.User'
+
+
+# Cache of tag, ingredient and recipe list responses (see recipe/cache.py)
+RECIPE_LIST_CACHE = {
+    'BACKEND': 'recipe.cache.LocMemBackend',
+    'OPTIONS': {'max_entries': 1024, 'timeout': 60},
+}
+
+# Serve list responses from .values() rows instead of the list serializers (see recipe/rows.py)
+RECIPE_FAST_LIST = True
+
+# Recipes read and encoded at a time by streaming exports (see recipe/export.py)
+RECIPE_EXPORT_CHUNK_SIZE = 2000
+
+# Process pool rendering recipe image variants, 0 renders them in the request (see recipe/images.py)
+RECIPE_IMAGE_PROCESSING = {'workers': 2}
+
+# In-process cache of token authentication lookups (see core/authentication.py)
+TOKEN_AUTH_CACHE = {'max_entries': 4096, 'ttl': 30}
+
+# Bounded executor for password hashing (see core/hashing.py)
+PASSWORD_HASHING = {'max_workers': 2, 'max_queue': 8, 'timeout': 5}
+
+# Views whose safe requests run concurrently on a thread pool under ASGI (see utils/asgi.py),
+# comma separated view names, e.g. recipe:recipe-list,recipe:recipe-detail. None by default,
+# threaded WSGI workers serve these reads faster
+ASGI_READ_VIEWS = list(filter(None, os.environ.get('ASGI_READ_VIEWS', '').split(',')))
+ASGI_READ_WORKERS = 32
+
+# Server-Timing header and latency histograms served on /metrics/ (see utils/timing.py). Worker
+# processes of a host share their metrics through METRICS_DIR (see utils/metrics.py). /metrics/
+# answers local addresses, requests with the METRICS_TOKEN bearer token and staff users
+PERFORMANCE_METRICS = {
+    'header': 'staff',
+    'directory': os.environ.get('METRICS_DIR'),
+    'flush_interval': 1,
+    'token': os.environ.get('METRICS_TOKEN'),
+    'allowed_networks': ['127.0.0.0/8', '::1/128'],
+}
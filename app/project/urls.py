@@ -1,11 +1,20 @@
+import re
+
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from core import health
+from utils import media, metrics
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('health/live/', health.live, name='health-live'),
+    path('health/ready/', health.ready, name='health-ready'),
+    path('metrics/', metrics.metrics, name='metrics'),
     path('api/user/', include('core.urls')),
-    path('api/recipe/', include('recipe.urls'))
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('api/recipe/', include('recipe.urls')),
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), media.serve,
+            name='media'),
+]
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class RecipeConfig(AppConfig):
     name = 'recipe'
+
+    def ready(self):
+        from django.db.models import CharField, ForeignKey
+
+        from recipe import signals  # noqa: F401 (connects receivers)
+        from recipe.lookups import AnyOf, TrigramWordSimilar
+
+        CharField.register_lookup(TrigramWordSimilar)
+        ForeignKey.register_lookup(AnyOf)
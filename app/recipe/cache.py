@@ -0,0 +1,190 @@
+import hashlib
+import threading
+import time
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from utils.lru import LRUCache
+
+
+DEFAULT_SETTINGS = {
+    'BACKEND': 'recipe.cache.LocMemBackend',
+    'OPTIONS': {'max_entries': 1024, 'timeout': 60},
+}
+
+
+class LocMemBackend:
+    """
+    Bounded per-process backend, evicting least recently used entries.
+
+    Versions are bumped only in the process that handled the write, with several
+    worker processes other workers serve their copy until it times out. Use
+    DjangoCacheBackend with a shared cache where that matters.
+    """
+
+    def __init__(self, max_entries=1024, timeout=60):
+        self._cache = LRUCache(max_entries=max_entries, ttl=timeout)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class DjangoCacheBackend:
+    """ Backend storing entries in one of the configured django CACHES (e.g. shared redis) """
+
+    def __init__(self, alias='default', timeout=60):
+        self._cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value, self.timeout)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class DummyBackend:
+    """ Backend that stores nothing, disables list caching """
+
+    def __init__(self, **kwargs):
+        pass
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+
+class ListCache:
+    """
+    Cache of list responses keyed on user, endpoint, query parameters and a per-user
+    data version. Bumping the version makes all cached lists of the user unreachable,
+    old entries are then evicted (or expire) from the backend.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        # shared by the threads of the process (ASGI read pool, threaded WSGI)
+        self._stats_lock = threading.Lock()
+
+    def _version_key(self, user_id):
+        return f'recipe:list:version:{user_id}'
+
+    def get_version(self, user_id):
+        version = self.backend.get(self._version_key(user_id))
+        if version is None:
+            # never restart from a fixed value, lists cached under an evicted
+            # version must not become reachable again
+            version = self.bump_version(user_id)
+        return version
+
+    def bump_version(self, user_id):
+        version = time.time_ns()
+        self.backend.set(self._version_key(user_id), version)
+        return version
+
+    def make_key(self, request, prefix):
+        user_id = request.user.pk
+        params = sorted(
+            (key, value) for key, values in request.query_params.lists() for value in values)
+        # pagination links and image URLs are absolute, so scheme and host are
+        # part of the response
+        raw = f'{request.scheme}|{request.get_host()}|{params}'
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        return f'recipe:list:{prefix}:{user_id}:{self.get_version(user_id)}:{digest}'
+
+    def get(self, key):
+        data = self.backend.get(key)
+        with self._stats_lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def set(self, key, data):
+        self.backend.set(key, data)
+
+    def stats(self):
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+        }
+
+
+_list_cache = None
+_lock = threading.Lock()
+
+
+def get_list_cache():
+    """ Return the process wide list cache configured by RECIPE_LIST_CACHE """
+    global _list_cache
+    if _list_cache is None:
+        with _lock:
+            if _list_cache is None:
+                config = getattr(settings, 'RECIPE_LIST_CACHE', DEFAULT_SETTINGS)
+                backend_class = import_string(config['BACKEND'])
+                _list_cache = ListCache(backend_class(**config.get('OPTIONS', {})))
+    return _list_cache
+
+
+@receiver(setting_changed)
+def reset_list_cache(setting, **kwargs):
+    global _list_cache
+    if setting == 'RECIPE_LIST_CACHE':
+        _list_cache = None
+
+
+def invalidate_user_lists(user_id):
+    """
+    Bump the data version of a user right away (for reads later in the same
+    transaction) and again on commit, so lists cached by concurrent requests
+    between the write and the commit are dropped as well.
+    """
+    cache = get_list_cache()
+    cache.bump_version(user_id)
+    transaction.on_commit(lambda: cache.bump_version(user_id))
+
+
+class CachedListMixin:
+    """ Serve the list action of a viewset from the list cache """
+
+    def list(self, request, *args, **kwargs):
+        cache = get_list_cache()
+        key = cache.make_key(request, self.basename)
+
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data)
+        return response
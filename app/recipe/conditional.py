@@ -0,0 +1,74 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GETs of list and retrieve actions with 304 Not Modified.
+
+    Validators are computed from `updated_at` with a single aggregate query, rows
+    are neither loaded nor serialized when the client copy is still fresh.
+    """
+
+    updated_field = 'updated_at'
+
+    def _etag(self, *parts):
+        # image URLs in the payload are absolute, built from the request's scheme and host
+        parts += (self.request.accepted_renderer.format, self.request.scheme,
+                  self.request.get_host())
+        return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+    def _conditional_response(self, response, etag, last_modified=None):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def _list_state(self, queryset):
+        """ Return what the list response depends on, without loading full rows """
+        paginator = self.paginator
+        if paginator is not None and paginator.get_page_size(self.request):
+            # validate only the requested page, keeps pages free of COUNT(*)
+            ordering = [field.lstrip('-') for field in
+                        paginator.get_ordering(self.request, queryset, self)]
+            rows = queryset.values('pk', self.updated_field, *ordering)
+            page = paginator.paginate_queryset(rows, self.request, view=self)
+            links = (getattr(paginator, 'has_next', None), getattr(paginator, 'has_previous', None))
+            return [tuple(row.values()) for row in page], links
+
+        # deleted rows don't move max(updated_at) so the row count is part of the
+        # state, for the same reason lists are not validated with Last-Modified
+        state = queryset.order_by().aggregate(count=Count('pk'), updated=Max(self.updated_field))
+        return state['count'], state['updated']
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        etag = self._etag(self._list_state(queryset), sorted(request.query_params.lists()))
+
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return self._conditional_response(not_modified, etag)
+
+        return self._conditional_response(super().list(request, *args, **kwargs), etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        updated = self.get_queryset().prefetch_related(None).filter(**lookup).values_list(
+            self.updated_field, flat=True).first()
+        if updated is None:
+            # let the regular path answer 404
+            return super().retrieve(request, *args, **kwargs)
+
+        etag = self._etag(lookup, updated)
+        last_modified = int(updated.timestamp())
+
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return self._conditional_response(not_modified, etag, last_modified)
+
+        return self._conditional_response(
+            super().retrieve(request, *args, **kwargs), etag, last_modified)
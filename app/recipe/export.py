@@ -0,0 +1,108 @@
+"""
+Streaming exports of a user's recipes.
+
+Recipes are read newest first in chunks of up to RECIPE_EXPORT_CHUNK_SIZE, each
+one query continuing after the id the previous chunk ended with (`id < last`,
+like cursor pages), with the tags and ingredients of each chunk loaded by one
+query per relation (see recipe/rows.py). Every chunk is encoded and sent before
+the next one is read. Memory stays bounded by the chunk size whatever the size
+of the collection, and as the first chunks are small the first bytes leave
+within milliseconds.
+
+No transaction or cursor stays open while a slow client downloads: each query
+is short, so replicas don't cancel it on recovery conflicts and the primary's
+vacuum isn't held back. Recipes created during an export are left out, and so
+are recipes deleted before their chunk is read.
+"""
+import csv
+import io
+import json
+
+from rest_framework.negotiation import DefaultContentNegotiation
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from recipe.renderers import FastJSONRenderer
+from recipe.rows import build_rows, get_columns
+from recipe.serializers import RecipeDetailSerializer
+
+
+DEFAULT_CHUNK_SIZE = 2000
+# chunks grow from this size to the chunk size, so the first bytes leave early
+FIRST_CHUNK_SIZE = 50
+
+# CSV cells of the nested tags and ingredients are JSON lists of their names
+CSV_COLUMNS = ('id', 'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients')
+
+
+def _ndjson(chunk, first):
+    renderer = FastJSONRenderer()
+    return b''.join(renderer.render(item) + b'\n' for item in chunk)
+
+
+def _csv(chunk, first):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if first:
+        writer.writerow(CSV_COLUMNS)
+    for item in chunk:
+        item = dict(item, **{name: json.dumps([row['name'] for row in item[name]],
+                                              ensure_ascii=False)
+                             for name in ('tags', 'ingredients')})
+        writer.writerow([item[column] for column in CSV_COLUMNS])
+    return buffer.getvalue().encode()
+
+
+# export_format: (encoder, content type, file extension)
+EXPORT_FORMATS = {
+    'ndjson': (_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (_csv, 'text/csv; charset=utf-8', 'csv'),
+}
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """ The format is chosen with `export_format`, so any Accept header is fine """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def iter_chunks(queryset, context=None, chunk_size=None):
+    """ Yield lists of RecipeDetailSerializer equivalent dicts, newest first """
+    chunk_size = chunk_size or getattr(settings, 'RECIPE_EXPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    rows = queryset.order_by('-id').values(*get_columns(RecipeDetailSerializer))
+    size = min(FIRST_CHUNK_SIZE, chunk_size)
+    last_id = None
+    while True:
+        chunk = list((rows if last_id is None else rows.filter(id__lt=last_id))[:size])
+        if chunk:
+            yield build_rows(RecipeDetailSerializer, chunk, context)
+        if len(chunk) < size:
+            return
+        last_id = chunk[-1]['id']
+        size = min(size * 2, chunk_size)
+
+
+def _stream(queryset, encode, context):
+    first = True
+    for chunk in iter_chunks(queryset, context):
+        yield encode(chunk, first)
+        first = False
+    if first:
+        # headers of an empty CSV export
+        yield encode([], first)
+
+
+def export_response(queryset, export_format, context=None, filename='recipes'):
+    """ Return a response streaming the recipes of the queryset """
+    encode, content_type, extension = EXPORT_FORMATS[export_format]
+    # the database is picked now, the rows are read once the view has returned
+    queryset = queryset.prefetch_related(None).using(queryset.db)
+
+    response = StreamingHttpResponse(_stream(queryset, encode, context),
+                                     content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    # sent as it's read, not buffered by a proxy in front
+    response['X-Accel-Buffering'] = 'no'
+    return response
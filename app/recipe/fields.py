@@ -0,0 +1,122 @@
+"""
+Related fields validating submitted ids in batches.
+
+`UserScopedPrimaryKeyRelatedField(many=True)` resolves the whole list of ids with
+one query limited to the request user's rows. Bulk writes share a
+`RelatedObjectCache` through the serializer context, so the ids of all items are
+loaded once per field (see `prime_related_objects`).
+"""
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from django.utils.translation import gettext_lazy as _
+
+
+class RelatedObjectCache:
+    """ Related objects by model and pk, kept for the duration of one request """
+
+    def __init__(self):
+        self._objects = {}
+
+    def get_many(self, model, pks, load):
+        """ Return {pk: object} of found pks, `load(pks)` is called for pks not seen before """
+        known = self._objects.setdefault(model, {})
+        unknown = [pk for pk in pks if pk not in known]
+        if unknown:
+            found = load(unknown)
+            for pk in unknown:
+                known[pk] = found.get(pk)
+
+        return {pk: known[pk] for pk in pks if known[pk] is not None}
+
+
+class UserScopedManyRelatedField(serializers.ManyRelatedField):
+    """ List of primary keys validated with a single query """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        return self.child_relation.to_internal_values(data)
+
+
+class UserScopedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """ Primary key related field accepting only objects owned by the request user """
+
+    default_error_messages = {
+        'does_not_exist_many': _('Invalid pks {pk_values} - objects do not exist.'),
+    }
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return UserScopedManyRelatedField(**list_kwargs)
+
+    def get_user(self):
+        request = self.context.get('request')
+        user = request.user if request is not None else self.context.get('user')
+        assert user is not None, (
+            f'{self.__class__.__name__} requires `request` or `user` in the serializer context.'
+        )
+        return user
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.get_user())
+
+    def to_pk(self, data):
+        """ Return the submitted pk as the database sees it """
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        try:
+            return self.queryset.model._meta.pk.get_prep_value(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def load_objects(self, pks):
+        return self.get_queryset().in_bulk(set(pks))
+
+    def get_objects(self, pks):
+        cache = self.context.get('related_objects')
+        if cache is not None:
+            return cache.get_many(self.queryset.model, pks, self.load_objects)
+        return self.load_objects(pks)
+
+    def to_internal_values(self, data):
+        """ Resolve a list of pks, reporting every missing (or foreign) pk at once """
+        pks = [self.to_pk(item) for item in data]
+        objects = self.get_objects(pks)
+
+        missing = [pk for pk in dict.fromkeys(pks) if pk not in objects]
+        if missing:
+            self.fail('does_not_exist_many', pk_values=missing)
+
+        return [objects[pk] for pk in pks]
+
+    def to_internal_value(self, data):
+        return self.to_internal_values([data])[0]
+
+
+def prime_related_objects(serializer, items):
+    """ Load the related objects of all bulk items with one query per field """
+    for name, field in serializer.fields.items():
+        if not isinstance(field, UserScopedManyRelatedField) or field.read_only:
+            continue
+
+        pks = set()
+        for item in items:
+            values = item.get(name) if isinstance(item, dict) else None
+            if not isinstance(values, list):
+                continue
+            for value in values:
+                try:
+                    pks.add(field.child_relation.to_pk(value))
+                except serializers.ValidationError:
+                    # reported when the item is validated
+                    pass
+
+        field.child_relation.get_objects(pks)
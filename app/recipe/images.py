@@ -0,0 +1,162 @@
+"""
+Recipe image processing off the request path.
+
+`upload_image` stores the original and marks the recipe `pending`. After commit
+the original is decoded, verified, stripped of metadata and resized to the
+VARIANTS in every format of FORMATS on a process pool. The recipe is then marked
+`ready` (or `failed`) with the names of its variants.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+# name: bounding box, variants keep the aspect ratio and are never upscaled
+VARIANTS = {
+    'thumb': (160, 160),
+    'medium': (640, 640),
+    'large': (1280, 1280),
+}
+# format: (extension, save options)
+FORMATS = {
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+DEFAULT_SETTINGS = {'workers': 2}
+
+STATUS_PENDING = 'pending'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+
+def get_variant_names(image_name):
+    """ Return {variant: {format: storage name}} of the variants of an image """
+    directory, file_name = os.path.split(image_name)
+    stem = os.path.splitext(file_name)[0]
+    return {name: {image_format: os.path.join(directory, 'variants', f'{stem}-{name}.{extension}')
+                   for image_format, (extension, _) in FORMATS.items()}
+            for name in VARIANTS}
+
+
+def render_variants(source_path, targets):
+    """
+    Write the variants of an image file to the paths of `targets`, given like
+    the names of get_variant_names.
+
+    Runs in pool processes, so it only touches files. Pixel data is copied into
+    new images, EXIF, ICC and other metadata are not written.
+    """
+    with Image.open(source_path) as image:
+        image.verify()
+
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        for name, size in VARIANTS.items():
+            variant = image.copy()
+            variant.thumbnail(size, Image.LANCZOS)
+            for image_format, (_, options) in FORMATS.items():
+                out = variant.convert('RGB') if image_format == 'jpeg' else variant
+                path = targets[name][image_format]
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # variants of a content addressed image are shared, never expose
+                # a partly written one
+                temp_path = f'{path}.{os.getpid()}.tmp'
+                out.save(temp_path, image_format.upper(), **options)
+                os.replace(temp_path, path)
+
+
+_process_pool = None
+_threads = None
+_lock = threading.Lock()
+
+
+def get_pools():
+    """ Return (process pool, thread pool waiting on it), None with 'workers': 0 """
+    global _process_pool, _threads
+    workers = getattr(settings, 'RECIPE_IMAGE_PROCESSING', DEFAULT_SETTINGS)['workers']
+    if not workers:
+        return None, None
+    if _process_pool is None:
+        with _lock:
+            if _process_pool is None:
+                _threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='images')
+                _process_pool = ProcessPoolExecutor(max_workers=workers)
+    return _process_pool, _threads
+
+
+@receiver(setting_changed)
+def reset_pools(setting, **kwargs):
+    global _process_pool, _threads
+    if setting == 'RECIPE_IMAGE_PROCESSING' and _process_pool is not None:
+        _process_pool.shutdown(wait=False)
+        _threads.shutdown(wait=False)
+        _process_pool = _threads = None
+
+
+def process_recipe_image(recipe_id, image_name, process_pool=None):
+    """ Render the variants of a recipe image and store the result on the recipe """
+    # imported here, pool processes import this module to run render_variants
+    from recipe.cache import invalidate_user_lists
+    from recipe.models import Recipe
+
+    source_path = default_storage.path(image_name)
+    names = get_variant_names(image_name)
+    targets = {name: {image_format: default_storage.path(variant_name)
+                      for image_format, variant_name in formats.items()}
+               for name, formats in names.items()}
+    # variants exist when the same image was uploaded before (see recipe/storage.py)
+    rendered = all(os.path.exists(path) for formats in targets.values()
+                   for path in formats.values())
+
+    try:
+        if not rendered and process_pool is None:
+            render_variants(source_path, targets)
+        elif not rendered:
+            process_pool.submit(render_variants, source_path, targets).result()
+    except Exception:
+        logger.exception('Processing recipe image %s failed', image_name)
+        status, variants = STATUS_FAILED, {}
+    else:
+        status, variants = STATUS_READY, names
+
+    # a newer upload replaced the image meanwhile, its own task reports on it
+    updated = Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_status=status, image_variants=variants, updated_at=timezone.now())
+    if updated:
+        invalidate_user_lists(Recipe.objects.values_list('user_id', flat=True).get(pk=recipe_id))
+
+
+def schedule_image_processing(recipe):
+    """ Process the recipe image after the upload is committed """
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    if not image_name:
+        return
+    process_pool, threads = get_pools()
+
+    def task():
+        try:
+            process_recipe_image(recipe_id, image_name, process_pool)
+        finally:
+            # pool threads outlive requests, don't keep their connections open
+            connections.close_all()
+
+    if threads is None:
+        transaction.on_commit(lambda: process_recipe_image(recipe_id, image_name))
+    else:
+        transaction.on_commit(lambda: threads.submit(task))
@@ -0,0 +1,28 @@
+from django.contrib.postgres.lookups import PostgresSimpleLookup
+from django.db.models import Lookup
+
+
+class TrigramWordSimilar(PostgresSimpleLookup):
+    """
+    `field__trigram_word_similar=text` matches when `text` is similar to any word
+    sequence in `field` (pg_trgm `%>` operator, supported by gin_trgm_ops indexes)
+    """
+
+    lookup_name = 'trigram_word_similar'
+    operator = '%%>'
+
+
+class AnyOf(Lookup):
+    """
+    `field__any_of=ids` is `field = ANY(%s)` with the ids sent as a single array,
+    unlike `__in` the SQL doesn't grow with the ids and they are not prepared one
+    by one, which is most of the cost of filtering on thousands of ids
+    """
+
+    lookup_name = 'any_of'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} = ANY({rhs})', lhs_params + rhs_params
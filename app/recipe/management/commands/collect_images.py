@@ -0,0 +1,278 @@
+import os
+import re
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from recipe.cache import invalidate_user_lists
+from recipe.images import STATUS_READY, get_variant_names
+from recipe.models import RECIPE_IMAGE_DIR, ImageFile, Recipe
+from recipe.storage import DEFAULT_GRACE, collect_garbage, delete_image_files, hash_file
+
+
+HASHED_STEM = re.compile(r'^[0-9a-f]{64}$')
+SCAN_TABLE = 'recipe_image_scan'
+
+
+class Command(BaseCommand):
+    """Django command to delete unreferenced recipe image files and merge duplicates"""
+
+    help = ('Collect released recipe images. With --scan, MEDIA_ROOT and Recipe.image are '
+            'reconciled first: files are renamed by content hash, duplicates merged, '
+            'reference counts rebuilt and orphaned files deleted.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scan', action='store_true',
+                            help='Scan the image directory and the Recipe.image column')
+        parser.add_argument('--grace', type=int, default=DEFAULT_GRACE,
+                            help='Keep files unreferenced for less than this many seconds')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted or merged')
+
+    def handle(self, *args, **options):
+        self.storage = Recipe._meta.get_field('image').storage
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        self.cutoff = timezone.now() - timedelta(seconds=options['grace'])
+
+        if options['scan']:
+            if connection.vendor != 'postgresql':
+                raise CommandError('Scanning is only supported on PostgreSQL')
+            self._scan()
+
+        if self.dry_run:
+            released = ImageFile.objects.filter(references=0, released_at__lt=self.cutoff)
+            self.stdout.write(f'{released.count()} released image(s) to collect')
+        else:
+            collected = collect_garbage(options['grace'], self.batch_size)
+            self.stdout.write(self.style.SUCCESS(f'Collected {collected} released image(s)'))
+
+    def _scan(self):
+        """
+        Scan through a temporary table, so neither the file listing nor the
+        column is held in memory, only batches of them.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TEMPORARY TABLE {SCAN_TABLE} (
+                    name varchar(255) PRIMARY KEY,
+                    kind varchar(10) NOT NULL,
+                    stem varchar(255) NOT NULL,
+                    canonical varchar(255),
+                    size bigint NOT NULL,
+                    modified timestamp with time zone NOT NULL
+                )
+            """)
+        try:
+            scanned = self._insert_batches(self._scan_files())
+            with connection.cursor() as cursor:
+                cursor.execute(f'CREATE INDEX ON {SCAN_TABLE} (stem)')
+                cursor.execute(f'ANALYZE {SCAN_TABLE}')
+            self.stdout.write(f'Scanned {scanned} file(s) under {RECIPE_IMAGE_DIR}')
+
+            self._merge_duplicates()
+            if not self.dry_run:
+                self._count_references()
+            self._delete_orphans()
+            self._report_missing()
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {SCAN_TABLE}')
+
+    def _scan_files(self):
+        """ Yield a scan table row for each original and variant file """
+        directory = self.storage.path(RECIPE_IMAGE_DIR)
+        variants_directory = os.path.join(directory, 'variants')
+
+        for path, kind in ((directory, 'original'), (variants_directory, 'variant')):
+            try:
+                entries = os.scandir(path)
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    yield self._scan_row(entry, kind)
+
+    def _scan_row(self, entry, kind):
+        stat_result = entry.stat(follow_symlinks=False)
+        stem = os.path.splitext(entry.name)[0]
+        name = f'{RECIPE_IMAGE_DIR}/{entry.name}'
+        canonical = None
+
+        if kind == 'variant':
+            name = f'{RECIPE_IMAGE_DIR}/variants/{entry.name}'
+            # <stem>-<variant>.<ext> of the original <stem>.<ext>, partly written ones
+            # (<variant name>.<pid>.tmp) belong to no original
+            if not entry.name.endswith('.tmp'):
+                stem = stem.rsplit('-', 1)[0]
+        elif HASHED_STEM.match(stem):
+            canonical = self.storage.get_hashed_name(name, stem)
+        elif not entry.name.startswith('.'):
+            # temporary files of interrupted uploads are only collected
+            with self.storage.open(name) as content:
+                canonical = self.storage.get_hashed_name(name, hash_file(content))
+
+        modified = datetime.fromtimestamp(stat_result.st_mtime, timezone.utc)
+        return (name, kind, f'{RECIPE_IMAGE_DIR}/{stem}', canonical, stat_result.st_size,
+                modified)
+
+    def _insert_batches(self, rows):
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                count += self._insert(batch)
+                batch = []
+        if batch:
+            count += self._insert(batch)
+        return count
+
+    def _insert(self, rows):
+        values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {SCAN_TABLE} VALUES {values} ON CONFLICT (name) DO NOTHING',
+                [value for row in rows for value in row])
+        return len(rows)
+
+    def _stream(self, sql, params=()):
+        """ Yield batches of rows of a query, read through a server side cursor """
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    return
+                yield rows
+
+    def _merge_duplicates(self):
+        """ Rename files to their content hash, the first of identical files is kept """
+        merged = renamed = reclaimed = 0
+        batches = self._stream(f"""
+            SELECT name, canonical, size FROM {SCAN_TABLE} s
+            WHERE kind = 'original' AND canonical IS NOT NULL AND canonical <> name
+            AND EXISTS (SELECT 1 FROM {Recipe._meta.db_table} r WHERE r.image = s.name)
+            ORDER BY name
+        """)
+        for rows in batches:
+            for name, canonical, size in rows:
+                exists = self.storage.exists(canonical)
+                if exists:
+                    merged += 1
+                    reclaimed += size
+                else:
+                    renamed += 1
+                if not self.dry_run:
+                    self._move(name, canonical, exists)
+
+            if not self.dry_run:
+                # the moved files (and variants) are scanned under their new names
+                names = [name for name, _, _ in rows]
+                with connection.cursor() as cursor:
+                    cursor.execute(f"""
+                        INSERT INTO {SCAN_TABLE}
+                        SELECT canonical, kind, regexp_replace(canonical, '\\.[^./]*$', ''),
+                               canonical, size, modified
+                        FROM {SCAN_TABLE} WHERE name = ANY(%s)
+                        ON CONFLICT (name) DO NOTHING
+                    """, [names])
+                    cursor.execute(f"""
+                        DELETE FROM {SCAN_TABLE}
+                        WHERE name = ANY(%s) OR (kind = 'variant' AND stem = ANY(%s))
+                    """, [names, [os.path.splitext(name)[0] for name in names]])
+
+        verb = 'Would merge' if self.dry_run else 'Merged'
+        self.stdout.write(f'{verb} {merged} duplicate(s) ({reclaimed} bytes), '
+                          f'renamed {renamed} file(s) to their content hash')
+
+    def _move(self, name, canonical, exists):
+        """ Point recipes at the content addressed copy of a file, then delete it """
+        variants = get_variant_names(name)
+        canonical_variants = get_variant_names(canonical)
+
+        # link first, the file stays reachable under one of its names throughout
+        pairs = [(name, canonical)] if not exists else []
+        pairs += [(variants[variant][image_format], canonical_variants[variant][image_format])
+                  for variant in variants for image_format in variants[variant]]
+        for source, target in pairs:
+            if self.storage.exists(source) and not self.storage.exists(target):
+                os.link(self.storage.path(source), self.storage.path(target))
+
+        recipes = Recipe.objects.filter(image=name)
+        user_ids = set(recipes.values_list('user_id', flat=True).distinct())
+        now = timezone.now()
+        recipes.filter(image_status=STATUS_READY).update(
+            image=canonical, image_variants=canonical_variants, updated_at=now)
+        recipes.update(image=canonical, updated_at=now)
+        for user_id in user_ids:
+            invalidate_user_lists(user_id)
+
+        delete_image_files(self.storage, name)
+
+    def _count_references(self):
+        """ Rebuild the reference counts from Recipe.image """
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {ImageFile._meta.db_table} (name, "references", released_at)
+                SELECT image, count(*), NULL FROM {Recipe._meta.db_table}
+                WHERE image <> '' GROUP BY image
+                ON CONFLICT (name) DO UPDATE
+                SET "references" = EXCLUDED."references", released_at = NULL
+            """)
+            cursor.execute(f"""
+                UPDATE {ImageFile._meta.db_table} f SET "references" = 0, released_at = now()
+                WHERE "references" > 0
+                AND NOT EXISTS (SELECT 1 FROM {Recipe._meta.db_table} r WHERE r.image = f.name)
+            """)
+
+    def _delete_orphans(self):
+        """ Delete unreferenced originals, then variants without an original """
+        deleted = reclaimed = 0
+        originals = f"""
+            SELECT name, size FROM {SCAN_TABLE} s
+            WHERE kind = 'original' AND modified < %s
+            AND NOT EXISTS (SELECT 1 FROM {Recipe._meta.db_table} r WHERE r.image = s.name)
+            AND NOT EXISTS (SELECT 1 FROM {ImageFile._meta.db_table} f WHERE f.name = s.name
+                            AND (f."references" > 0 OR f.released_at >= %s))
+        """
+        for rows in self._stream(originals, [self.cutoff, self.cutoff]):
+            deleted, reclaimed = self._delete_rows(rows, deleted, reclaimed)
+
+        variants = f"""
+            SELECT name, size FROM {SCAN_TABLE} s
+            WHERE kind = 'variant' AND modified < %s
+            AND NOT EXISTS (SELECT 1 FROM {SCAN_TABLE} o WHERE o.kind = 'original'
+                            AND o.stem = s.stem)
+        """
+        for rows in self._stream(variants, [self.cutoff]):
+            deleted, reclaimed = self._delete_rows(rows, deleted, reclaimed)
+
+        verb = 'Would delete' if self.dry_run else 'Deleted'
+        self.stdout.write(f'{verb} {deleted} orphaned file(s) ({reclaimed} bytes)')
+
+    def _delete_rows(self, rows, deleted, reclaimed):
+        names = [name for name, _ in rows]
+        if not self.dry_run:
+            for name in names:
+                delete_image_files(self.storage, name, variants=False)
+            ImageFile.objects.filter(name__in=names, references=0).delete()
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {SCAN_TABLE} WHERE name = ANY(%s)', [names])
+        return deleted + len(rows), reclaimed + sum(size for _, size in rows)
+
+    def _report_missing(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT count(*) FROM {Recipe._meta.db_table} r WHERE image <> ''
+                AND NOT EXISTS (SELECT 1 FROM {SCAN_TABLE} s WHERE s.name = r.image)
+            """)
+            missing = cursor.fetchone()[0]
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f'{missing} recipe(s) reference image files that do not exist'))
@@ -0,0 +1,126 @@
+import re
+
+from rest_framework.request import Request
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.http import HttpRequest, QueryDict
+
+from recipe.views import IngredientViewsSet, RecipeViewSet, TagViewsSet
+
+
+INDEX_RE = re.compile(r'(?:Index Scan|Index Only Scan)(?: Backward)? using (\S+)'
+                      r'|Bitmap Index Scan on (\S+)')
+EXECUTION_TIME_RE = re.compile(r'Execution Time: ([\d.]+) ms')
+
+TAG_INDEX = 'recipe_tag_user_name_uniq'
+INGREDIENT_INDEX = 'recipe_ingr_user_name_uniq'
+RECIPE_INDEX = 'recipe_recipe_user_id_idx'
+RECIPE_TAGS_INDEX = 'recipe_recipe_tags_tag_recipe_idx'
+RECIPE_INGREDIENTS_INDEX = 'recipe_recipe_ingr_ingr_recipe_idx'
+
+
+class Command(BaseCommand):
+    """Django command to run EXPLAIN ANALYZE for the querysets of recipe endpoints"""
+
+    help = 'Explain endpoint querysets for a (seeded) user and report index usage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help='User to explain for (default: user with most recipes)')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--show-plans', action='store_true', help='Print full query plans')
+        parser.add_argument('--fail-on-missing', action='store_true',
+                            help='Exit with an error if an expected index is not used')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('EXPLAIN ANALYZE is only supported on PostgreSQL')
+
+        user = self._get_user(options['email'])
+        self.stdout.write(f'Explaining endpoint queries for {user.email}')
+
+        missing = []
+        for label, viewset_class, params, expected in self._get_cases(user):
+            queryset = self._get_queryset(viewset_class, user, params)
+            if 'page_size' in params:
+                ordering = viewset_class.pagination_class.ordering
+                ordering = (ordering, ) if isinstance(ordering, str) else ordering
+                queryset = queryset.order_by(*ordering)[:options['page_size'] + 1]
+
+            plan = queryset.explain(analyze=True)
+            used = {a or b for a, b in INDEX_RE.findall(plan)}
+            time_match = EXECUTION_TIME_RE.search(plan)
+
+            self.stdout.write(f'\n{label} ({time_match.group(1) if time_match else "?"} ms)')
+            for index in expected:
+                if index in used:
+                    self.stdout.write(self.style.SUCCESS(f'  uses {index}'))
+                else:
+                    missing.append((label, index))
+                    self.stdout.write(self.style.WARNING(f'  does not use {index}'))
+            for index in sorted(used - set(expected)):
+                self.stdout.write(f'  also uses {index}')
+            if options['show_plans']:
+                self.stdout.write(plan)
+
+        if missing and options['fail_on_missing']:
+            raise CommandError(f'{len(missing)} expected index(es) not used')
+
+    def _get_user(self, email):
+        UserModel = get_user_model()
+        if email:
+            try:
+                return UserModel.objects.get(email=email)
+            except UserModel.DoesNotExist:
+                raise CommandError(f'User {email} does not exist')
+
+        user = UserModel.objects.annotate(
+            recipe_count=Count('recipe')).order_by('-recipe_count').first()
+        if user is None:
+            raise CommandError('Database has no users, seed it first')
+        return user
+
+    def _get_cases(self, user):
+        """ Return (label, viewset, query params, expected indexes) for each endpoint """
+        tag_ids = ','.join(
+            str(pk) for pk in user.tag_set.filter(recipes__isnull=False)
+            .values_list('id', flat=True).distinct()[:3])
+        ing_ids = ','.join(
+            str(pk) for pk in user.ingredient_set.filter(recipes__isnull=False)
+            .values_list('id', flat=True).distinct()[:3])
+        page = {'page_size': 1}
+
+        cases = [
+            ('tag-list', TagViewsSet, {}, [TAG_INDEX]),
+            ('tag-list paginated', TagViewsSet, page, [TAG_INDEX]),
+            ('tag-list assigned_only', TagViewsSet, {'assigned_only': 1},
+             [TAG_INDEX, RECIPE_TAGS_INDEX]),
+            ('ingredient-list', IngredientViewsSet, {}, [INGREDIENT_INDEX]),
+            ('ingredient-list paginated', IngredientViewsSet, page, [INGREDIENT_INDEX]),
+            ('ingredient-list assigned_only', IngredientViewsSet, {'assigned_only': 1},
+             [INGREDIENT_INDEX, RECIPE_INGREDIENTS_INDEX]),
+            ('recipe-list', RecipeViewSet, {}, [RECIPE_INDEX]),
+            ('recipe-list paginated', RecipeViewSet, page, [RECIPE_INDEX]),
+        ]
+        if tag_ids:
+            cases.append(('recipe-list tags', RecipeViewSet, {'tags': tag_ids},
+                          [RECIPE_TAGS_INDEX]))
+        if ing_ids:
+            cases.append(('recipe-list ingredients', RecipeViewSet, {'ingredients': ing_ids},
+                          [RECIPE_INGREDIENTS_INDEX]))
+        return cases
+
+    def _get_queryset(self, viewset_class, user, params):
+        """ Build the list queryset exactly as the viewset does for a request """
+        http_request = HttpRequest()
+        http_request.method = 'GET'
+        http_request.GET = QueryDict(mutable=True)
+        http_request.GET.update({key: str(value) for key, value in params.items()})
+
+        request = Request(http_request)
+        request.user = user
+
+        view = viewset_class(request=request, action='list', format_kwarg=None, args=(), kwargs={})
+        return view.get_queryset()
@@ -0,0 +1,37 @@
+# Generated by Django 3.0.14 on 2026-10-18 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0005_auto_20200409_0842'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'name'], name='recipe_ingr_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'id'], name='recipe_recipe_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name'], name='recipe_tag_user_name_idx'),
+        ),
+        # auto created through tables only index (recipe_id, tag_id), add the
+        # reverse direction for lookups that start from a tag or an ingredient
+        migrations.RunSQL(
+            'CREATE INDEX recipe_recipe_tags_tag_recipe_idx '
+            'ON recipe_recipe_tags (tag_id, recipe_id);',
+            reverse_sql='DROP INDEX recipe_recipe_tags_tag_recipe_idx;'
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX recipe_recipe_ingr_ingr_recipe_idx '
+            'ON recipe_recipe_ingredients (ingredient_id, recipe_id);',
+            reverse_sql='DROP INDEX recipe_recipe_ingr_ingr_recipe_idx;'
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.0.14 on 2026-10-18 07:15
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+SEARCH_VECTOR_TRIGGER = '''
+CREATE FUNCTION recipe_recipe_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('english', coalesce(NEW.title, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, search_vector ON recipe_recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipe_recipe_search_vector_update();
+
+UPDATE recipe_recipe SET search_vector = to_tsvector('english', title);
+'''
+
+DROP_SEARCH_VECTOR_TRIGGER = '''
+DROP TRIGGER recipe_recipe_search_vector_trigger ON recipe_recipe;
+DROP FUNCTION recipe_recipe_search_vector_update();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0006_user_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_recipe_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='recipe_recipe_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        # the trigger also covers bulk inserts and COPY that bypass model save()
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER, reverse_sql=DROP_SEARCH_VECTOR_TRIGGER),
+    ]
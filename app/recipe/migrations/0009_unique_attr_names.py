@@ -0,0 +1,71 @@
+from django.db import migrations, models
+
+
+def merge_duplicates_sql(table, through_table, column):
+    """
+    Point recipes of duplicate (user, name) rows at the oldest row, then delete
+    the duplicates. Recipes that change are touched for conditional GETs.
+    """
+    ranked = f'''
+        WITH ranked AS (
+            SELECT id, min(id) OVER (PARTITION BY user_id, name) AS keep_id FROM {table}
+        )
+    '''
+    return [
+        f'''{ranked}
+        UPDATE recipe_recipe SET updated_at = now() WHERE id IN (
+            SELECT t.recipe_id FROM {through_table} t JOIN ranked r ON r.id = t.{column}
+            WHERE r.id <> r.keep_id
+        );''',
+        f'''{ranked}
+        INSERT INTO {through_table} (recipe_id, {column})
+        SELECT DISTINCT t.recipe_id, r.keep_id
+        FROM {through_table} t JOIN ranked r ON r.id = t.{column}
+        WHERE r.id <> r.keep_id
+        ON CONFLICT DO NOTHING;''',
+        f'''{ranked}
+        DELETE FROM {through_table} t USING ranked r
+        WHERE t.{column} = r.id AND r.id <> r.keep_id;''',
+        f'''{ranked}
+        DELETE FROM {table} t USING ranked r
+        WHERE t.id = r.id AND r.id <> r.keep_id;''',
+        # check deferred foreign keys now, tables with pending checks can't be altered
+        'SET CONSTRAINTS ALL IMMEDIATE;',
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0008_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            merge_duplicates_sql('recipe_tag', 'recipe_recipe_tags', 'tag_id'),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            merge_duplicates_sql('recipe_ingredient', 'recipe_recipe_ingredients', 'ingredient_id'),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # the unique constraints index (user, name), the plain indexes are redundant
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='recipe_ingr_user_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='recipe_tag_user_name_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'name'), name='recipe_ingr_user_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'name'), name='recipe_tag_user_name_uniq'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.0.14 on 2026-10-18 07:42
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0009_unique_attr_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(blank=True, default='', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.0.14 on 2026-10-18 07:51
+
+from django.db import migrations, models
+import recipe.models
+import recipe.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0010_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('references', models.PositiveIntegerField(default=0)),
+                ('released_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, storage=recipe.storage.ContentHashStorage(), upload_to=recipe.models.get_recipe_instance_file_path),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(_negated=True, image=''), fields=['image'], name='recipe_recipe_image_idx'),
+        ),
+        # count the references of existing images
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO recipe_imagefile (name, "references")
+                SELECT image, count(*) FROM recipe_recipe WHERE image <> '' GROUP BY image;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='imagefile',
+            index=models.Index(condition=models.Q(references=0), fields=['released_at'], name='recipe_imagefile_released_idx'),
+        ),
+    ]
@@ -2,13 +2,80 @@ import os
 import uuid
 
 from django.conf import settings
+from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
 from django.db import models
+from django.db.models import (
+    Count, Exists, F, FloatField, Func, IntegerField, OuterRef, Q, Subquery, Value
+)
+from django.db.models.functions import Coalesce
+
+from recipe.storage import ContentHashStorage
+
+
+# text search configuration, the search_vector trigger (migration 0007) uses the same one
+SEARCH_CONFIG = 'english'
+
+# inserts and selects of bulk_get_or_create, while concurrent deletes remove rows
+BULK_GET_OR_CREATE_ATTEMPTS = 3
+
+
+class RecipeAttrQuerySet(models.QuerySet):
+    """ Queryset for user owned recipe attributes (tags, ingredients) """
+
+    def _recipe_rows(self):
+        """ Return through table rows of the outer row and their attribute column """
+        rel = self.model._meta.get_field('recipes')
+        column = f'{rel.field.m2m_reverse_field_name()}_id'
+        return rel.through.objects.filter(**{column: OuterRef('pk')}), column
+
+    def assigned(self):
+        """ Keep rows assigned to at least one recipe (semi-join, no DISTINCT needed) """
+        rows, _ = self._recipe_rows()
+        return self.filter(Exists(rows))
+
+    def with_recipe_counts(self):
+        """ Annotate each row with the number of recipes it is assigned to """
+        rows, column = self._recipe_rows()
+        counts = rows.order_by().values(column).annotate(count=Count('pk')).values('count')
+        return self.annotate(
+            recipe_count=Coalesce(Subquery(counts, output_field=IntegerField()), 0))
+
+    def bulk_get_or_create(self, user, names):
+        """
+        Return a row for each name, in the order given, inserting missing names.
+
+        Inserts are ON CONFLICT DO NOTHING on the (user, name) constraint followed by
+        a single select, so concurrent requests with the same names don't race. Names
+        deleted by another request in between are inserted and selected again.
+        Like bulk_create no signals are sent, callers invalidate cached lists.
+        """
+        rows = {}
+        missing = list(dict.fromkeys(names))
+        for _ in range(BULK_GET_OR_CREATE_ATTEMPTS):
+            self.bulk_create([self.model(user=user, name=name) for name in missing],
+                             ignore_conflicts=True)
+            rows.update((row.name, row) for row in self.filter(user=user, name__in=missing))
+            missing = [name for name in missing if name not in rows]
+            if not missing:
+                return [rows[name] for name in names]
+        raise self.model.DoesNotExist(
+            f'{self.model._meta.verbose_name} {missing[0]!r} deleted while being created')
 
 
 class Tag(models.Model):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # also the index of per user lists ordered by name
+            models.UniqueConstraint(fields=['user', 'name'], name='recipe_tag_user_name_uniq')
+        ]
+
     def __str__(self):
         return self.name
 
@@ -17,16 +84,117 @@ class Ingredient(models.Model):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='recipe_ingr_user_name_uniq')
+        ]
+
     def __str__(self):
         return self.name
 
 
+RECIPE_IMAGE_DIR = 'uploads/recipe'
+
+
 def get_recipe_instance_file_path(instance, filename):
     """ Generate file path for new recipe image """
     ext = filename.split('.')[-1]
     filename = f'{uuid.uuid4()}.{ext}'
 
-    return os.path.join('uploads/recipe/', filename)
+    return os.path.join(RECIPE_IMAGE_DIR, filename)
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def _filter_related(self, field_name, ids, match_all):
+        """
+        Filter recipes related to given ids through an m2m field using semi-joins.
+
+        Matching any id is an EXISTS over the through table, matching all ids is an
+        IN over through rows grouped by recipe, neither duplicates recipe rows.
+        """
+        field = self.model._meta.get_field(field_name)
+        recipe_column = f'{field.m2m_field_name()}_id'
+        related_column = f'{field.m2m_reverse_field_name()}_id'
+
+        ids = set(ids)
+        rows = field.remote_field.through.objects.filter(**{f'{related_column}__in': ids})
+
+        if match_all:
+            recipe_ids = rows.values(recipe_column).annotate(
+                matched=Count(related_column)).filter(matched=len(ids)).values(recipe_column)
+            return self.filter(pk__in=recipe_ids)
+
+        return self.filter(Exists(rows.filter(**{recipe_column: OuterRef('pk')})))
+
+    def search(self, text, include_related=False):
+        """
+        Full-text and typo tolerant search over titles, ordered by relevance.
+
+        Titles match on the trigger maintained `search_vector` or on trigram word
+        similarity, both backed by GIN indexes. With `include_related` recipes with
+        a similar tag or ingredient name match as well.
+        """
+        query = SearchQuery(text, config=SEARCH_CONFIG)
+        matches = Q(search_vector=query) | Q(title__trigram_word_similar=text)
+
+        if include_related:
+            for field_name in ('tags', 'ingredients'):
+                field = self.model._meta.get_field(field_name)
+                rows = field.remote_field.through.objects.filter(**{
+                    field.m2m_field_name(): OuterRef('pk'),
+                    f'{field.m2m_reverse_field_name()}__name__trigram_word_similar': text
+                })
+                matches |= Q(Exists(rows))
+
+        word_similarity = Func(
+            Value(text), F('title'), function='word_similarity', output_field=FloatField())
+        return self.filter(matches).annotate(
+            search_rank=SearchRank(F('search_vector'), query) + word_similarity
+        ).order_by('-search_rank', '-id')
+
+    def with_tags(self, ids, match_all=False):
+        return self._filter_related('tags', ids, match_all)
+
+    def with_ingredients(self, ids, match_all=False):
+        return self._filter_related('ingredients', ids, match_all)
+
+    def bulk_create_with_related(self, user, items):
+        """
+        Insert recipes from validated serializer data with one statement for the
+        recipe rows and one per many-to-many through table.
+
+        Like bulk_create no signals are sent, callers invalidate cached lists.
+        """
+        m2m = self.model._meta.many_to_many
+        m2m_names = {field.name for field in m2m}
+        recipes = self.bulk_create(
+            self.model(user=user, **{name: value for name, value in item.items()
+                                     if name not in m2m_names})
+            for item in items
+        )
+
+        for field in m2m:
+            through = field.remote_field.through
+            recipe_column = f'{field.m2m_field_name()}_id'
+            related_column = f'{field.m2m_reverse_field_name()}_id'
+            through.objects.bulk_create(
+                through(**{recipe_column: recipe.pk, related_column: related.pk})
+                for recipe, item in zip(recipes, items)
+                # like .set(), repeated ids are added once
+                for related in dict.fromkeys(item.get(field.name, []))
+            )
+
+        return recipes
+
+
+class RecipeManager(models.Manager.from_queryset(RecipeQuerySet)):
+
+    def get_queryset(self):
+        # search_vector is only read by the database, don't load (or save) it with rows
+        return super().get_queryset().defer('search_vector')
 
 
 class Recipe(models.Model):
@@ -37,7 +205,54 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     ingredients = models.ManyToManyField('Ingredient', related_name='recipes', blank=True)
     tags = models.ManyToManyField('Tag', related_name="recipes", blank=True)
-    image = models.ImageField(blank=True, upload_to=get_recipe_instance_file_path)
+    # stored by content hash, shared by recipes with the same image (see recipe/storage.py)
+    image = models.ImageField(blank=True, upload_to=get_recipe_instance_file_path,
+                              storage=ContentHashStorage())
+    # resized variants of the image, rendered in the background (see recipe/images.py)
+    image_status = models.CharField(max_length=10, blank=True, default='', editable=False)
+    image_variants = JSONField(default=dict, blank=True, editable=False)
+    # maintained by a database trigger from the title
+    search_vector = SearchVectorField(null=True, editable=False)
+    # also moved when tags or ingredients of the recipe change (see recipe/signals.py)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeManager()
+
+    class Meta:
+        indexes = [
+            # per user list ordered by -id (scanned backwards)
+            models.Index(fields=['user', 'id'], name='recipe_recipe_user_id_idx'),
+            GinIndex(fields=['search_vector'], name='recipe_recipe_search_idx'),
+            GinIndex(fields=['title'], name='recipe_recipe_title_trgm_idx',
+                     opclasses=['gin_trgm_ops']),
+            # reference checks of image files (see recipe/storage.py)
+            models.Index(fields=['image'], name='recipe_recipe_image_idx', condition=~Q(image='')),
+        ]
 
     def __str__(self):
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the stored image, its references are counted when it's replaced (see recipe/signals.py)
+        instance._saved_image = instance.__dict__.get('image')
+        return instance
+
+
+class ImageFile(models.Model):
+    """ Number of recipes referencing a content addressed image file """
+
+    name = models.CharField(max_length=255, primary_key=True)
+    references = models.PositiveIntegerField(default=0)
+    # when the last reference was dropped, the file is collected some time later
+    released_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['released_at'], name='recipe_imagefile_released_idx',
+                         condition=Q(references=0)),
+        ]
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,32 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OptInCursorPagination(CursorPagination):
+    """
+    Keyset pagination that is only applied when the client asks for it.
+
+    Pagination is enabled by passing `page_size` (or a `cursor` from a previous page).
+    Pages are fetched with a `WHERE key < position` filter on the ordering key, so no
+    COUNT(*) is run and every page costs the same regardless of how deep it is.
+    """
+
+    page_size = None
+    default_page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_page_size(self, request):
+        page_size = super().get_page_size(request)
+        if page_size is None and self.cursor_query_param in request.query_params:
+            # next/previous links keep page_size, but fall back for hand-built urls
+            return self.default_page_size
+        return page_size
+
+
+class NameCursorPagination(OptInCursorPagination):
+    # -id only breaks ties between equal names, the cursor position is taken from -name
+    ordering = ('-name', '-id')
+
+
+class RecipeCursorPagination(OptInCursorPagination):
+    ordering = '-id'
@@ -0,0 +1,45 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # in requirements.txt, responses fall back to the json module without it
+    orjson = None
+
+
+CONTAINERS = (dict, list, tuple)
+
+
+def _has_float(data):
+    """ Whether the data contains floats, orjson formats them unlike the json module """
+    for value in (data.values() if isinstance(data, dict) else data):
+        if isinstance(value, float) or (isinstance(value, CONTAINERS) and _has_float(value)):
+            return True
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer producing the same bytes as JSONRenderer, using orjson when it is
+    installed and the output is compact, non-ascii escaped JSON (the api defaults).
+
+    Dates and times are passed to the DRF encoder. Data with floats is rendered by
+    JSONRenderer: orjson writes exponents as 1e-7 instead of 1e-07 and NaN as null
+    instead of failing.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+                or isinstance(data, float)
+                or (isinstance(data, CONTAINERS) and _has_float(data))):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default,
+                               option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+        except (orjson.JSONEncodeError, TypeError):
+            # e.g. integers over 64 bits, let the json module deal with it
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # same strict javascript subset escaping as JSONRenderer
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
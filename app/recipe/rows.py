@@ -0,0 +1,143 @@
+"""
+Read-only fast path for list responses.
+
+Rows are read with `.values()` and turned into the same dicts the list serializers
+produce, skipping the per-field serializer machinery. Only serializers made of plain
+model columns, annotations, many-to-many primary keys or nested many-to-many
+serializers of plain columns, and fields declaring `row_columns` (represented by
+their `row_representation(row, request)`) are supported, the equivalence is checked
+by recipe/tests/test_rows.py.
+"""
+from collections import defaultdict
+
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
+
+from django.conf import settings
+from django.db import models
+
+from utils.timing import timed
+
+
+def _related_ids(field, ids):
+    """ Return {recipe id: [related ids ordered by id]} for a many-to-many field """
+    recipe_column = f'{field.m2m_field_name()}_id'
+    related_column = f'{field.m2m_reverse_field_name()}_id'
+    rows = field.remote_field.through.objects.filter(**{f'{recipe_column}__any_of': ids}) \
+        .order_by(related_column).values_list(recipe_column, related_column)
+
+    related = defaultdict(list)
+    for recipe_id, related_id in rows:
+        related[recipe_id].append(related_id)
+    return related
+
+
+def _related_rows(field, ids, columns):
+    """ Return {recipe id: [{column: value} ordered by id]} for a many-to-many field """
+    recipe_column = f'{field.m2m_field_name()}_id'
+    related_name = field.m2m_reverse_field_name()
+    related_column = f'{related_name}_id'
+    rows = field.remote_field.through.objects.filter(**{f'{recipe_column}__any_of': ids}) \
+        .order_by(related_column).values_list(
+            recipe_column, related_column, *[f'{related_name}__{column}' for column in columns])
+
+    # recipes share their tags, each one is represented once
+    objects = {}
+    related = defaultdict(list)
+    for recipe_id, related_id, *values in rows:
+        item = objects.get(related_id)
+        if item is None:
+            item = objects[related_id] = dict(zip(columns, values))
+        related[recipe_id].append(item)
+    return related
+
+
+def _nested_columns(serializer_class):
+    """ Return {field name: child columns} of the nested many-to-many serializers """
+    return {name: field.child.Meta.fields
+            for name, field in serializer_class._declared_fields.items()
+            if isinstance(field, ListSerializer)}
+
+
+def _format_decimal(value):
+    # columns have a fixed scale, so this equals DecimalField's quantized string
+    return None if value is None else '{:f}'.format(value)
+
+
+def _row_fields(serializer_class):
+    """ Return the declared fields represented from several columns of a row """
+    return {name: field for name, field in serializer_class._declared_fields.items()
+            if hasattr(field, 'row_columns')}
+
+
+def get_columns(serializer_class):
+    """ Return the columns read with .values() """
+    opts = serializer_class.Meta.model._meta
+    m2m = {field.name for field in opts.many_to_many}
+    row_fields = _row_fields(serializer_class)
+
+    columns = []
+    for name in serializer_class.Meta.fields:
+        if name in row_fields:
+            columns.extend(row_fields[name].row_columns)
+        elif name not in m2m:
+            columns.append(name)
+    return columns
+
+
+def build_rows(serializer_class, rows, context=None):
+    """ Build serializer equivalent dicts from `.values()` rows """
+    with timed('serialize'):
+        return _build_rows(serializer_class, rows, context)
+
+
+def _build_rows(serializer_class, rows, context):
+    opts = serializer_class.Meta.model._meta
+    fields = serializer_class.Meta.fields
+    row_fields = _row_fields(serializer_class)
+    request = (context or {}).get('request')
+    m2m = {field.name: field for field in opts.many_to_many if field.name in fields}
+    decimals = {field.name for field in opts.concrete_fields
+                if isinstance(field, models.DecimalField) and field.name in fields}
+
+    nested = _nested_columns(serializer_class)
+
+    rows = list(rows)
+    ids = [row['id'] for row in rows]
+    related = {name: _related_rows(field, ids, nested[name]) if name in nested
+               else _related_ids(field, ids)
+               for name, field in m2m.items()}
+
+    data = []
+    for row in rows:
+        item = {}
+        for name in fields:
+            if name in related:
+                item[name] = related[name].get(row['id'], [])
+            elif name in row_fields:
+                item[name] = row_fields[name].row_representation(row, request)
+            elif name in decimals:
+                item[name] = _format_decimal(row[name])
+            else:
+                item[name] = row[name]
+        data.append(item)
+    return data
+
+
+class FastListMixin:
+    """ Serve the list action from `.values()` rows (disabled with RECIPE_FAST_LIST=False) """
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'RECIPE_FAST_LIST', True):
+            return super().list(request, *args, **kwargs)
+
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        rows = queryset.values(*get_columns(serializer_class))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(build_rows(serializer_class, page, context))
+
+        return Response(build_rows(serializer_class, rows, context))
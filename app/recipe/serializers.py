@@ -1,30 +1,86 @@
 from rest_framework import serializers
 
+from django.core.files.storage import default_storage
+
+from recipe.fields import UserScopedPrimaryKeyRelatedField
 from recipe.models import Ingredient, Recipe, Tag
+from utils.timing import TimedSerializerMixin
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Tag
         fields = ('id', 'name')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class TagCountSerializer(TagSerializer):
+    """ Tag with the number of recipes it is assigned to """
+
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ('recipe_count', )
+
+
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
         fields = ('id', 'name')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class IngredientCountSerializer(IngredientSerializer):
+    """ Ingredient with the number of recipes it is assigned to """
+
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ('recipe_count', )
+
+
+class RecipeImagesField(serializers.Field):
+    """
+    Processing status and variant URLs of the recipe image, e.g.
+    {'status': 'ready', 'variants': {'thumb': {'webp': url, 'jpeg': url}, ...}}
+    """
 
-    ingredients = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all(), many=True)
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
+    # read by the list fast path (recipe/rows.py) instead of the whole instance
+    row_columns = ('image_status', 'image_variants')
+
+    def __init__(self, **kwargs):
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        row = {name: getattr(recipe, name) for name in self.row_columns}
+        return self.row_representation(row, self.context.get('request'))
+
+    @staticmethod
+    def row_representation(row, request=None):
+        def get_url(name):
+            # absolute like ImageField urls
+            url = default_storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+
+        return {
+            'status': row['image_status'] or None,
+            'variants': {variant: {image_format: get_url(name)
+                                   for image_format, name in formats.items()}
+                         for variant, formats in row['image_variants'].items()},
+        }
+
+
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+
+    ingredients = UserScopedPrimaryKeyRelatedField(queryset=Ingredient.objects.all(), many=True)
+    tags = UserScopedPrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
+    images = RecipeImagesField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes', 'price', 'link')
+        fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes', 'price', 'link',
+                  'images')
 
 
 class RecipeDetailSerializer(RecipeSerializer):
@@ -33,9 +89,11 @@ class RecipeDetailSerializer(RecipeSerializer):
     tags = TagSerializer(many=True, read_only=True)
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """ Serializer for uploading images to recipes """
 
+    images = RecipeImagesField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'images')
@@ -0,0 +1,84 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipe.cache import invalidate_user_lists
+from recipe.models import Ingredient, Recipe, Tag
+from recipe.storage import release_image, retain_image
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_lists_on_change(sender, instance, **kwargs):
+    invalidate_user_lists(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_lists_on_m2m_change(sender, instance, action, **kwargs):
+    # instance is the recipe, or the tag/ingredient for reverse (tag.recipes) changes
+    if action.startswith('post_'):
+        invalidate_user_lists(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_recipes_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """ Move updated_at of recipes whose tags or ingredients changed """
+    now = timezone.now()
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Recipe.objects.filter(pk=instance.pk).update(updated_at=now)
+            instance.updated_at = now
+    elif action in ('post_add', 'post_remove'):
+        Recipe.objects.filter(pk__in=pk_set).update(updated_at=now)
+    elif action == 'pre_clear':
+        # pk_set is not given for clear, recipes are only known before the rows go
+        instance.recipes.update(updated_at=now)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes_on_attr_change(sender, instance, created=False, **kwargs):
+    """ Renamed or deleted tags and ingredients change the recipes they are assigned to """
+    if not created:
+        instance.recipes.update(updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_saved_image(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        instance._replaced_image = None
+    elif instance._state.adding:
+        instance._replaced_image = ''
+    elif getattr(instance, '_saved_image', None) is None:
+        # loaded with the image deferred
+        instance._replaced_image = Recipe.objects.values_list(
+            'image', flat=True).filter(pk=instance.pk).first() or ''
+    else:
+        instance._replaced_image = instance._saved_image
+
+
+@receiver(post_save, sender=Recipe)
+def count_image_references(sender, instance, raw=False, **kwargs):
+    """ Count references of content addressed image files (see recipe/storage.py) """
+    replaced, image = instance._replaced_image, instance.image.name or ''
+    if raw or replaced is None or replaced == image:
+        return
+    if image:
+        retain_image(image)
+    if replaced:
+        release_image(replaced)
+    instance._saved_image = image
+
+
+@receiver(post_delete, sender=Recipe)
+def release_image_on_delete(sender, instance, **kwargs):
+    if instance.image:
+        release_image(instance.image.name)
@@ -0,0 +1,185 @@
+"""
+Content addressed storage of recipe images.
+
+Uploads are hashed (sha256) while they stream to memory or disk and stored as
+`<directory>/<digest>.<ext>`, so identical images share one file and their
+variants (see recipe/images.py). ImageFile counts the recipes referencing each
+file. Files released by their last recipe are deleted by collect_garbage once
+they stayed unreferenced for a grace period, which covers uploads that found
+the file already stored but haven't saved their recipe yet.
+"""
+import hashlib
+import os
+import uuid
+from datetime import timedelta
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler as BaseMemoryFileUploadHandler,
+    TemporaryFileUploadHandler as BaseTemporaryFileUploadHandler
+)
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+
+DEFAULT_GRACE = 60 * 60
+
+
+def hash_file(content):
+    """ Return the sha256 hex digest of a file, read in chunks """
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentHashMixin:
+    """ Set `content_hash` of uploaded files from the chunks as they arrive """
+
+    def new_file(self, *args, **kwargs):
+        # before the handler, which may raise StopFutureHandlers
+        self.content_hash = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.content_hash.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.content_hash.hexdigest()
+        return file
+
+
+class MemoryFileUploadHandler(ContentHashMixin, BaseMemoryFileUploadHandler):
+    pass
+
+
+class TemporaryFileUploadHandler(ContentHashMixin, BaseTemporaryFileUploadHandler):
+    pass
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """ File system storage naming files by the sha256 of their content """
+
+    def get_available_name(self, name, max_length=None):
+        # names are content hashes, a taken name already has the same content
+        return name
+
+    def get_hashed_name(self, name, digest):
+        directory, file_name = os.path.split(name)
+        return os.path.join(directory, digest + os.path.splitext(file_name)[1].lower())
+
+    def _save(self, name, content):
+        digest = getattr(content, 'content_hash', None) or hash_file(content)
+        name = self.get_hashed_name(name, digest)
+        path = self.path(name)
+
+        if os.path.exists(path):
+            # a recent mtime keeps the file from garbage collection until it's referenced
+            os.utime(path)
+            return name
+
+        # concurrent uploads of the same image each write their own file and
+        # atomically replace the other's with identical content
+        temp_name = super()._save(
+            os.path.join(os.path.dirname(name), f'.{uuid.uuid4().hex}.tmp'), content)
+        os.replace(self.path(temp_name), path)
+        return name
+
+
+def retain_image(name):
+    """ Count a new reference to an image file """
+    # recipe.models imports this module for the storage of Recipe.image
+    from recipe.models import ImageFile
+
+    ImageFile.objects.bulk_create([ImageFile(name=name)], ignore_conflicts=True)
+    ImageFile.objects.filter(name=name).update(references=F('references') + 1, released_at=None)
+
+
+def release_image(name):
+    """ Drop a reference to an image file, unreferenced files are collected later """
+    from recipe.models import ImageFile
+
+    ImageFile.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1, released_at=timezone.now())
+
+
+def delete_image_files(storage, name, variants=True):
+    """ Delete an image file and its variants, return the number of files deleted """
+    from recipe.images import get_variant_names
+
+    names = [name]
+    if variants:
+        names += [variant_name for formats in get_variant_names(name).values()
+                  for variant_name in formats.values()]
+    deleted = 0
+    for file_name in names:
+        try:
+            os.remove(storage.path(file_name))
+        except FileNotFoundError:
+            continue
+        deleted += 1
+    return deleted
+
+
+def _delete_files(storage, files):
+    for name, variants in files:
+        delete_image_files(storage, name, variants=variants)
+
+
+def collect_garbage(grace=DEFAULT_GRACE, batch_size=500):
+    """
+    Delete image files unreferenced for more than `grace` seconds, return the
+    number of images collected. Counts are checked against Recipe.image first, a
+    miscounted file is recounted instead of deleted.
+    """
+    from recipe.models import ImageFile, Recipe
+
+    storage = Recipe._meta.get_field('image').storage
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    referenced = Recipe.objects.filter(image=OuterRef('name'))
+    collected = 0
+
+    while True:
+        with transaction.atomic():
+            rows = ImageFile.objects.select_for_update(skip_locked=True).filter(
+                references=0, released_at__lt=cutoff).annotate(referenced=Exists(referenced))
+            rows = list(rows.values_list('name', 'referenced')[:batch_size])
+            if not rows:
+                return collected
+
+            names = []
+            for name, is_referenced in rows:
+                try:
+                    modified = os.path.getmtime(storage.path(name))
+                except FileNotFoundError:
+                    modified = 0
+
+                if is_referenced:
+                    ImageFile.objects.filter(name=name).update(
+                        references=Recipe.objects.filter(image=name).count(), released_at=None)
+                elif modified > cutoff.timestamp():
+                    # stored again by an upload, check again once the grace period passed
+                    ImageFile.objects.filter(name=name).update(released_at=timezone.now())
+                else:
+                    names.append(name)
+
+            ImageFile.objects.filter(name__in=names).delete()
+            files = []
+            for name in names:
+                # variants are named by the digest, shared with other extensions of it
+                stem = os.path.splitext(name)[0]
+                shared = ImageFile.objects.filter(name__startswith=f'{stem}.').exists()
+                files.append((name, not shared))
+            # once the rows are gone, a failed commit leaves the files in place
+            transaction.on_commit(lambda files=files: _delete_files(storage, files))
+            collected += len(names)
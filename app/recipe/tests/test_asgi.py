@@ -0,0 +1,119 @@
+import asyncio
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from utils.asgi import ReadPoolASGIHandler
+from utils.help_test_utils import (
+    asgi_request, create_ingredient, create_recipe, create_tag, create_user,
+    get_recipe_detail_url
+)
+
+
+READ_VIEWS = ['recipe:recipe-list', 'recipe:recipe-detail', 'recipe:recipe-export',
+              'recipe:tag-list', 'recipe:ingredient-list']
+
+RECIPE_LIST_URL = reverse('recipe:recipe-list')
+TAG_LIST_URL = reverse('recipe:tag-list')
+INGREDIENT_LIST_URL = reverse('recipe:ingredient-list')
+
+
+# committed rows, the pool threads use their own database connections
+@override_settings(RECIPE_LIST_CACHE={'BACKEND': 'recipe.cache.DummyBackend'},
+                   ASGI_READ_VIEWS=READ_VIEWS)
+class ReadPoolASGITests(TransactionTestCase):
+    """ Test read endpoints served from the ASGI read pool match WSGI responses """
+
+    def setUp(self):
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+        self.headers = {'Authorization': f'Token {self.token.key}'}
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.application = ReadPoolASGIHandler()
+
+        tag = create_tag(user=self.user, name='Vegan')
+        ingredient = create_ingredient(user=self.user, name='Salt')
+        self.recipes = [create_recipe(user=self.user, title=f'Recipe {i}') for i in range(3)]
+        for recipe in self.recipes:
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+    def tearDown(self):
+        self.application.executor.shutdown()
+
+    def get(self, path, query_string='', headers=None):
+        return asyncio.run(asgi_request(
+            self.application, path, query_string, dict(self.headers, **(headers or {}))))
+
+    def assertSameAsWSGI(self, path, query_string=''):
+        status, headers, body = self.get(path, query_string)
+        r = self.client.get(f'{path}?{query_string}')
+
+        self.assertEqual(status, r.status_code)
+        self.assertEqual(body, r.content)
+        return headers
+
+    def test_read_views(self):
+        self.assertSameAsWSGI(RECIPE_LIST_URL)
+        self.assertSameAsWSGI(RECIPE_LIST_URL, 'page_size=2')
+        self.assertSameAsWSGI(get_recipe_detail_url(self.recipes[0].id))
+        self.assertSameAsWSGI(TAG_LIST_URL, 'with_counts=1')
+        self.assertSameAsWSGI(INGREDIENT_LIST_URL)
+
+    def test_streaming_export(self):
+        """ Test exports read the database while streaming on a pool thread """
+        status, headers, body = self.get(reverse('recipe:recipe-export'))
+        r = self.client.get(reverse('recipe:recipe-export'))
+
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['content-type'], 'application/x-ndjson')
+        self.assertEqual(body, b''.join(r.streaming_content))
+        self.assertEqual(len(body.splitlines()), 3)
+
+    def test_read_view_conditional(self):
+        url = get_recipe_detail_url(self.recipes[0].id)
+        headers = self.assertSameAsWSGI(url)
+
+        status, _, body = self.get(url, headers={'If-None-Match': headers['etag']})
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b'')
+
+    def test_read_view_unauthenticated(self):
+        self.headers = {}
+        status, _, _ = self.get(RECIPE_LIST_URL)
+        self.assertEqual(status, 401)
+
+    def test_concurrent_reads(self):
+        """ Test concurrent requests run on the pool and all succeed """
+        async def run():
+            return await asyncio.gather(*[
+                asgi_request(self.application, RECIPE_LIST_URL, headers=self.headers)
+                for _ in range(20)])
+
+        responses = asyncio.run(run())
+        self.assertEqual({status for status, _, _ in responses}, {200})
+        self.assertEqual(len({body for _, _, body in responses}), 1)
+
+    def test_is_read(self):
+        """ Test only safe requests of the configured views use the pool """
+        requests = RequestFactory()
+
+        self.assertTrue(self.application.is_read(requests.get(RECIPE_LIST_URL)))
+        self.assertFalse(self.application.is_read(requests.post(RECIPE_LIST_URL)))
+        self.assertFalse(self.application.is_read(requests.get(reverse('core:detail'))))
+        self.assertFalse(self.application.is_read(requests.get('/missing/')))
+
+    def test_read_pool_disabled_by_default(self):
+        """ Test without configured views every request keeps Django's handling """
+        with override_settings(ASGI_READ_VIEWS=[]):
+            application = ReadPoolASGIHandler()
+        self.addCleanup(application.executor.shutdown)
+
+        self.assertFalse(application.is_read(RequestFactory().get(RECIPE_LIST_URL)))
+        status, _, _ = asyncio.run(asgi_request(application, RECIPE_LIST_URL,
+                                                headers=self.headers))
+        self.assertEqual(status, 200)
@@ -0,0 +1,194 @@
+from unittest.mock import patch
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from recipe.models import Ingredient, Recipe, RecipeAttrQuerySet, Tag
+from utils.help_test_utils import create_ingredient, create_tag, create_user
+
+
+RECIPE_BULK_URL = reverse('recipe:recipe-bulk')
+RECIPE_LIST_URL = reverse('recipe:recipe-list')
+TAG_BULK_URL = reverse('recipe:tag-bulk')
+INGREDIENT_BULK_URL = reverse('recipe:ingredient-bulk')
+TAG_LIST_URL = reverse('recipe:tag-list')
+
+
+class RecipeBulkCreateTests(TestCase):
+    """ Test creating recipes in bulk """
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tags = [create_tag(user=self.user, name=f'Tag {i}') for i in range(3)]
+        self.ingredient = create_ingredient(user=self.user)
+
+    def payload(self, i, **params):
+        payload = {
+            'title': f'Recipe {i}',
+            'time_minutes': 10 + i,
+            'price': '5.00',
+            'tags': [tag.id for tag in self.tags[:i % 3 + 1]],
+            'ingredients': [self.ingredient.id],
+        }
+        payload.update(params)
+        return payload
+
+    def test_bulk_create(self):
+        """ Test recipes and their relations are created in order """
+        payload = [self.payload(i) for i in range(5)]
+        r = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(r.data['errors'], [])
+        self.assertEqual([item['title'] for item in r.data['created']],
+                         [item['title'] for item in payload])
+
+        for item in r.data['created']:
+            recipe = Recipe.objects.get(id=item['id'], user=self.user)
+            self.assertEqual(sorted(recipe.tags.values_list('id', flat=True)), item['tags'])
+            self.assertEqual(list(recipe.ingredients.values_list('id', flat=True)),
+                             [self.ingredient.id])
+
+    def test_bulk_create_query_count(self):
+        """ Test validation and inserts take the same queries for any number of items """
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(RECIPE_BULK_URL, [self.payload(i) for i in range(2)], format='json')
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(RECIPE_BULK_URL, [self.payload(i) for i in range(20)], format='json')
+
+        self.assertEqual(len(few), len(many))
+
+    def test_bulk_create_foreign_ids(self):
+        """ Test ids of other users' tags are reported per item """
+        foreign_tag = create_tag(create_user(email='other@example.com'))
+        payload = [self.payload(0), self.payload(1, tags=[self.tags[0].id, foreign_tag.id])]
+        r = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(r.data['errors'][0]['index'], 1)
+        self.assertIn(str(foreign_tag.id), r.data['errors'][0]['errors']['tags'][0])
+
+    def test_bulk_create_atomic(self):
+        """ Test nothing is created when any item is invalid """
+        payload = [self.payload(0), self.payload(1, title=''), self.payload(2, tags=[0])]
+        r = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in r.data['errors']], [1, 2])
+        self.assertIn('title', r.data['errors'][0]['errors'])
+        self.assertIn('tags', r.data['errors'][1]['errors'])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_partial(self):
+        """ Test valid items are created with atomic=0 """
+        payload = [self.payload(0), self.payload(1, title=''), self.payload(2)]
+        r = self.client.post(f'{RECIPE_BULK_URL}?atomic=0', payload, format='json')
+
+        self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['title'] for item in r.data['created']], ['Recipe 0', 'Recipe 2'])
+        self.assertEqual([error['index'] for error in r.data['errors']], [1])
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_bulk_create_atomic_values(self):
+        payload = [self.payload(0), self.payload(1, title='')]
+
+        r = self.client.post(f'{RECIPE_BULK_URL}?atomic=false', payload, format='json')
+        self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+
+        r = self.client.post(f'{RECIPE_BULK_URL}?atomic=sometimes', payload, format='json')
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('atomic', r.data)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_bulk_create_invalid_body(self):
+        """ Test a non-list or empty body is rejected """
+        r = self.client.post(RECIPE_BULK_URL, self.payload(0), format='json')
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+        r = self.client.post(RECIPE_BULK_URL, [], format='json')
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_invalidates_list(self):
+        """ Test cached recipe lists include bulk created recipes """
+        self.client.get(RECIPE_LIST_URL)
+        self.client.post(RECIPE_BULK_URL, [self.payload(0)], format='json')
+
+        r = self.client.get(RECIPE_LIST_URL)
+        self.assertEqual(len(r.data), 1)
+
+
+class AttrBulkGetOrCreateTests(TestCase):
+    """ Test getting or creating tags and ingredients by name in bulk """
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_tags(self):
+        """ Test existing and new names return one row per name, in order """
+        existing = create_tag(user=self.user, name='Vegan')
+        create_tag(create_user(email='other@example.com'), name='Dessert')
+
+        r = self.client.post(TAG_BULK_URL, ['Dessert', 'Vegan', ' Dessert ', 'Quick'],
+                             format='json')
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in r.data], ['Dessert', 'Vegan', 'Dessert', 'Quick'])
+        self.assertEqual(r.data[1]['id'], existing.id)
+        self.assertEqual(r.data[0]['id'], r.data[2]['id'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_tags_repeated(self):
+        """ Test repeating a bulk request creates nothing new """
+        first = self.client.post(TAG_BULK_URL, ['a', 'b'], format='json')
+        second = self.client.post(TAG_BULK_URL, ['b', 'a'], format='json')
+
+        self.assertEqual([tag['id'] for tag in first.data],
+                         [tag['id'] for tag in reversed(second.data)])
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_bulk_tags_query_count(self):
+        """ Test names are inserted and read back in one query each """
+        with self.assertNumQueries(2):
+            self.client.post(TAG_BULK_URL, [f'Tag {i}' for i in range(20)], format='json')
+
+    def test_bulk_tags_deleted_concurrently(self):
+        """ Test a name deleted between the insert and the select is created again """
+        existing = create_tag(user=self.user, name='Vegan')
+        bulk_create = RecipeAttrQuerySet.bulk_create
+
+        def bulk_create_then_delete(queryset, objs, **kwargs):
+            created = bulk_create(queryset, objs, **kwargs)
+            Tag.objects.filter(id=existing.id).delete()
+            return created
+
+        with patch.object(RecipeAttrQuerySet, 'bulk_create', bulk_create_then_delete):
+            r = self.client.post(TAG_BULK_URL, ['Quick', 'Vegan'], format='json')
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in r.data], ['Quick', 'Vegan'])
+        self.assertEqual(Tag.objects.get(user=self.user, name='Vegan').id, r.data[1]['id'])
+
+    def test_bulk_ingredients_invalid(self):
+        """ Test invalid names are reported per item and nothing is created """
+        r = self.client.post(INGREDIENT_BULK_URL, ['Salt', '', 'x' * 300], format='json')
+
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in r.data['errors']], [1, 2])
+        self.assertFalse(Ingredient.objects.exists())
+
+    def test_bulk_tags_invalidates_list(self):
+        """ Test cached tag lists include bulk created tags """
+        self.client.get(TAG_LIST_URL)
+        self.client.post(TAG_BULK_URL, ['Vegan'], format='json')
+
+        r = self.client.get(TAG_LIST_URL)
+        self.assertEqual(len(r.data), 1)
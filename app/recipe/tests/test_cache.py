@@ -0,0 +1,138 @@
+import sys
+import threading
+
+from rest_framework.test import APIClient
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from recipe.cache import ListCache, LocMemBackend, get_list_cache
+from utils.help_test_utils import create_recipe, create_tag, create_user
+
+
+RECIPE_LIST_URL = reverse('recipe:recipe-list')
+TAG_LIST_URL = reverse('recipe:tag-list')
+
+
+@override_settings(RECIPE_LIST_CACHE={'BACKEND': 'recipe.cache.LocMemBackend'})
+class ListCacheTests(TestCase):
+    """ Test caching of list responses """
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        create_tag(user=self.user, name='Vegan')
+        r1 = self.client.get(TAG_LIST_URL)
+
+        with self.assertNumQueries(0):
+            r2 = self.client.get(TAG_LIST_URL)
+
+        self.assertEqual(r1.data, r2.data)
+        self.assertEqual(get_list_cache().stats()['hits'], 1)
+
+    def test_query_params_cached_separately(self):
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(create_tag(user=self.user, name='Vegan'))
+        create_tag(user=self.user, name='Dessert')
+
+        self.assertEqual(len(self.client.get(TAG_LIST_URL).data), 2)
+        self.assertEqual(len(self.client.get(TAG_LIST_URL, {'assigned_only': 1}).data), 1)
+
+    def test_scheme_cached_separately(self):
+        """ Test cached links keep the scheme of the request """
+        for title in ('First', 'Second'):
+            create_recipe(user=self.user, title=title)
+        r = self.client.get(RECIPE_LIST_URL, {'page_size': 1})
+        self.assertTrue(r.data['next'].startswith('http://'))
+
+        r = self.client.get(RECIPE_LIST_URL, {'page_size': 1}, secure=True)
+        self.assertTrue(r.data['next'].startswith('https://'))
+
+    def test_cache_limited_to_user(self):
+        create_tag(user=self.user, name='Vegan')
+        self.client.get(TAG_LIST_URL)
+
+        other_client = APIClient()
+        other_client.force_authenticate(create_user(email='other@example.com'))
+
+        self.assertEqual(other_client.get(TAG_LIST_URL).data, [])
+
+    def test_save_invalidates(self):
+        tag = create_tag(user=self.user, name='Vegan')
+        self.client.get(TAG_LIST_URL)
+
+        tag.name = 'Vegetarian'
+        tag.save()
+
+        self.assertEqual(self.client.get(TAG_LIST_URL).data[0]['name'], 'Vegetarian')
+
+    def test_delete_invalidates(self):
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPE_LIST_URL)
+
+        recipe.delete()
+
+        self.assertEqual(self.client.get(RECIPE_LIST_URL).data, [])
+
+    def test_m2m_change_invalidates(self):
+        recipe = create_recipe(user=self.user)
+        tag = create_tag(user=self.user)
+        self.client.get(RECIPE_LIST_URL)
+        self.client.get(TAG_LIST_URL, {'assigned_only': 1})
+
+        tag.recipes.add(recipe)
+
+        self.assertEqual(self.client.get(RECIPE_LIST_URL).data[0]['tags'], [tag.id])
+        self.assertEqual(len(self.client.get(TAG_LIST_URL, {'assigned_only': 1}).data), 1)
+
+    def test_create_through_api_invalidates(self):
+        self.client.get(TAG_LIST_URL)
+        self.client.post(TAG_LIST_URL, {'name': 'Vegan'})
+
+        self.assertEqual(len(self.client.get(TAG_LIST_URL).data), 1)
+
+
+class ListCacheStatsTests(TestCase):
+
+    def test_counted_across_threads(self):
+        cache = ListCache(LocMemBackend())
+        cache.set('hit', 1)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+        def lookup():
+            for _ in range(2000):
+                cache.get('hit')
+                cache.get('miss')
+
+        threads = [threading.Thread(target=lookup) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(cache.stats(), {'hits': 16000, 'misses': 16000, 'hit_rate': 0.5})
+
+
+class LocMemBackendTests(TestCase):
+
+    def test_bounded_and_evicts_least_recently_used(self):
+        backend = LocMemBackend(max_entries=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+
+        self.assertEqual(backend.get('a'), 1)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('c'), 3)
+
+    def test_entries_expire(self):
+        backend = LocMemBackend(timeout=-1)
+        backend.set('a', 1)
+
+        self.assertIsNone(backend.get('a'))
@@ -0,0 +1,25 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from utils.help_test_utils import create_ingredient, create_recipe, create_tag, create_user
+
+
+class ExplainQueriesCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user()
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(create_tag(user=self.user))
+        recipe.ingredients.add(create_ingredient(user=self.user))
+
+    def test_explain_queries_reports_every_endpoint(self):
+        out = StringIO()
+        call_command('explain_queries', email=self.user.email, stdout=out)
+
+        output = out.getvalue()
+        for label in ['tag-list', 'ingredient-list assigned_only', 'recipe-list paginated',
+                      'recipe-list tags', 'recipe-list ingredients']:
+            self.assertIn(f'\n{label} (', output)
+        self.assertIn('recipe_tag_user_name_uniq', output)
@@ -0,0 +1,125 @@
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from django.test import TestCase
+from django.urls import reverse
+
+from utils.help_test_utils import (
+    create_ingredient, create_recipe, create_tag, create_user, get_recipe_detail_url
+)
+
+
+RECIPE_LIST_URL = reverse('recipe:recipe-list')
+
+
+class ConditionalGetTests(TestCase):
+    """ Test ETag / Last-Modified handling of recipe endpoints """
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.detail_url = get_recipe_detail_url(self.recipe.id)
+
+    def test_detail_not_modified(self):
+        r = self.client.get(self.detail_url)
+        self.assertIn('ETag', r)
+        self.assertIn('Last-Modified', r)
+
+        with self.assertNumQueries(1):
+            r = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=r['ETag'])
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_if_modified_since(self):
+        r = self.client.get(self.detail_url)
+
+        r = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=r['Last-Modified'])
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_modified_by_save(self):
+        etag = self.client.get(self.detail_url)['ETag']
+
+        self.client.patch(self.detail_url, {'title': 'New title'})
+
+        r = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data['title'], 'New title')
+
+    def test_detail_modified_by_m2m_change(self):
+        tag = create_tag(user=self.user)
+        etag = self.client.get(self.detail_url)['ETag']
+
+        self.recipe.tags.add(tag)
+        r = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+        etag = r['ETag']
+        tag.recipes.clear()
+        r = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+    def test_detail_modified_by_ingredient_rename(self):
+        ingredient = create_ingredient(user=self.user)
+        self.recipe.ingredients.add(ingredient)
+        etag = self.client.get(self.detail_url)['ETag']
+
+        ingredient.name = 'Pepper'
+        ingredient.save()
+
+        r = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+    def test_detail_not_found(self):
+        r = self.client.get(get_recipe_detail_url(self.recipe.id + 1))
+        self.assertEqual(r.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_not_modified(self):
+        etag = self.client.get(RECIPE_LIST_URL)['ETag']
+
+        with self.assertNumQueries(1):
+            r = self.client.get(RECIPE_LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_modified_by_delete(self):
+        create_recipe(user=self.user, title='Second')
+        etag = self.client.get(RECIPE_LIST_URL)['ETag']
+
+        self.recipe.delete()
+
+        r = self.client.get(RECIPE_LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(r.data), 1)
+
+    def test_list_etag_depends_on_query(self):
+        tag = create_tag(user=self.user)
+        etag = self.client.get(RECIPE_LIST_URL)['ETag']
+
+        r = self.client.get(RECIPE_LIST_URL, {'tags': tag.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+    def test_etag_depends_on_host_and_scheme(self):
+        """ Test a copy with absolute URLs of another host or scheme is not confirmed """
+        for url in (RECIPE_LIST_URL, self.detail_url):
+            etag = self.client.get(url)['ETag']
+            for extra in ({'HTTP_HOST': 'other.example.com'}, {'secure': True}):
+                with self.subTest(url=url, **extra), self.settings(ALLOWED_HOSTS=['*']):
+                    r = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **extra)
+                    self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+    def test_paginated_list_not_modified(self):
+        create_recipe(user=self.user, title='Second')
+        etag = self.client.get(RECIPE_LIST_URL, {'page_size': 1})['ETag']
+
+        r = self.client.get(RECIPE_LIST_URL, {'page_size': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_paginated_list_modified(self):
+        recipe = create_recipe(user=self.user, title='Second')
+        etag = self.client.get(RECIPE_LIST_URL, {'page_size': 1})['ETag']
+
+        recipe.title = 'New title'
+        recipe.save()
+
+        r = self.client.get(RECIPE_LIST_URL, {'page_size': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
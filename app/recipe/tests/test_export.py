@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from utils.help_test_utils import (
+    create_ingredient, create_recipe, create_tag, create_user, get_recipe_detail_url
+)
+
+
+RECIPE_EXPORT_URL = reverse('recipe:recipe-export')
+
+
+class RecipeExportTests(TestCase):
+    """ Test streaming exports of the user's recipes """
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.tags = [create_tag(user=self.user, name=name)
+                     for name in ['Vegan', 'Dessert, sweet', 'emoji 🍰']]
+        ingredient = create_ingredient(user=self.user, name='Chocolate "dark"')
+        self.recipes = []
+        for i in range(5):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}\nćevapi')
+            recipe.tags.add(*self.tags[:i % 4])
+            recipe.ingredients.add(ingredient)
+            self.recipes.append(recipe)
+        create_recipe(user=create_user(email='other@example.com'), title='Other')
+
+    def export(self, params=None, **extra):
+        r = self.client.get(RECIPE_EXPORT_URL, params, **extra)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertTrue(r.streaming)
+        return r, b''.join(r.streaming_content).decode()
+
+    def test_ndjson_lines_are_recipe_details(self):
+        r, content = self.export()
+
+        self.assertEqual(r['Content-Type'], 'application/x-ndjson')
+        self.assertIn('filename="recipes.ndjson"', r['Content-Disposition'])
+        lines = content.splitlines()
+        self.assertEqual(len(lines), 5)
+        for line, recipe in zip(lines, reversed(self.recipes)):
+            detail = self.client.get(get_recipe_detail_url(recipe.id))
+            self.assertEqual(line.encode(), detail.content)
+
+    def test_csv(self):
+        r, content = self.export({'export_format': 'csv'})
+
+        self.assertEqual(r['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row['title'] for row in rows],
+                         [recipe.title for recipe in reversed(self.recipes)])
+        self.assertEqual(json.loads(rows[2]['tags']), ['Vegan', 'Dessert, sweet'])
+        self.assertEqual(json.loads(rows[0]['ingredients']), ['Chocolate "dark"'])
+
+    def test_empty_csv_has_header(self):
+        _, content = self.export({'export_format': 'csv', 'search': 'missing'})
+
+        self.assertEqual(content.splitlines(),
+                         ['id,title,time_minutes,price,link,tags,ingredients'])
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_streamed_in_chunks(self):
+        r = self.client.get(RECIPE_EXPORT_URL)
+
+        parts = [part.decode().splitlines() for part in r.streaming_content]
+        self.assertEqual([len(lines) for lines in parts], [2, 2, 1])
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_rows_changed_while_streaming(self):
+        """ Test chunks continue after the last exported id, without skips or repeats """
+        r = self.client.get(RECIPE_EXPORT_URL)
+        chunks = iter(r.streaming_content)
+        ids = [json.loads(line)['id'] for line in next(chunks).decode().splitlines()]
+
+        create_recipe(user=self.user, title='Created meanwhile')
+        self.recipes[0].delete()
+        ids += [json.loads(line)['id'] for chunk in chunks for line in chunk.decode().splitlines()]
+
+        self.assertEqual(ids, [recipe.id for recipe in reversed(self.recipes[1:])])
+
+    def test_filtered_like_list(self):
+        _, content = self.export({'tags': self.tags[1].id})
+
+        ids = [json.loads(line)['id'] for line in content.splitlines()]
+        self.assertEqual(ids, [self.recipes[3].id, self.recipes[2].id])
+
+    def test_any_accept_header(self):
+        r, _ = self.export({'export_format': 'csv'}, HTTP_ACCEPT='text/csv')
+
+        self.assertEqual(r['Content-Type'], 'text/csv; charset=utf-8')
+
+    def test_invalid_format(self):
+        r = self.client.get(RECIPE_EXPORT_URL, {'export_format': 'xml'})
+
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('export_format', r.data)
+
+    def test_login_required(self):
+        r = APIClient().get(RECIPE_EXPORT_URL)
+
+        self.assertEqual(r.status_code, status.HTTP_401_UNAUTHORIZED)
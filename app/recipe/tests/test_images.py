@@ -0,0 +1,151 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from recipe import images
+from recipe.models import Recipe
+from utils.help_test_utils import create_recipe, create_user, get_image_upload_url
+
+
+RECIPE_LIST_URL = reverse('recipe:recipe-list')
+
+
+def make_image_file(size=(2000, 1000), mode='RGB', image_format='JPEG', color='red',
+                    **options):
+    image_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+    Image.new(mode, size, color=color).save(image_file, format=image_format, **options)
+    image_file.seek(0)
+    return image_file
+
+
+# TestCase never commits, run on commit callbacks right away
+@patch('recipe.images.transaction.on_commit', lambda func: func())
+@override_settings(RECIPE_LIST_CACHE={'BACKEND': 'recipe.cache.DummyBackend'})
+class RecipeImageProcessingTests(TestCase):
+
+    def setUp(self):
+        # variants are rendered in the request thread
+        override = override_settings(RECIPE_IMAGE_PROCESSING={'workers': 0})
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, os.path.join(settings.MEDIA_ROOT, 'uploads'), True)
+
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.url = get_image_upload_url(self.recipe.id)
+
+    def upload(self, image_file):
+        with image_file:
+            r = self.client.post(self.url, {'image': image_file}, format='multipart')
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        return r
+
+    def test_upload_reports_pending(self):
+        with patch('recipe.images.process_recipe_image') as process:
+            r = self.upload(make_image_file())
+
+        self.assertEqual(r.data['images'], {'status': 'pending', 'variants': {}})
+        process.assert_called_once_with(self.recipe.id, self.recipe.image.name)
+
+    def test_variants_are_rendered(self):
+        exif = Image.Exif()
+        exif[0x010f] = 'Camera maker'
+        self.upload(make_image_file(exif=exif.tobytes()))
+
+        self.assertEqual(self.recipe.image_status, images.STATUS_READY)
+        self.assertEqual(set(self.recipe.image_variants), set(images.VARIANTS))
+        for name, bounds in images.VARIANTS.items():
+            formats = self.recipe.image_variants[name]
+            self.assertEqual(set(formats), set(images.FORMATS))
+            for image_format, file_name in formats.items():
+                with Image.open(default_storage.path(file_name)) as variant:
+                    self.assertEqual(variant.format, image_format.upper())
+                    # aspect ratio is kept
+                    self.assertEqual(variant.size, (bounds[0], bounds[1] // 2))
+                    self.assertNotIn('exif', variant.info)
+
+    def test_small_images_are_not_upscaled(self):
+        self.upload(make_image_file(size=(100, 50)))
+
+        file_name = self.recipe.image_variants['large']['webp']
+        with Image.open(default_storage.path(file_name)) as variant:
+            self.assertEqual(variant.size, (100, 50))
+
+    def test_transparent_images(self):
+        self.upload(make_image_file(mode='RGBA', image_format='PNG', color=(255, 0, 0, 128)))
+
+        self.assertEqual(self.recipe.image_status, images.STATUS_READY)
+        with Image.open(default_storage.path(self.recipe.image_variants['thumb']['webp'])) as v:
+            self.assertEqual(v.mode, 'RGBA')
+        with Image.open(default_storage.path(self.recipe.image_variants['thumb']['jpeg'])) as v:
+            self.assertEqual(v.mode, 'RGB')
+
+    def test_broken_image_fails(self):
+        with make_image_file() as image_file:
+            content = ContentFile(image_file.read(100))
+        name = default_storage.save('uploads/recipe/broken.jpg', content)
+        Recipe.objects.filter(pk=self.recipe.pk).update(image=name)
+
+        with self.assertLogs('recipe.images', 'ERROR'):
+            images.process_recipe_image(self.recipe.id, name)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, images.STATUS_FAILED)
+        self.assertEqual(self.recipe.image_variants, {})
+
+    def test_replaced_image_is_not_reported(self):
+        self.upload(make_image_file())
+        old_name = self.recipe.image.name
+        with patch('recipe.images.process_recipe_image'):
+            self.upload(make_image_file(size=(20, 20)))
+
+        images.process_recipe_image(self.recipe.id, old_name)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, images.STATUS_PENDING)
+
+    @patch('recipe.images.process_recipe_image')
+    def test_recipe_without_image_not_processed(self, process):
+        images.schedule_image_processing(self.recipe)
+
+        process.assert_not_called()
+
+    def test_variant_urls_in_list_and_detail(self):
+        self.upload(make_image_file())
+        thumb = 'http://testserver' + settings.MEDIA_URL + \
+            self.recipe.image_variants['thumb']['webp']
+
+        r = self.client.get(RECIPE_LIST_URL)
+        self.assertEqual(r.data[0]['images']['status'], 'ready')
+        self.assertEqual(r.data[0]['images']['variants']['thumb']['webp'], thumb)
+
+        with override_settings(RECIPE_FAST_LIST=False):
+            slow = self.client.get(RECIPE_LIST_URL)
+        self.assertEqual(r.content, slow.content)
+
+        r = self.client.get(reverse('recipe:recipe-detail', args=[self.recipe.id]))
+        self.assertEqual(r.data['images']['variants']['thumb']['webp'], thumb)
+
+    def test_process_pool(self):
+        with patch('recipe.images.process_recipe_image'):
+            self.upload(make_image_file())
+
+        with images.ProcessPoolExecutor(max_workers=1) as pool:
+            images.process_recipe_image(self.recipe.id, self.recipe.image.name, pool)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, images.STATUS_READY)
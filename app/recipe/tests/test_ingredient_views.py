@@ -96,3 +96,28 @@ class PrivateIngredientsApiTests(TestCase):
 
         r = self.client.get(INGREDIENT_LIST_URL, {'assigned_only': 1})
         self.assertEqual(len(r.data), 1)
+
+    def test_list_ingredients_with_counts(self):
+        item1 = create_ingredient(user=self.user, name='eggs')
+        item2 = create_ingredient(user=self.user, name='ham')
+        create_ingredient(user=self.user, name='bread')
+
+        recipe1 = create_recipe(user=self.user, title='pancakes')
+        recipe2 = create_recipe(user=self.user, title='jam on toast')
+        recipe1.ingredients.add(item1, item2)
+        recipe2.ingredients.add(item1)
+
+        r = self.client.get(INGREDIENT_LIST_URL, {'with_counts': 1})
+
+        counts = {item['name']: item['recipe_count'] for item in r.data}
+        self.assertEqual(counts, {'eggs': 2, 'ham': 1, 'bread': 0})
+
+    def test_list_assigned_ingredients_with_counts(self):
+        item = create_ingredient(user=self.user, name='eggs')
+        create_ingredient(user=self.user, name='ham')
+        recipe = create_recipe(user=self.user)
+        recipe.ingredients.add(item)
+
+        r = self.client.get(INGREDIENT_LIST_URL, {'assigned_only': 1, 'with_counts': 1})
+
+        self.assertEqual(r.data, [{'id': item.id, 'name': item.name, 'recipe_count': 1}])
@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+import uuid
+
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from utils import media
+from utils.media import IMMUTABLE_MAX_AGE
+
+
+CONTENT = bytes(range(256)) * 4
+
+
+class MediaServingTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root, MEDIA_SERVING={
+            'backend': 'sendfile', 'internal_prefix': '/protected/', 'max_age': 60})
+        override.enable()
+        self.addCleanup(override.disable)
+
+        os.makedirs(os.path.join(media_root, 'uploads/recipe'))
+        self.name = f'uploads/recipe/{uuid.uuid4()}.jpg'
+        self.path = os.path.join(media_root, self.name)
+        with open(self.path, 'wb') as f:
+            f.write(CONTENT)
+        self.url = reverse('media', args=[self.name])
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_serve_file(self):
+        r = self.client.get(self.url)
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(self.content(r), CONTENT)
+        self.assertEqual(r['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(r['Content-Type'], 'image/jpeg')
+        self.assertEqual(r['Accept-Ranges'], 'bytes')
+        self.assertTrue(r['ETag'].startswith('"'))
+        self.assertEqual(
+            r['Cache-Control'], f'public, max-age={IMMUTABLE_MAX_AGE}, immutable')
+
+    def test_file_is_handed_to_server(self):
+        """ Ranges to the end of file go to wsgi.file_wrapper, which may use sendfile """
+        request = RequestFactory().get(self.url, HTTP_RANGE='bytes=1000-')
+        r = media.serve(request, self.name)
+
+        self.assertEqual(r.file_to_stream.tell(), 1000)
+        r.close()
+
+    def test_other_names_are_not_immutable(self):
+        with open(os.path.join(os.path.dirname(self.path), 'logo.png'), 'wb') as f:
+            f.write(CONTENT)
+
+        r = self.client.get(reverse('media', args=['uploads/recipe/logo.png']))
+        self.assertEqual(r['Cache-Control'], 'public, max-age=60')
+
+    def test_head(self):
+        r = self.client.head(self.url)
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.content, b'')
+        self.assertEqual(r['Content-Length'], str(len(CONTENT)))
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+
+        r = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(r['ETag'], etag)
+
+        r = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=http_date(os.path.getmtime(self.path)))
+        self.assertEqual(r.status_code, 304)
+
+    def test_etag_changes_with_file(self):
+        etag = self.client.get(self.url)['ETag']
+        with open(self.path, 'ab') as f:
+            f.write(b'more')
+
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+
+    def test_ranges(self):
+        size = len(CONTENT)
+        for header, start, end in [('bytes=10-19', 10, 19), ('bytes=1000-', 1000, size - 1),
+                                   ('bytes=-5', size - 5, size - 1),
+                                   ('bytes=1020-5000', 1020, size - 1)]:
+            with self.subTest(header):
+                r = self.client.get(self.url, HTTP_RANGE=header)
+
+                self.assertEqual(r.status_code, 206)
+                self.assertEqual(self.content(r), CONTENT[start:end + 1])
+                self.assertEqual(r['Content-Range'], f'bytes {start}-{end}/{size}')
+                self.assertEqual(r['Content-Length'], str(end - start + 1))
+
+    def test_unsatisfiable_range(self):
+        r = self.client.get(self.url, HTTP_RANGE=f'bytes={len(CONTENT)}-')
+
+        self.assertEqual(r.status_code, 416)
+        self.assertEqual(r['Content-Range'], f'bytes */{len(CONTENT)}')
+        # a shared cache mustn't keep the error
+        self.assertNotIn('Cache-Control', r)
+        self.assertNotIn('ETag', r)
+        self.assertFalse(r['Content-Type'].startswith('image/'))
+
+    def test_ignored_ranges(self):
+        for header in ['bytes=0-1,5-6', 'bytes=9-2', 'lines=1-2']:
+            with self.subTest(header):
+                r = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(r.status_code, 200)
+                self.assertEqual(self.content(r), CONTENT)
+
+    def test_if_range(self):
+        etag = self.client.get(self.url)['ETag']
+
+        r = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(r.status_code, 206)
+
+        r = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(self.content(r), CONTENT)
+
+    def test_missing_files(self):
+        for name in ['uploads/recipe/missing.jpg', 'uploads/recipe', '../../etc/passwd']:
+            with self.subTest(name):
+                r = self.client.get(reverse('media', args=[name]))
+                self.assertEqual(r.status_code, 404)
+
+    def test_unsafe_method(self):
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_x_accel_redirect(self):
+        with override_settings(MEDIA_SERVING={'backend': 'x-accel-redirect'}):
+            r = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.content, b'')
+        self.assertEqual(r['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(r['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', r['Cache-Control'])
+
+    def test_x_sendfile(self):
+        with override_settings(MEDIA_SERVING={'backend': 'x-sendfile'}):
+            r = self.client.get(self.url)
+
+        self.assertEqual(r['X-Sendfile'], self.path)
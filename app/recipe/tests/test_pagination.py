@@ -0,0 +1,92 @@
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from recipe.models import Recipe, Tag
+from utils.help_test_utils import create_recipe, create_tag, create_user
+
+
+RECIPE_LIST_URL = reverse('recipe:recipe-list')
+TAG_LIST_URL = reverse('recipe:tag-list')
+
+
+class CursorPaginationTests(TestCase):
+    """ Test opt-in cursor pagination of list endpoints """
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _collect_pages(self, url, params):
+        """ Follow next links and return all ids and number of pages """
+        ids, pages = [], 0
+        r = self.client.get(url, params)
+        while True:
+            self.assertEqual(r.status_code, status.HTTP_200_OK)
+            ids += [item['id'] for item in r.data['results']]
+            pages += 1
+            if not r.data['next']:
+                return ids, pages
+            r = self.client.get(r.data['next'])
+
+    def test_list_not_paginated_by_default(self):
+        create_recipe(user=self.user)
+
+        r = self.client.get(RECIPE_LIST_URL)
+        self.assertIsInstance(r.data, list)
+
+    def test_recipes_paginated(self):
+        for _ in range(5):
+            create_recipe(user=self.user)
+
+        r = self.client.get(RECIPE_LIST_URL, {'page_size': 2})
+        self.assertEqual(len(r.data['results']), 2)
+        self.assertIsNotNone(r.data['next'])
+        self.assertNotIn('count', r.data)
+
+        ids, pages = self._collect_pages(RECIPE_LIST_URL, {'page_size': 2})
+        expected = list(Recipe.objects.order_by('-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_recipes_paginated_with_filter(self):
+        tag = create_tag(user=self.user)
+        for i in range(5):
+            recipe = create_recipe(user=self.user)
+            if i % 2:
+                recipe.tags.add(tag)
+
+        ids, _ = self._collect_pages(RECIPE_LIST_URL, {'page_size': 1, 'tags': tag.id})
+        expected = Recipe.objects.filter(tags=tag).order_by('-id').values_list('id', flat=True)
+        self.assertEqual(ids, list(expected))
+
+    def test_tags_paginated_by_name(self):
+        for name in ['b', 'a', 'e', 'c', 'd']:
+            create_tag(user=self.user, name=name)
+
+        ids, _ = self._collect_pages(TAG_LIST_URL, {'page_size': 2})
+        expected = list(Tag.objects.order_by('-name', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_tags_paginated_assigned_only(self):
+        recipe = create_recipe(user=self.user)
+        for name in ['a', 'b', 'c']:
+            recipe.tags.add(create_tag(user=self.user, name=name))
+        create_tag(user=self.user, name='unassigned')
+
+        ids, _ = self._collect_pages(TAG_LIST_URL, {'page_size': 2, 'assigned_only': 1})
+        self.assertEqual(ids, list(recipe.tags.order_by('-name').values_list('id', flat=True)))
+
+    def test_pagination_runs_no_count(self):
+        for _ in range(3):
+            create_recipe(user=self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(RECIPE_LIST_URL, {'page_size': 2})
+
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in ctx.captured_queries))
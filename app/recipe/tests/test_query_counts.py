@@ -0,0 +1,97 @@
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from recipe.models import Recipe
+from utils.help_test_utils import (
+    create_ingredient, create_recipe, create_tag, create_user, get_recipe_detail_url
+)
+
+
+RECIPE_LIST_URL = reverse('recipe:recipe-list')
+TAG_LIST_URL = reverse('recipe:tag-list')
+INGREDIENT_LIST_URL = reverse('recipe:ingredient-list')
+
+
+class QueryCountTests(TestCase):
+    """ Test that the number of queries does not grow with the number of rows """
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.tag = create_tag(user=self.user, name='Vegan')
+        self.ingredient = create_ingredient(user=self.user, name='Salt')
+
+    def _create_recipes(self, count):
+        # tag and ingredient names are unique per user, continue numbering
+        start = Recipe.objects.count()
+        for i in range(start, start + count):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(self.tag, create_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                self.ingredient, create_ingredient(user=self.user, name=f'Ingredient {i}'))
+
+    def _count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get(url, params)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        return len(ctx)
+
+    def assertConstantQueries(self, url, params=None):
+        """ Compare query counts for a small and a larger number of rows """
+        self._create_recipes(2)
+        small = self._count_queries(url, params)
+
+        self._create_recipes(10)
+        large = self._count_queries(url, params)
+
+        self.assertEqual(small, large)
+        return large
+
+    def test_recipe_list(self):
+        self.assertEqual(self.assertConstantQueries(RECIPE_LIST_URL), 4)
+
+    def test_recipe_list_filtered_by_tags(self):
+        self.assertConstantQueries(RECIPE_LIST_URL, {'tags': self.tag.id})
+
+    def test_recipe_list_filtered_by_ingredients(self):
+        self.assertConstantQueries(RECIPE_LIST_URL, {'ingredients': self.ingredient.id})
+
+    def test_recipe_detail(self):
+        recipe = create_recipe(user=self.user)
+        url = get_recipe_detail_url(recipe.id)
+
+        recipe.tags.add(self.tag)
+        recipe.ingredients.add(self.ingredient)
+        small = self._count_queries(url)
+
+        for i in range(10):
+            recipe.tags.add(create_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(create_ingredient(user=self.user, name=f'Ingredient {i}'))
+        large = self._count_queries(url)
+
+        self.assertEqual(small, large)
+
+    def test_tag_list(self):
+        self.assertEqual(self.assertConstantQueries(TAG_LIST_URL), 1)
+
+    def test_tag_list_assigned_only(self):
+        self.assertConstantQueries(TAG_LIST_URL, {'assigned_only': 1})
+
+    def test_tag_list_with_counts(self):
+        self.assertEqual(self.assertConstantQueries(TAG_LIST_URL, {'with_counts': 1}), 1)
+
+    def test_ingredient_list(self):
+        self.assertEqual(self.assertConstantQueries(INGREDIENT_LIST_URL), 1)
+
+    def test_ingredient_list_assigned_only(self):
+        self.assertConstantQueries(INGREDIENT_LIST_URL, {'assigned_only': 1})
+
+    def test_ingredient_list_with_counts(self):
+        self.assertEqual(self.assertConstantQueries(INGREDIENT_LIST_URL, {'with_counts': 1}), 1)
@@ -3,7 +3,9 @@ from PIL import Image
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from recipe.models import Recipe
@@ -111,6 +113,33 @@ class PrivateRecipesApiTests(TestCase):
         self.assertEqual(ings.count(), 2)
         self.assertTrue(all(ing.id in ing_payload for ing in ings))
 
+    def test_create_recipe_with_foreign_and_missing_ids(self):
+        """ Test other users' and missing ids are rejected together """
+        own_tag = create_tag(self.user)
+        foreign_tag = create_tag(create_user(email='other@example.com'))
+        self.payload['tags'] = [own_tag.id, foreign_tag.id, foreign_tag.id + 100]
+
+        r = self.client.post(RECIPE_LIST_URL, self.payload)
+
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(foreign_tag.id), r.data['tags'][0])
+        self.assertIn(str(foreign_tag.id + 100), r.data['tags'][0])
+        self.assertNotIn(str(own_tag.id), r.data['tags'][0])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_create_recipe_related_ids_single_query(self):
+        """ Test validating related ids takes one query per field """
+        self.payload['tags'] = [create_tag(self.user, name=f'Tag {i}').id for i in range(2)]
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(RECIPE_LIST_URL, self.payload)
+
+        self.payload['tags'] = [create_tag(self.user, name=f'Tag {i}').id for i in range(2, 12)]
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(RECIPE_LIST_URL, self.payload)
+
+        self.assertEqual(len(few), len(many))
+
     def test_partial_update_recipe(self):
         """ Test updating a recipe with patch """
 
@@ -137,6 +166,8 @@ class PrivateRecipesApiTests(TestCase):
         payload = RecipeDetailSerializer(recipe).data
         payload['title'] = 'New title'
         payload['tags'] = [new_tag.id]
+        # read only and nested, which multipart can't encode
+        del payload['images']
 
         self.client.put(get_recipe_detail_url(recipe.id), payload)
         recipe.refresh_from_db()
@@ -183,6 +214,49 @@ class PrivateRecipesApiTests(TestCase):
         self.assertIn(serializer2.data, r.data)
         self.assertNotIn(serializer3.data, r.data)
 
+    def test_filter_recipes_no_duplicates(self):
+        recipe = create_recipe(user=self.user)
+        tag1 = create_tag(user=self.user, name='vegan')
+        tag2 = create_tag(user=self.user, name='dessert')
+        recipe.tags.add(tag1, tag2)
+
+        r = self.client.get(RECIPE_LIST_URL, {'tags': f'{tag1.id},{tag2.id}'})
+        self.assertEqual(len(r.data), 1)
+
+    def test_filter_recipes_by_all_tags(self):
+        recipe1 = create_recipe(user=self.user, title='vegan cake')
+        recipe2 = create_recipe(user=self.user, title='vegan salad')
+        tag1 = create_tag(user=self.user, name='vegan')
+        tag2 = create_tag(user=self.user, name='dessert')
+
+        recipe1.tags.add(tag1, tag2)
+        recipe2.tags.add(tag1)
+
+        r = self.client.get(RECIPE_LIST_URL, {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'})
+
+        self.assertEqual(r.data, [RecipeSerializer(recipe1).data])
+
+    def test_filter_recipes_by_all_tags_and_ingredients(self):
+        recipe1 = create_recipe(user=self.user, title='chocolate cake')
+        recipe2 = create_recipe(user=self.user, title='vanilla cake')
+        tag = create_tag(user=self.user, name='dessert')
+        ing1 = create_ingredient(user=self.user, name='flour')
+        ing2 = create_ingredient(user=self.user, name='chocolate')
+
+        recipe1.tags.add(tag)
+        recipe1.ingredients.add(ing1, ing2)
+        recipe2.tags.add(tag)
+        recipe2.ingredients.add(ing1)
+
+        r = self.client.get(RECIPE_LIST_URL, {
+            'tags': tag.id, 'ingredients': f'{ing1.id},{ing2.id}', 'match': 'all'})
+
+        self.assertEqual(r.data, [RecipeSerializer(recipe1).data])
+
+    def test_filter_recipes_invalid_match(self):
+        r = self.client.get(RECIPE_LIST_URL, {'tags': '1', 'match': 'some'})
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class RecipeImageUploadTests(TestCase):
 
@@ -0,0 +1,120 @@
+import datetime
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+
+from recipe import renderers
+from recipe.renderers import FastJSONRenderer
+from utils.help_test_utils import create_ingredient, create_recipe, create_tag, create_user
+
+
+RECIPE_LIST_URL = reverse('recipe:recipe-list')
+TAG_LIST_URL = reverse('recipe:tag-list')
+INGREDIENT_LIST_URL = reverse('recipe:ingredient-list')
+
+
+@override_settings(RECIPE_LIST_CACHE={'BACKEND': 'recipe.cache.DummyBackend'})
+class FastListTests(TestCase):
+    """ Test that fast list responses are byte for byte equal to serializer responses """
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        tags = [create_tag(user=self.user, name=name)
+                for name in ['Vegan', 'Dessert', 'Žličnjaci', 'emoji 🍰', 'line sep']]
+        ingredients = [create_ingredient(user=self.user, name=name)
+                       for name in ['Salt', 'Chocolate "dark"', 'Back\\slash']]
+
+        for i, price in enumerate(['0.50', '5.00', '999.99', '12.30']):
+            recipe = create_recipe(
+                user=self.user, title=f'Recipe {i} ćevapi\n', price=Decimal(price),
+                link='https://example.com/?a=1&b=2' if i % 2 else '')
+            recipe.tags.add(*tags[i:])
+            recipe.ingredients.add(*ingredients[:i])
+        create_recipe(user=self.user, title='Plain')
+
+    def assertSameContent(self, url, params=None):
+        fast = self.client.get(url, params)
+        with override_settings(RECIPE_FAST_LIST=False):
+            slow = self.client.get(url, params)
+
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_recipe_list(self):
+        r = self.assertSameContent(RECIPE_LIST_URL)
+        self.assertEqual(len(r.data), 5)
+
+    def test_recipe_list_filtered(self):
+        tag = self.user.tag_set.get(name='Vegan')
+        self.assertSameContent(RECIPE_LIST_URL, {'tags': tag.id})
+
+    def test_recipe_list_paginated(self):
+        r = self.assertSameContent(RECIPE_LIST_URL, {'page_size': 2})
+        self.assertSameContent(r.data['next'])
+
+    def test_recipe_list_search(self):
+        self.assertSameContent(RECIPE_LIST_URL, {'search': 'recipe'})
+
+    def test_tag_list(self):
+        self.assertSameContent(TAG_LIST_URL)
+        self.assertSameContent(TAG_LIST_URL, {'assigned_only': 1})
+
+    def test_tag_list_with_counts(self):
+        self.assertSameContent(TAG_LIST_URL, {'with_counts': 1, 'page_size': 2})
+
+    def test_ingredient_list(self):
+        self.assertSameContent(INGREDIENT_LIST_URL)
+        self.assertSameContent(INGREDIENT_LIST_URL, {'with_counts': 1})
+
+
+class FastJSONRendererTests(TestCase):
+
+    def test_orjson_installed(self):
+        """ Test the fast path is what's tested, orjson is in requirements.txt """
+        self.assertIsNotNone(renderers.orjson)
+
+    def assertSameRender(self, data, accepted_media_type=None):
+        self.assertEqual(FastJSONRenderer().render(data, accepted_media_type),
+                         JSONRenderer().render(data, accepted_media_type))
+
+    def test_render_same_as_json_renderer(self):
+        self.assertSameRender([
+            {'id': 1, 'name': 'ünïcode \u2028 \u2029 \x01 "quoted"', 'price': Decimal('1.50')},
+            {'nested': {'a': [1, 2.5, None, True]}, 'lazy': gettext_lazy('Not found.')},
+        ])
+        self.assertSameRender({'big': 2 ** 70})
+        self.assertSameRender(None)
+
+    def test_render_dates(self):
+        self.assertSameRender({
+            'utc': datetime.datetime(2020, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+            'offset': datetime.datetime(
+                2020, 1, 2, 3, 4, 5, tzinfo=datetime.timezone(datetime.timedelta(hours=2))),
+            'naive': datetime.datetime(2020, 1, 2, 3, 4, 5),
+            'date': datetime.date(2020, 1, 2),
+            'time': datetime.time(3, 4, 5, 678901),
+            'duration': datetime.timedelta(days=1, seconds=5),
+        })
+
+    def test_render_floats(self):
+        self.assertSameRender({'small': 1e-7, 'large': 1e16, 'list': [0.1, 1.5, 1e22]})
+        self.assertSameRender([{'nested': (2.5e-5,)}])
+        self.assertSameRender(1e-7)
+
+    def test_render_nan_fails(self):
+        """ Test NaN fails as with JSONRenderer instead of being rendered as null """
+        for value in (float('nan'), [float('inf')], {'a': {'b': float('nan')}}):
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render(value)
+
+    def test_render_indented(self):
+        self.assertSameRender({'a': [1, 2]}, 'application/json; indent=4')
@@ -0,0 +1,76 @@
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from django.test import TestCase
+from django.urls import reverse
+
+from recipe.models import Recipe
+from utils.help_test_utils import create_ingredient, create_recipe, create_tag, create_user
+
+
+RECIPE_LIST_URL = reverse('recipe:recipe-list')
+
+
+class RecipeSearchTests(TestCase):
+    """ Test searching recipes by title """
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.cake = create_recipe(user=self.user, title='Chocolate cake')
+        self.pancakes = create_recipe(user=self.user, title='Pancakes with chocolate sauce')
+        self.salad = create_recipe(user=self.user, title='Greek salad')
+
+    def _search(self, **params):
+        r = self.client.get(RECIPE_LIST_URL, params)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        return [recipe['id'] for recipe in r.data]
+
+    def test_search_vector_maintained_by_database(self):
+        self.salad.title = 'Tomato soup'
+        self.salad.save()
+
+        self.assertTrue(Recipe.objects.filter(search_vector='soup').exists())
+        self.assertFalse(Recipe.objects.filter(search_vector='salad').exists())
+
+    def test_search_full_text(self):
+        ids = self._search(search='chocolates')
+
+        self.assertEqual(set(ids), {self.cake.id, self.pancakes.id})
+
+    def test_search_ranked(self):
+        ids = self._search(search='chocolate cake')
+
+        self.assertEqual(ids[0], self.cake.id)
+
+    def test_search_tolerates_typos(self):
+        ids = self._search(search='choclate')
+
+        self.assertIn(self.cake.id, ids)
+        self.assertNotIn(self.salad.id, ids)
+
+    def test_search_limited_to_user(self):
+        create_recipe(user=create_user(email='other@example.com'), title='Chocolate cake')
+
+        self.assertEqual(set(self._search(search='chocolate')), {self.cake.id, self.pancakes.id})
+
+    def test_search_combined_with_filters(self):
+        tag = create_tag(user=self.user, name='dessert')
+        self.cake.tags.add(tag)
+
+        self.assertEqual(self._search(search='chocolate', tags=tag.id), [self.cake.id])
+
+    def test_search_related_names(self):
+        self.salad.ingredients.add(create_ingredient(user=self.user, name='Feta cheese'))
+
+        self.assertEqual(self._search(search='feta'), [])
+        self.assertEqual(self._search(search='feta', search_related=1), [self.salad.id])
+        self.assertEqual(self._search(search='feta', search_related='true'), [self.salad.id])
+
+    def test_invalid_search_related(self):
+        r = self.client.get(RECIPE_LIST_URL, {'search': 'feta', 'search_related': 'yes please'})
+
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('search_related', r.data)
@@ -0,0 +1,214 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from io import StringIO
+from unittest.mock import patch
+
+from PIL import Image
+from rest_framework.test import APIClient
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from recipe.images import STATUS_READY, get_variant_names, process_recipe_image
+from recipe.models import ImageFile, Recipe
+from recipe.storage import collect_garbage
+from utils.help_test_utils import create_recipe, create_user, get_image_upload_url
+
+
+def make_image_bytes(size=(30, 20), color='red'):
+    with tempfile.TemporaryFile() as image_file:
+        Image.new('RGB', size, color=color).save(image_file, format='JPEG')
+        image_file.seek(0)
+        return image_file.read()
+
+
+# variants are rendered on upload, in the request thread
+@patch('recipe.images.transaction.on_commit', lambda func: func())
+@override_settings(RECIPE_IMAGE_PROCESSING={'workers': 0},
+                   RECIPE_LIST_CACHE={'BACKEND': 'recipe.cache.DummyBackend'})
+class ContentHashStorageTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.content = make_image_bytes()
+        self.name = f'uploads/recipe/{hashlib.sha256(self.content).hexdigest()}.jpg'
+
+    def upload(self, recipe, content, file_name='photo.JPG'):
+        with tempfile.NamedTemporaryFile(suffix=file_name) as image_file:
+            image_file.write(content)
+            image_file.seek(0)
+            r = self.client.post(get_image_upload_url(recipe.id), {'image': image_file},
+                                 format='multipart')
+        self.assertEqual(r.status_code, 200)
+        recipe.refresh_from_db()
+        return recipe
+
+    def path(self, name):
+        return os.path.join(self.media_root, name)
+
+    def references(self, name):
+        return ImageFile.objects.get(name=name).references
+
+    def test_identical_images_share_a_file(self):
+        first = self.upload(create_recipe(user=self.user), self.content)
+        second = self.upload(create_recipe(user=self.user), self.content)
+
+        self.assertEqual(first.image.name, self.name)
+        self.assertEqual(second.image.name, self.name)
+        self.assertEqual(sorted(os.listdir(self.path('uploads/recipe'))),
+                         [os.path.basename(self.name), 'variants'])
+        self.assertEqual(self.references(self.name), 2)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_uploads_streamed_to_disk_are_hashed(self):
+        recipe = self.upload(create_recipe(user=self.user), self.content)
+        self.assertEqual(recipe.image.name, self.name)
+
+    def test_replaced_and_deleted_images_are_released(self):
+        recipe = self.upload(create_recipe(user=self.user), self.content)
+        other = make_image_bytes(color='blue')
+        recipe = self.upload(recipe, other)
+
+        self.assertEqual(self.references(self.name), 0)
+        self.assertIsNotNone(ImageFile.objects.get(name=self.name).released_at)
+
+        other_name = recipe.image.name
+        Recipe.objects.get(pk=recipe.pk).delete()
+        self.assertEqual(self.references(other_name), 0)
+
+    def test_updates_without_image_change_keep_counts(self):
+        recipe = self.upload(create_recipe(user=self.user), self.content)
+        recipe.title = 'Renamed'
+        recipe.save()
+        Recipe.objects.get(pk=recipe.pk).save()
+
+        self.assertEqual(self.references(self.name), 1)
+
+    def test_collect_garbage(self):
+        recipe = self.upload(create_recipe(user=self.user), self.content)
+        kept = self.upload(create_recipe(user=self.user), make_image_bytes(color='blue'))
+        recipe.delete()
+
+        self.assertEqual(collect_garbage(grace=3600), 0)
+        self.assertEqual(collect_garbage(grace=0), 1)
+
+        self.assertFalse(os.path.exists(self.path(self.name)))
+        for formats in get_variant_names(self.name).values():
+            for name in formats.values():
+                self.assertFalse(os.path.exists(self.path(name)))
+        self.assertFalse(ImageFile.objects.filter(name=self.name).exists())
+        self.assertTrue(os.path.exists(kept.image.path))
+
+    def test_collect_garbage_deletes_files_on_commit(self):
+        recipe = self.upload(create_recipe(user=self.user), self.content)
+        recipe.delete()
+
+        with patch('recipe.storage.transaction.on_commit') as on_commit:
+            self.assertEqual(collect_garbage(grace=0), 1)
+        self.assertFalse(ImageFile.objects.filter(name=self.name).exists())
+        # until the deletion is committed, the files stay
+        self.assertTrue(os.path.exists(self.path(self.name)))
+
+        on_commit.call_args[0][0]()
+        self.assertFalse(os.path.exists(self.path(self.name)))
+
+    def test_collect_garbage_recounts_referenced_files(self):
+        recipe = self.upload(create_recipe(user=self.user), self.content)
+        ImageFile.objects.filter(name=self.name).update(references=0, released_at=recipe.updated_at)
+
+        self.assertEqual(collect_garbage(grace=0), 0)
+        self.assertTrue(os.path.exists(self.path(self.name)))
+        self.assertEqual(self.references(self.name), 1)
+
+
+@override_settings(RECIPE_LIST_CACHE={'BACKEND': 'recipe.cache.DummyBackend'})
+class CollectImagesCommandTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        os.makedirs(os.path.join(self.media_root, 'uploads/recipe'))
+        self.user = create_user()
+        self.content = make_image_bytes()
+        self.name = f'uploads/recipe/{hashlib.sha256(self.content).hexdigest()}.jpg'
+
+    def write(self, name, content):
+        with open(os.path.join(self.media_root, name), 'wb') as f:
+            f.write(content)
+        # older than the grace period
+        os.utime(os.path.join(self.media_root, name), (0, 0))
+
+    def legacy_recipe(self, content):
+        """ A recipe with an image stored under a random name, before content hashing """
+        name = f'uploads/recipe/{uuid.uuid4()}.jpg'
+        self.write(name, content)
+        recipe = create_recipe(user=self.user)
+        Recipe.objects.filter(pk=recipe.pk).update(image=name)
+        process_recipe_image(recipe.pk, name)
+        return Recipe.objects.get(pk=recipe.pk)
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command('collect_images', '--scan', '--grace', '0', '--batch-size', '2',
+                     *args, stdout=out)
+        return out.getvalue()
+
+    def files(self):
+        return sorted(os.path.relpath(os.path.join(path, name), self.media_root)
+                      for path, _, names in os.walk(self.media_root) for name in names)
+
+    def test_scan_merges_duplicates_and_deletes_orphans(self):
+        recipes = [self.legacy_recipe(self.content) for _ in range(3)]
+        other = self.legacy_recipe(make_image_bytes(color='blue'))
+        self.write('uploads/recipe/orphan.jpg', b'orphan')
+        self.write('uploads/recipe/variants/gone-thumb.webp', b'orphan')
+
+        out = self.collect()
+
+        self.assertIn('Merged 2 duplicate(s)', out)
+        self.assertIn('renamed 2 file(s)', out)
+        for recipe in recipes:
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.image.name, self.name)
+            self.assertEqual(recipe.image_status, STATUS_READY)
+            self.assertEqual(recipe.image_variants, get_variant_names(self.name))
+        other.refresh_from_db()
+
+        variants = [name for image in (self.name, other.image.name)
+                    for formats in get_variant_names(image).values()
+                    for name in formats.values()]
+        self.assertEqual(self.files(), sorted([self.name, other.image.name] + variants))
+        self.assertEqual(ImageFile.objects.get(name=self.name).references, 3)
+        self.assertEqual(ImageFile.objects.get(name=other.image.name).references, 1)
+
+    def test_dry_run(self):
+        self.legacy_recipe(self.content)
+        self.legacy_recipe(self.content)
+        self.write('uploads/recipe/orphan.jpg', b'orphan')
+        files = self.files()
+
+        out = self.collect('--dry-run')
+
+        self.assertIn('Would delete 1 orphaned file(s) (6 bytes)', out)
+        self.assertEqual(self.files(), files)
+
+    def test_reports_missing_files(self):
+        recipe = create_recipe(user=self.user)
+        Recipe.objects.filter(pk=recipe.pk).update(image='uploads/recipe/missing.jpg')
+
+        self.assertIn('1 recipe(s) reference image files that do not exist', self.collect())
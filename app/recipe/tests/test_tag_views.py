@@ -63,6 +63,16 @@ class PrivateTagsApiTests(TestCase):
         self.assertEqual(r.status_code, status.HTTP_201_CREATED)
         self.assertTrue(Tag.objects.filter(user=self.user, name=self.payload['name']).exists())
 
+    def test_create_tag_existing_name(self):
+        """ Test creating a tag with an existing name returns the existing tag """
+        tag = create_tag(user=self.user, name=self.payload['name'])
+
+        r = self.client.post(TAG_LIST_URL, self.payload)
+
+        self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(r.data['id'], tag.id)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
     def test_create_tag_invalid(self):
         """ Test creating a new tag with invalid payload """
 
@@ -97,3 +107,51 @@ class PrivateTagsApiTests(TestCase):
 
         r = self.client.get(TAG_LIST_URL, {'assigned_only': 1})
         self.assertEqual(len(r.data), 1)
+
+    def test_list_tags_with_counts(self):
+        item1 = create_tag(user=self.user, name='breakfast')
+        item2 = create_tag(user=self.user, name='lunch')
+        create_tag(user=self.user, name='dinner')
+
+        recipe1 = create_recipe(user=self.user, title='pancakes')
+        recipe2 = create_recipe(user=self.user, title='jam on toast')
+        recipe1.tags.add(item1, item2)
+        recipe2.tags.add(item1)
+
+        r = self.client.get(TAG_LIST_URL, {'with_counts': 1})
+
+        counts = {item['name']: item['recipe_count'] for item in r.data}
+        self.assertEqual(counts, {'breakfast': 2, 'lunch': 1, 'dinner': 0})
+
+    def test_with_counts_boolean_values(self):
+        create_tag(user=self.user, name='breakfast')
+
+        r = self.client.get(TAG_LIST_URL, {'with_counts': 'true'})
+        self.assertEqual(r.data[0]['recipe_count'], 0)
+
+        r = self.client.get(TAG_LIST_URL, {'with_counts': 'false'})
+        self.assertNotIn('recipe_count', r.data[0])
+
+        r = self.client.get(TAG_LIST_URL, {'with_counts': 'maybe'})
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('with_counts', r.data)
+
+    def test_assigned_only_boolean_values(self):
+        create_tag(user=self.user, name='breakfast')
+
+        r = self.client.get(TAG_LIST_URL, {'assigned_only': 'true'})
+        self.assertEqual(r.data, [])
+
+        r = self.client.get(TAG_LIST_URL, {'assigned_only': 'maybe'})
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('assigned_only', r.data)
+
+    def test_list_assigned_tags_with_counts(self):
+        item = create_tag(user=self.user, name='breakfast')
+        create_tag(user=self.user, name='lunch')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(item)
+
+        r = self.client.get(TAG_LIST_URL, {'assigned_only': 1, 'with_counts': 1})
+
+        self.assertEqual(r.data, [{'id': item.id, 'name': item.name, 'recipe_count': 1}])
@@ -1,53 +1,136 @@
-from rest_framework import viewsets, status
-from rest_framework.authentication import TokenAuthentication
+from rest_framework import serializers, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.mixins import ListModelMixin, CreateModelMixin
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.translation import gettext_lazy as _
+
+from core.authentication import CachedTokenAuthentication
+from recipe.cache import CachedListMixin, invalidate_user_lists
+from recipe.conditional import ConditionalGetMixin
+from recipe.export import EXPORT_FORMATS, ExportContentNegotiation, export_response
+from recipe.fields import RelatedObjectCache, prime_related_objects
+from recipe.images import STATUS_PENDING, schedule_image_processing
 from recipe.models import Ingredient, Recipe, Tag
+from recipe.pagination import NameCursorPagination, RecipeCursorPagination
+from recipe.renderers import FastJSONRenderer
+from recipe.rows import FastListMixin, build_rows, get_columns
 from recipe.serializers import (
-    IngredientSerializer, RecipeDetailSerializer, RecipeImageSerializer, RecipeSerializer,
-    TagSerializer
+    IngredientCountSerializer, IngredientSerializer, RecipeDetailSerializer,
+    RecipeImageSerializer, RecipeSerializer, TagCountSerializer, TagSerializer
 )
+from utils.db_routing import ReplicaReadMixin
+
+
+RENDERER_CLASSES = [FastJSONRenderer, BrowsableAPIRenderer]
+
+
+def get_bulk_items(request, max_items):
+    """ Return the list of items of a bulk request body """
+    items = request.data
+    if not isinstance(items, list) or not items:
+        raise ValidationError({'non_field_errors': [_('Expected a non-empty list of items.')]})
+    if len(items) > max_items:
+        raise ValidationError({'non_field_errors': [
+            _('Ensure this list has no more than {max} items.').format(max=max_items)]})
+    return items
 
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet, ListModelMixin, CreateModelMixin):
+def get_bool_param(request, name, default=False):
+    """ Return a boolean query parameter (1/0, true/false, yes/no, ..), 400 on other values """
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        return serializers.BooleanField().to_internal_value(value)
+    except ValidationError as exc:
+        raise ValidationError({name: exc.detail})
+
+
+class BaseRecipeAttrViewSet(ReplicaReadMixin, CachedListMixin, FastListMixin,
+                            viewsets.GenericViewSet, ListModelMixin, CreateModelMixin):
     """ Base viewset for user owned recipe attributes """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    renderer_classes = RENDERER_CLASSES
+    pagination_class = NameCursorPagination
+    bulk_max_items = 10000
+
+    def _with_counts(self):
+        return self.action == 'list' and get_bool_param(self.request, 'with_counts')
 
     def get_queryset(self):
         """ Return filtered queryset by user """
-        assigned_only = bool(int(self.request.query_params.get('assigned_only', 0)))
+        assigned_only = get_bool_param(self.request, 'assigned_only')
 
         queryset = self.queryset.filter(user=self.request.user).order_by('-name')
         if assigned_only:
-            queryset = queryset.filter(recipes__isnull=False).distinct()
+            queryset = queryset.assigned()
+        if self._with_counts():
+            queryset = queryset.with_recipe_counts()
 
         return queryset
 
+    def get_serializer_class(self):
+        if self._with_counts():
+            return self.count_serializer_class
+        return self.serializer_class
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # names are unique per user, a retried create returns the existing row. On a
+        # copy, writes mark the class level queryset as routed to the primary for good
+        serializer.instance = self.queryset.all().get_or_create(
+            user=self.request.user, **serializer.validated_data)[0]
+
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """ Return rows for a list of names, creating the missing ones """
+        items = get_bulk_items(request, self.bulk_max_items)
+        name_field = self.get_serializer().fields['name']
+
+        names, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                names.append(name_field.run_validation(item))
+            except ValidationError as exc:
+                errors.append({'index': index, 'errors': {'name': exc.detail}})
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = self.queryset.all().bulk_get_or_create(request.user, names)
+        invalidate_user_lists(request.user.id)
+
+        return Response(self.get_serializer(rows, many=True).data, status=status.HTTP_200_OK)
 
 
 class TagViewsSet(BaseRecipeAttrViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    count_serializer_class = TagCountSerializer
 
 
 class IngredientViewsSet(BaseRecipeAttrViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    count_serializer_class = IngredientCountSerializer
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, ConditionalGetMixin, CachedListMixin, FastListMixin,
+                    viewsets.ModelViewSet):
 
     serializer_class = RecipeSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    renderer_classes = RENDERER_CLASSES
+    pagination_class = RecipeCursorPagination
     queryset = Recipe.objects.all()
+    bulk_max_items = 10000
 
     def _params_to_ints(self, qs):
         """ Convert a string of IDs to a list of integers. """
@@ -56,15 +139,29 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset.filter(user=self.request.user)
+        search = self.request.query_params.get('search', '').strip()
+        match = self.request.query_params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': _('Must be one of "any" or "all".')})
+
+        queryset = self.queryset.filter(user=self.request.user).order_by('-id')
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.with_tags(tag_ids, match_all=match == 'all')
         if ingredients:
             ing_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ing_ids)
-
-        return queryset
+            queryset = queryset.with_ingredients(ing_ids, match_all=match == 'all')
+        if search:
+            # ranked order applies to unpaginated responses, cursor pages are ordered by -id
+            search_related = get_bool_param(self.request, 'search_related')
+            queryset = queryset.search(search, include_related=search_related)
+
+        # load related ids/objects for all rows in two queries instead of two per row,
+        # ordered by id like the list fast path (recipe/rows.py)
+        return queryset.prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch('ingredients', queryset=Ingredient.objects.order_by('id'))
+        )
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -76,18 +173,82 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """
+        Create a list of recipes. Items are validated together and inserted in
+        batches, every invalid item is reported with its index. Nothing is created
+        if any item is invalid, unless ?atomic=0 is given.
+        """
+        atomic = get_bool_param(request, 'atomic', default=True)
+        items = get_bulk_items(request, self.bulk_max_items)
+
+        # like ListSerializer one serializer validates every item, and the related
+        # ids of all items are loaded with one query per field
+        context = dict(self.get_serializer_context(), related_objects=RelatedObjectCache())
+        serializer = self.get_serializer_class()(context=context)
+        prime_related_objects(serializer, items)
+
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                valid.append(serializer.run_validation(item))
+            except ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+
+        if not valid or (errors and atomic):
+            return Response({'created': [], 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            recipes = Recipe.objects.bulk_create_with_related(request.user, valid)
+        invalidate_user_lists(request.user.id)
+
+        # ids are given out in insertion order, so this is the order of the items
+        rows = Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes]) \
+            .order_by('id').values(*get_columns(RecipeSerializer))
+        created = build_rows(RecipeSerializer, rows, context)
+
+        return Response({'created': created, 'errors': errors}, status=status.HTTP_201_CREATED)
+
+    @action(methods=['GET'], detail=False, renderer_classes=[FastJSONRenderer],
+            content_negotiation_class=ExportContentNegotiation)
+    def export(self, request):
+        """
+        Stream the recipes of the user, filtered like the list and newest first
+        (searches too), as NDJSON lines of recipe details or as CSV
+        (?export_format=csv). `format` is taken by DRF's renderer selection.
+        """
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'export_format': [
+                _('Must be one of {formats}.').format(formats=', '.join(EXPORT_FORMATS))]})
+
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(queryset, export_format, self.get_serializer_context())
+
     # define a custom POST action for this viewset
     # for a single object (detail=True)
     # url = detail url + url_path (recipes/1/upload-image)
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
-        """ Upload an image to a recipe using recipe pk """
+        """
+        Upload an image to a recipe using recipe pk. Only the original is stored in
+        the request, its variants are rendered in the background and reported with
+        their status in `images`.
+        """
 
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            if serializer.validated_data.get('image'):
+                recipe = serializer.save(image_status=STATUS_PENDING, image_variants={})
+                schedule_image_processing(recipe)
+            elif 'image' in serializer.validated_data:
+                # cleared, there is nothing to process
+                serializer.save(image_status='', image_variants={})
+            else:
+                serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,54 @@
+"""
+Secondary indexes and foreign keys dropped around large loads.
+
+Maintaining every index for each inserted row and checking foreign keys with a
+trigger per row costs several times the insert itself. Building an index once
+over the loaded rows and validating a foreign key with a single query when it's
+added back is much faster, at the price of locking the tables exclusively and
+slower queries until the load finished: only for loads into an idle database.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+def model_tables(model):
+    """ Return the table of the model and of its many-to-many through tables """
+    return [model._meta.db_table] + [
+        field.remote_field.through._meta.db_table for field in model._meta.many_to_many]
+
+
+def drop_indexes(tables, using=DEFAULT_DB_ALIAS):
+    """
+    Drop the foreign keys and the indexes not backing a constraint of the
+    tables, return (SQL statements recreating them, index count, foreign key count)
+    """
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute("""
+            SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+            FROM pg_constraint WHERE conrelid = ANY(%s::regclass[]) AND contype = 'f'
+        """, [tables])
+        constraints = cursor.fetchall()
+        cursor.execute("""
+            SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+            FROM pg_index i
+            WHERE i.indrelid = ANY(%s::regclass[]) AND NOT i.indisunique
+            AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+        """, [tables])
+        indexes = cursor.fetchall()
+
+        # tables with deferred checks pending can't be altered, run them now
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        for table, name, _ in constraints:
+            cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}')
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {name}')
+
+    statements = [definition for _, definition in indexes] + [
+        f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}'
+        for table, name, definition in constraints]
+    return statements, len(indexes), len(constraints)
+
+
+def recreate(statements, using=DEFAULT_DB_ALIAS):
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
@@ -0,0 +1,9 @@
+"""
+PostgreSQL backend leasing connections from an in-process pool.
+
+Use 'utils.db_pool' as ENGINE and configure the pool with a POOL entry of the
+database settings (see pool.DEFAULT_SETTINGS). Django "closes" a connection at
+the end of every request (CONN_MAX_AGE=0) or on connections.close_all(), the
+backend returns it to the pool instead, so threads only hold connections while
+they use them and connection setup is paid once per pooled connection.
+"""
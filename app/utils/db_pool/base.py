@@ -0,0 +1,35 @@
+from django.db.backends.postgresql import base, creation
+
+from utils.db_pool.pool import close_pools, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # idle pooled connections would keep the test database in use
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        key = (self.alias, repr(sorted(conn_params.items())))
+        self._pool = get_pool(key, self.settings_dict.get('POOL') or {})
+        connect = super().get_new_connection
+        connection = self._pool.acquire(lambda: connect(conn_params))
+        # what the base class sets when it opens a connection
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django keeps using the connection object until the block exits
+                self._pool.discard(self.connection)
+            else:
+                self._pool.release(self.connection)
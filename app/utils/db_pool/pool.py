@@ -0,0 +1,227 @@
+import os
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+
+DEFAULT_SETTINGS = {
+    # connections opened at most, acquire() waits for one to be released beyond that
+    'max_size': 10,
+    # seconds acquire() waits before raising PoolTimeout
+    'timeout': 5,
+    # seconds after which a connection is replaced, None to keep it
+    'max_lifetime': 30 * 60,
+    # connections idle for longer are checked with a query before being handed out
+    'check_interval': 30,
+}
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of psycopg2 connections. The most recently released
+    connection is handed out first, so surplus connections age out.
+    """
+
+    def __init__(self, max_size=10, timeout=5, max_lifetime=None, check_interval=30):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+
+        self._condition = threading.Condition()
+        self._pid = os.getpid()
+        self._idle = []  # (connection, created, released)
+        self._created = {}  # id(connection): created, of the open connections
+        self._waiting = 0
+        self._stats = {
+            'created': 0, 'closed': 0, 'acquired': 0, 'timeouts': 0, 'failed_checks': 0,
+            'wait_time': 0.0, 'max_wait_time': 0.0,
+        }
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # connections of the parent process can't be used, nor closed without
+            # ending the parent's sessions
+            self._pid = os.getpid()
+            self._idle = []
+            self._created = {}
+
+    def _is_expired(self, created, now):
+        return self.max_lifetime is not None and now - created > self.max_lifetime
+
+    def _is_usable(self, connection, released):
+        """ Called without the lock, a slow or hung server only holds up its caller """
+        if connection.closed:
+            return False
+        if time.monotonic() - released < self.check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+            return True
+        except Exception:
+            with self._condition:
+                self._stats['failed_checks'] += 1
+            return False
+
+    def _discard(self, connection):
+        """ Close a connection and free its slot, with the condition held """
+        self._created.pop(id(connection), None)
+        self._stats['closed'] += 1
+        self._condition.notify()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def acquire(self, connect):
+        """ Return an idle connection, or one made with `connect` while below max_size """
+        started = time.monotonic()
+        while True:
+            connection, released = self._take(started)
+            if connection is None:
+                # a slot is reserved, `released` is its placeholder
+                placeholder = released
+                break
+            usable = self._is_usable(connection, released)
+            with self._condition:
+                if usable:
+                    return self._acquired(connection, started)
+                self._discard(connection)
+
+        # connect without the lock, connecting may take a while
+        try:
+            connection = connect()
+        except Exception:
+            with self._condition:
+                del self._created[id(placeholder)]
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            del self._created[id(placeholder)]
+            self._created[id(connection)] = time.monotonic()
+            self._stats['created'] += 1
+            return self._acquired(connection, started)
+
+    def _take(self, started):
+        """
+        Return (idle connection, released time) to check before handing it out, or
+        (None, placeholder) once a slot is reserved for a new connection
+        """
+        with self._condition:
+            self._check_fork()
+            while True:
+                now = time.monotonic()
+                while self._idle:
+                    connection, created, released = self._idle.pop()
+                    if not self._is_expired(created, now):
+                        return connection, released
+                    self._discard(connection)
+
+                if len(self._created) < self.max_size:
+                    placeholder = object()
+                    self._created[id(placeholder)] = now
+                    return None, placeholder
+
+                remaining = started + self.timeout - now
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No database connection available within {self.timeout} s '
+                        f'({self.max_size} in use)')
+                self._waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _acquired(self, connection, started):
+        waited = time.monotonic() - started
+        self._stats['acquired'] += 1
+        self._stats['wait_time'] += waited
+        self._stats['max_wait_time'] = max(self._stats['max_wait_time'], waited)
+        return connection
+
+    def release(self, connection):
+        """ Return a connection, rolled back if it's in a transaction """
+        try:
+            broken = connection.closed or not self._reset(connection)
+        except Exception:
+            broken = True
+
+        with self._condition:
+            if self._pid != os.getpid() or id(connection) not in self._created:
+                # opened before a fork or pool reset
+                return
+            created = self._created[id(connection)]
+            if broken or self._is_expired(created, time.monotonic()):
+                self._discard(connection)
+            else:
+                self._idle.append((connection, created, time.monotonic()))
+                self._condition.notify()
+
+    def _reset(self, connection):
+        """ End any transaction, return whether the connection can be reused """
+        # psycopg2: 0 idle, 1 active, 2 in transaction, 3 in error, 4 unknown
+        status = connection.info.transaction_status
+        if status in (2, 3):
+            connection.rollback()
+            status = connection.info.transaction_status
+        return status == 0
+
+    def discard(self, connection):
+        """ Close a connection instead of returning it """
+        with self._condition:
+            if id(connection) in self._created:
+                self._discard(connection)
+                return
+        connection.close()
+
+    def close(self):
+        """ Close the idle connections, connections in use are closed on release """
+        with self._condition:
+            self._check_fork()
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update(
+                max_size=self.max_size, size=len(self._created), idle=len(self._idle),
+                in_use=len(self._created) - len(self._idle), waiting=self._waiting)
+        stats['avg_wait_time'] = stats['wait_time'] / stats['acquired'] if stats['acquired'] \
+            else 0.0
+        return stats
+
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def get_pool(key, options):
+    """ Return the process wide pool of connections made with the same parameters """
+    pool = _pools.get(key)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(**dict(DEFAULT_SETTINGS, **options))
+    return pool
+
+
+def get_pool_stats():
+    """ Return {database alias: stats} of every pool of the process """
+    return {alias: pool.stats() for (alias, _), pool in list(_pools.items())}
+
+
+def close_pools():
+    for pool in list(_pools.values()):
+        pool.close()
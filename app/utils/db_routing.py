@@ -0,0 +1,134 @@
+"""
+Routing of read requests to database replicas.
+
+Views using ReplicaReadMixin read from a replica (one of
+DATABASE_REPLICAS['aliases'], chosen per request) while handling GET, HEAD and
+OPTIONS requests. Other requests, and anything outside of those views, use the
+primary ('default'), which receives every write.
+
+Replicas lag behind the primary, so a user whose request wrote is pinned to the
+primary for DATABASE_REPLICAS['pin_seconds'] and reads their own writes. The
+pin is sent to the client in a signed cookie, DATABASE_REPLICAS['cookie'], so
+it holds whichever worker process or host serves the next request. It's also
+kept in the Django cache named by DATABASE_REPLICAS['cache'] for clients that
+don't keep cookies, which only pins them on the worker that handled the write
+unless that cache is shared (e.g. redis).
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+
+DEFAULT_SETTINGS = {'aliases': [], 'pin_seconds': 5, 'cache': 'default', 'cookie': 'db_pin'}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_SALT = 'utils.db_routing.pin'
+
+
+class RoutingState:
+    """ Database routing of the request being handled """
+
+    def __init__(self):
+        self.read_alias = None
+        self.wrote = False
+
+
+# a context variable is per thread, and per task under ASGI
+_state = ContextVar('db_routing_state', default=None)
+
+
+def get_settings():
+    return dict(DEFAULT_SETTINGS, **getattr(settings, 'DATABASE_REPLICAS', {}))
+
+
+def _pin_key(user_id):
+    return f'db:pin:{user_id}'
+
+
+def pin_to_primary(user_id, request=None, response=None):
+    """ Read from the primary for the user's requests of the next pin_seconds """
+    replicas = get_settings()
+    if not replicas['aliases'] or not replicas['pin_seconds']:
+        return
+    caches[replicas['cache']].set(_pin_key(user_id), True, replicas['pin_seconds'])
+    if response is not None:
+        # signed with a timestamp, expired pins are ignored whatever the client sends
+        response.set_signed_cookie(
+            replicas['cookie'], str(user_id), salt=PIN_SALT, max_age=replicas['pin_seconds'],
+            secure=request is not None and request.is_secure(), httponly=True, samesite='Lax')
+
+
+def is_pinned(user_id, request=None):
+    replicas = get_settings()
+    if request is not None:
+        try:
+            if request.get_signed_cookie(replicas['cookie'], salt=PIN_SALT,
+                                         max_age=replicas['pin_seconds']) == str(user_id):
+                return True
+        except (KeyError, signing.BadSignature):
+            pass
+    return bool(caches[replicas['cache']].get(_pin_key(user_id)))
+
+
+def choose_replica(user_id=None, request=None):
+    """ Return the alias reads of a request go to, None for the primary """
+    replicas = get_settings()
+    if not replicas['aliases'] or (user_id is not None and is_pinned(user_id, request)):
+        return None
+    return random.choice(replicas['aliases'])
+
+
+class ReplicaRouter:
+    """
+    Send reads to the replica chosen for the current request, and its writes to
+    the primary unless written with `using`, including writes to instances read
+    from the replica. Outside requests, writes follow Django's default routing
+    (the database of a hinted instance), which e.g. migrate relies on.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        return state.read_alias if state is not None else None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            return None
+        state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, None, *get_settings()['aliases']}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serve safe requests of an API view from a replica, unless the user wrote in
+    the last pin_seconds. Users writing through the view are pinned.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        state = RoutingState()
+        token = _state.set(state)
+        response = None
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+            return response
+        finally:
+            _state.reset(token)
+            user = getattr(request, 'user', None)
+            if state.wrote and user is not None and user.is_authenticated:
+                pin_to_primary(user.pk, request, response)
+
+    def initial(self, request, *args, **kwargs):
+        # authenticates the user, token lookups read from the primary
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            _state.get().read_alias = choose_replica(request.user.pk, request)
@@ -41,3 +41,35 @@ def get_recipe_detail_url(recipe_id):
 def get_image_upload_url(recipe_id):
     """ Return URL for recipe image upload """
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+async def asgi_request(application, path, query_string='', headers=None, method='GET',
+                       host='testserver'):
+    """ Send a request through an ASGI application, return (status, headers, body) """
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'query_string': query_string.encode(),
+        'headers': [(b'host', host.encode())] + [
+            (name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        'server': (host, 80),
+        'client': ('127.0.0.1', 50000),
+    }
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await application(scope, receive, send)
+
+    headers = {name.decode().lower(): value.decode() for name, value in sent[0]['headers']}
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return sent[0]['status'], headers, body
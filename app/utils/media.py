@@ -0,0 +1,182 @@
+"""
+Serving of MEDIA_ROOT files.
+
+Responses carry a strong ETag and Last-Modified, answer conditional requests
+and single byte ranges. Files named by a content hash or a UUID (see
+recipe/storage.py and recipe/images.py) are never rewritten and are cached as
+immutable, others
+for MEDIA_SERVING['max_age'] seconds. The transfer itself depends on
+MEDIA_SERVING['backend']:
+
+- 'sendfile': sent by this process as a file response, which WSGI servers pass
+  to wsgi.file_wrapper (gunicorn sends it with os.sendfile)
+- 'x-accel-redirect': sent by nginx from an internal location serving
+  MEDIA_ROOT under MEDIA_SERVING['internal_prefix']
+- 'x-sendfile': sent by Apache (mod_xsendfile) or lighttpd from its path
+"""
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+
+DEFAULT_SETTINGS = {'backend': 'sendfile', 'internal_prefix': '/protected-media/', 'max_age': 3600}
+BACKENDS = ('sendfile', 'x-accel-redirect', 'x-sendfile')
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# <sha256 or uuid>.<ext> originals and <sha256 or uuid>-<variant>.<ext> image variants
+IMMUTABLE_NAME = re.compile(
+    r'^([0-9a-f]{64}|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})'
+    r'(-[a-z]+)?\.\w+$')
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+BLOCK_SIZE = 64 * 1024
+# responses carrying the file (or confirming it) cache, errors like 416 don't
+CACHEABLE_STATUSES = (200, 206, 304)
+
+
+def get_settings():
+    serving = dict(DEFAULT_SETTINGS, **getattr(settings, 'MEDIA_SERVING', {}))
+    assert serving['backend'] in BACKENDS, f"Unknown media backend {serving['backend']!r}"
+    return serving
+
+
+def get_etag(stat_result):
+    return quote_etag(f'{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}')
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) of a single byte range, end inclusive, or None when the
+    whole file is served (no, malformed or multiple ranges). An unsatisfiable
+    range has start > end.
+    """
+    match = BYTE_RANGE.match(header.replace(' ', ''))
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+        return (start, end) if start < size else (size, size - 1)
+    if last:
+        # suffix range, the last `last` bytes
+        return max(size - int(last), 0), size - 1
+    return None
+
+
+def _range_applies(request, etag, mtime):
+    """ A range is only served for the representation named by If-Range """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    if_range_date = parse_http_date_safe(if_range)
+    return if_range_date is not None and int(mtime) <= if_range_date
+
+
+def _read_range(file, length):
+    with file:
+        while length > 0:
+            chunk = file.read(min(BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _file_response(request, full_path, byte_range, size):
+    if request.method == 'HEAD':
+        return HttpResponse()
+
+    file = open(full_path, 'rb')
+    start, end = byte_range or (0, size - 1)
+    file.seek(start)
+    if end < size - 1:
+        return StreamingHttpResponse(_read_range(file, end - start + 1))
+
+    # to the end of file, servers using sendfile start at the current position
+    response = FileResponse(file)
+    response.block_size = BLOCK_SIZE
+    del response['Content-Disposition']
+    return response
+
+
+def _send(request, serving, path, full_path, stat_result, etag):
+    if serving['backend'] == 'x-accel-redirect':
+        # nginx answers ranges itself
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = quote(serving['internal_prefix'].rstrip('/') + '/' + path)
+    elif serving['backend'] == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = full_path
+    else:
+        size = stat_result.st_size
+        byte_range = None
+        if 'HTTP_RANGE' in request.META and _range_applies(request, etag, stat_result.st_mtime):
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+
+        if byte_range is not None and byte_range[0] > byte_range[1]:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        response = _file_response(request, full_path, byte_range, size)
+        if byte_range is not None:
+            start, end = byte_range
+            response.status_code = 206
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response['Content-Length'] = size
+        response['Accept-Ranges'] = 'bytes'
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    response['Content-Type'] = content_type or 'application/octet-stream'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+@require_safe
+def serve(request, path):
+    """ Serve a file of MEDIA_ROOT, `path` is relative to MEDIA_URL """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat_result = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404
+
+    serving = get_settings()
+    etag = get_etag(stat_result)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat_result.st_mtime))
+    if response is None:
+        response = _send(request, serving, path, full_path, stat_result, etag)
+
+    if response.status_code in CACHEABLE_STATUSES:
+        if IMMUTABLE_NAME.match(posixpath.basename(path)):
+            response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            response['Cache-Control'] = f"public, max-age={serving['max_age']}"
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat_result.st_mtime)
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
@@ -0,0 +1,369 @@
+"""
+Process metrics exposed in the Prometheus text format.
+
+Every worker process records into its own Registry, without locking other
+processes or sharing memory. With PERFORMANCE_METRICS['directory'] set (a
+directory shared by the workers of a host) each process writes a snapshot of
+its registry there at most every `flush_interval` seconds, and /metrics/ merges
+the snapshots of all processes, whichever worker answers the scrape:
+
+- histograms and counters are summed over every snapshot. Snapshots of exited
+  workers are folded into one file of their totals on the next scrape, so the
+  directory doesn't grow with worker restarts and totals never go backwards
+- gauges (pool sizes, cache entries, ..) are reported per live process with a
+  `pid` label
+
+Without a directory /metrics/ only reports the process answering the scrape.
+
+/metrics/ answers requests from PERFORMANCE_METRICS['allowed_networks'] (local
+addresses by default), with the bearer token PERFORMANCE_METRICS['token'] or
+of staff users, others get 403.
+"""
+import atexit
+import bisect
+import fcntl
+import glob
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.utils.module_loading import import_string
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_safe
+
+from utils.db_pool.pool import get_pool_stats
+
+
+logger = logging.getLogger(__name__)
+
+# header: True sends Server-Timing on every response, 'staff' with DEBUG or to staff users
+DEFAULT_SETTINGS = {
+    'header': 'staff', 'directory': None, 'flush_interval': 1, 'token': None,
+    'allowed_networks': ['127.0.0.0/8', '::1/128'],
+}
+
+EXITED_FILE = 'exited.json'
+LOCK_FILE = 'metrics.lock'
+
+# seconds
+DURATION_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# (metric prefix, function returning the object whose stats() are reported, gauges),
+# other numeric stats are counters, ratios and averages are left to the queries
+STATS_SOURCES = (
+    ('token_auth_cache', 'core.authentication.get_token_cache', ('entries', )),
+    ('password_hashing', 'core.hashing.get_executor', ()),
+    ('recipe_list_cache', 'recipe.cache.get_list_cache', ()),
+)
+POOL_GAUGES = ('max_size', 'size', 'idle', 'in_use', 'waiting', 'max_wait_time')
+DERIVED_STATS = ('hit_rate', 'avg_queue_time', 'avg_hash_time', 'avg_wait_time')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def get_settings():
+    return dict(DEFAULT_SETTINGS, **getattr(settings, 'PERFORMANCE_METRICS', {}))
+
+
+class Histogram:
+    """ Bucket counts (not cumulative, the last one counts values above all buckets) and sum """
+
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    """ Histograms and counters of one process, keyed by (name, label pairs) """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        # a restarted worker may get the pid of an exited one, which keeps its file
+        self.key = f'{self.pid}-{uuid.uuid4().hex[:8]}'
+        self.flushed = 0.0
+        # held while writing the snapshot file, by one thread at a time
+        self.flush_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, name, labels, value, buckets=DURATION_BUCKETS):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def snapshot(self):
+        """ Return a JSON serializable copy, with the stats of the process """
+        with self._lock:
+            histograms = [[name, labels, list(histogram.buckets), list(histogram.counts),
+                           histogram.sum]
+                          for (name, labels), histogram in self._histograms.items()]
+            counters = [[name, labels, value] for (name, labels), value in self._counters.items()]
+        stats_counters, gauges = collect_stats()
+        return {'pid': self.pid, 'histograms': histograms, 'counters': counters + stats_counters,
+                'gauges': gauges}
+
+
+def collect_stats():
+    """ Return ([name, labels, value] counters, gauges) from the stats of caches and pools """
+    counters, gauges = [], []
+
+    def add(prefix, stats, gauge_names, labels=()):
+        for stat, value in stats.items():
+            if stat in DERIVED_STATS or not isinstance(value, (int, float)):
+                continue
+            if stat in gauge_names:
+                gauges.append([f'{prefix}_{stat}', list(labels), value])
+            else:
+                counters.append([f'{prefix}_{stat}_total', list(labels), value])
+
+    for prefix, path, gauge_names in STATS_SOURCES:
+        add(prefix, import_string(path)().stats(), gauge_names)
+    for alias, stats in get_pool_stats().items():
+        add('db_pool', stats, POOL_GAUGES, [['database', alias]])
+    return counters, gauges
+
+
+_registry = None
+_lock = threading.Lock()
+
+
+def get_registry():
+    """ Return the registry of the current process, a forked process starts a new one """
+    global _registry
+    if _registry is None or _registry.pid != os.getpid():
+        with _lock:
+            if _registry is None or _registry.pid != os.getpid():
+                _registry = Registry()
+    return _registry
+
+
+@receiver(setting_changed)
+def reset_registry(setting, **kwargs):
+    global _registry
+    if setting == 'PERFORMANCE_METRICS':
+        _registry = None
+
+
+def _snapshot_path(directory, registry):
+    return os.path.join(directory, f'metrics-{registry.key}.json')
+
+
+def flush(registry=None, force=False):
+    """ Write the snapshot of the process, if a directory is set and flush_interval passed """
+    options = get_settings()
+    registry = registry or get_registry()
+    if not options['directory']:
+        return
+    # another thread writing the snapshot now writes the latest figures as well
+    if not registry.flush_lock.acquire(blocking=force):
+        return
+    try:
+        now = time.monotonic()
+        if not force and now - registry.flushed < options['flush_interval']:
+            return
+        registry.flushed = now
+
+        path = _snapshot_path(options['directory'], registry)
+        try:
+            os.makedirs(options['directory'], exist_ok=True)
+            _write_json(path, registry.snapshot())
+        except OSError:
+            # metrics never fail requests
+            logger.exception('Writing metrics to %s failed', path)
+    finally:
+        registry.flush_lock.release()
+
+
+def _write_json(path, data):
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(data, file)
+    os.replace(temp_path, path)
+
+
+def _read_json(path):
+    """ Return the data of the file, None when it's missing or being replaced """
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _sum(snapshots):
+    """ Return the histograms and counters of the snapshots summed by name and labels """
+    histograms, counters = {}, {}
+    for snapshot in snapshots:
+        for name, labels, buckets, counts, total in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)), tuple(buckets))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+
+def _merge_exited(directory, exited):
+    """
+    Add the snapshots of exited workers, {path: snapshot}, to the totals of
+    EXITED_FILE and remove their files, with the directory locked
+    """
+    totals_path = os.path.join(directory, EXITED_FILE)
+    totals = _read_json(totals_path)
+    histograms, counters = _sum(([totals] if totals else []) + list(exited.values()))
+    _write_json(totals_path, {
+        'pid': None,
+        'histograms': [[name, labels, buckets, counts, total]
+                       for (name, labels, buckets), (counts, total) in histograms.items()],
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'gauges': [],
+    })
+    for path in exited:
+        os.remove(path)
+
+
+def read_snapshots():
+    """ Return the snapshots of all processes, the current one taken now """
+    registry = get_registry()
+    snapshots = [registry.snapshot()]
+    directory = get_settings()['directory']
+    if not directory:
+        return snapshots
+
+    os.makedirs(directory, exist_ok=True)
+    own_path = _snapshot_path(directory, registry)
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+        # one scrape at a time, a snapshot being merged is never counted twice
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        exited = {}
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            snapshot = None if path == own_path else _read_json(path)
+            if snapshot is None:
+                continue
+            if _is_alive(snapshot['pid']):
+                snapshots.append(snapshot)
+            else:
+                exited[path] = snapshot
+        if exited:
+            _merge_exited(directory, exited)
+        totals = _read_json(os.path.join(directory, EXITED_FILE))
+    if totals is not None:
+        snapshots.append(totals)
+    return snapshots
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots):
+    """ Merge snapshots into the Prometheus text exposition format """
+    histograms, counters = _sum(snapshots)
+    gauges = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['gauges']:
+            gauges[(name, tuple(map(tuple, labels)) + (('pid', snapshot['pid']), ))] = value
+
+    lines = []
+    typed = set()
+
+    def add_type(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels, buckets), (counts, total) in sorted(histograms.items()):
+        add_type(name, 'histogram')
+        cumulative = 0
+        for bound, count in zip(list(buckets) + ['+Inf'], counts):
+            cumulative += count
+            le = bound if bound == '+Inf' else _format_value(float(bound))
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", le)])} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+        lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+    for (name, labels), value in sorted(counters.items()):
+        add_type(name, 'counter')
+        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    for (name, labels), value in sorted(gauges.items()):
+        add_type(name, 'gauge')
+        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _is_allowed(request, options):
+    token = options['token']
+    if token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''),
+                                       f'Bearer {token}'):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        address = None
+    if address is not None and any(address in ipaddress.ip_network(network)
+                                   for network in options['allowed_networks']):
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+@require_safe
+@never_cache
+def metrics(request):
+    if not _is_allowed(request, get_settings()):
+        return HttpResponseForbidden()
+    return HttpResponse(render(read_snapshots()), content_type=CONTENT_TYPE)
+
+
+@atexit.register
+def _flush_at_exit():
+    if _registry is not None and _registry.pid == os.getpid():
+        flush(_registry, force=True)
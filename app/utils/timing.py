@@ -0,0 +1,140 @@
+"""
+Per-request performance instrumentation.
+
+ServerTimingMiddleware records, for every request, the number and time of SQL
+queries, the time spent serializing (serializers using TimedSerializerMixin and
+the list fast path of recipe/rows.py, queries they make included), rendering
+and in total. The figures are returned in a Server-Timing header (durations in
+milliseconds, shown by the browser developer tools), by default only with DEBUG
+or to staff users as they tell about the database, and recorded as histograms
+labelled with the URL name and method, e.g. view="recipe:recipe-upload-image",
+method="POST", which are exposed by /metrics/ (see utils/metrics.py).
+
+Overhead is a few perf_counter calls per request and query, and one snapshot
+write per worker every PERFORMANCE_METRICS['flush_interval'] seconds.
+"""
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+from utils import metrics
+
+
+class RequestTiming:
+    """ Durations (seconds) and query count of the request being handled """
+
+    __slots__ = ('durations', 'queries', 'view_finished', '_active')
+
+    def __init__(self):
+        self.durations = {}
+        self.queries = 0
+        self.view_finished = None
+        self._active = set()
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def execute(self, execute, sql, params, many, context):
+        """ Database execute wrapper """
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.add('db', perf_counter() - started)
+
+
+_current = ContextVar('request_timing', default=None)
+
+
+@contextmanager
+def timed(name):
+    """ Add the time of the block to `name` of the current request, nested blocks count once """
+    timing = _current.get()
+    if timing is None or name in timing._active:
+        yield
+        return
+
+    timing._active.add(name)
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timing._active.discard(name)
+        timing.add(name, perf_counter() - started)
+
+
+class TimedSerializerMixin:
+    """ Count the representation of instances as serialize time """
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+
+def _send_header(request, option):
+    if option == 'staff':
+        user = getattr(request, 'user', None)
+        return settings.DEBUG or (user is not None and user.is_staff)
+    return bool(option)
+
+
+def _format_header(timing, total):
+    parts = [f'{name};dur={timing.durations[name] * 1000:.2f}'
+             for name in ('db', 'serialize', 'render') if name in timing.durations]
+    if 'db' in timing.durations:
+        parts[0] += f';desc="{timing.queries} queries"'
+    parts.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(parts)
+
+
+class ServerTimingMiddleware:
+    """ Keep first in MIDDLEWARE, the total covers the middlewares after it """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = RequestTiming()
+        token = _current.set(timing)
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing.execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = perf_counter() - started
+
+        options = metrics.get_settings()
+        if _send_header(request, options['header']):
+            response['Server-Timing'] = _format_header(timing, total)
+        self.record(request, response, timing, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # runs once the view returned, rendering follows
+        timing = _current.get()
+        timing.view_finished = perf_counter()
+        response.add_post_render_callback(
+            lambda response: timing.add('render', perf_counter() - timing.view_finished))
+        return response
+
+    def record(self, request, response, timing, total):
+        match = getattr(request, 'resolver_match', None)
+        labels = (('view', match.view_name if match else '<unresolved>'),
+                  ('method', request.method))
+
+        registry = metrics.get_registry()
+        registry.inc('http_requests_total', labels + (('status', str(response.status_code)), ))
+        registry.observe('http_request_duration_seconds', labels, total)
+        registry.observe('http_request_db_seconds', labels, timing.durations.get('db', 0.0))
+        registry.observe('http_request_queries', labels, timing.queries, metrics.QUERY_BUCKETS)
+        for name in ('serialize', 'render'):
+            if name in timing.durations:
+                registry.observe(f'http_request_{name}_seconds', labels, timing.durations[name])
+        metrics.flush(registry)